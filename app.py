@@ -1,10 +1,16 @@
+import csv
+import io
+import json
 import os
 import sqlite3
-from datetime import datetime, timedelta
+from datetime import date
 
 from dotenv import load_dotenv
 from flask import (
     Flask,
+    Response,
+    abort,
+    before_render_template,
     flash,
     g,
     jsonify,
@@ -13,6 +19,8 @@ from flask import (
     request,
     send_file,
     session,
+    stream_with_context,
+    template_rendered,
     url_for,
 )
 
@@ -20,7 +28,36 @@ from flask import (
 from google import genai
 from werkzeug.utils import secure_filename
 
-from hospital_utils import get_hospitals
+import pregnancy_dates
+from blob_store import BlobStore
+from db_pool import ConnectionPool
+from diet_plans import DEFAULT_RULES_PATH, DietPlans
+from downloads import DownloadSender
+from gemini_dispatcher import (
+    FakeGeminiClient,
+    GeminiBusy,
+    GeminiDispatcher,
+    GeminiTimeout,
+)
+from hospital_utils import SENDER_EMAIL, get_hospitals, mailer, search_cache
+from instrumentation import (
+    Metrics,
+    TimedConnection,
+    add_request_db_time,
+    monitoring_allowed,
+)
+from instrumentation import init_app as init_metrics
+from meal_planner import DEFAULT_FOODS_PATH, MealPlanner
+from migrations import migrate
+from pagination import decode_cursor, page_limit, split_page
+from preference_cache import DEFAULT_PREFERENCES, PreferenceCache, preferences_from_row
+from pregnancy_state import PregnancyStateCache
+from record_processing import RecordProcessor
+from reminders import ReminderScheduler
+from response_cache import ResponseCache
+from resumable_uploads import ResumableUploads, UploadError, parse_metadata
+from search import fts_query, highlight
+from session_store import init_session_store
 
 # Load environment variables from .env file
 load_dotenv()
@@ -33,11 +70,82 @@ app.secret_key = "my_super_secret_key_123"
 # Database file
 DATABASE = "pregnancy.db"
 
+# Bring the schema up to date before anything opens the database
+migrate(DATABASE)
+
+# Per-route, SQL, Gemini and hospital search latencies on /metrics
+# (registered first so the request timer covers the other hooks); it and
+# /stats need MONITORING_TOKEN as a bearer token and are 404 without one
+MONITORING_TOKEN = os.environ.get("MONITORING_TOKEN") or None
+metrics = Metrics(os.environ.get("METRICS_ENABLED", "false").lower() == "true")
+init_metrics(app, metrics, token=MONITORING_TOKEN)
+metrics.describe("gemini_seconds", "Gemini latency (streams until the last chunk).")
+metrics.describe("hospital_search_seconds", "Hospital lookup latency.")
+
+# Server-side sessions: the cookie only carries a signed session id
+# (SESSION_BACKEND is "sqlite", "redis", or "cookie" for Flask's default)
+init_session_store(
+    app,
+    os.environ.get("SESSION_BACKEND", "sqlite"),
+    database=os.environ.get("SESSION_DATABASE", "sessions.db"),
+    url=os.environ.get("SESSION_REDIS_URL", "redis://localhost:6379/0"),
+)
+
+# Number of chat messages kept in the session for the symptom checker
+CHAT_HISTORY_LIMIT = int(os.environ.get("CHAT_HISTORY_LIMIT", 20))
+
+# Rows per page of the records and appointments listings (and the API cap)
+PAGE_SIZE = int(os.environ.get("PAGE_SIZE", 20))
+MAX_PAGE_SIZE = int(os.environ.get("MAX_PAGE_SIZE", 100))
+
+# Previous due date calculations listed on the pregnancy page
+PREGNANCY_HISTORY_SIZE = int(os.environ.get("PREGNANCY_HISTORY_SIZE", 10))
+
+# Largest patient list accepted by /calculate_due_date/batch
+DUE_DATE_BATCH_MAX_ROWS = int(os.environ.get("DUE_DATE_BATCH_MAX_ROWS", 100000))
+DUE_DATE_BATCH_MAX_BYTES = int(os.environ.get("DUE_DATE_BATCH_MAX_BYTES", 16 << 20))
+
 # Upload folder setup
 UPLOAD_FOLDER = "uploads"
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 app.config["UPLOAD_FOLDER"] = UPLOAD_FOLDER
 
+# Uploaded files are stored once per distinct content under uploads/blobs
+blob_store = BlobStore(os.path.join(UPLOAD_FOLDER, "blobs"))
+
+# Chunked, resumable record uploads (see the /uploads routes)
+resumable_uploads = ResumableUploads(
+    DATABASE,
+    UPLOAD_FOLDER,
+    blob_store,
+    max_size=int(os.environ.get("UPLOAD_MAX_SIZE", 1 << 30)),
+    expire_after=float(os.environ.get("UPLOAD_EXPIRY", 86400)),
+)
+
+# Pool workers re-run the main script as __mp_main__ when the app is started
+# with ``python app.py``; only the real app starts the background services.
+BACKGROUND_SERVICES = __name__ != "__mp_main__"
+
+# Thumbnails and extracted text are generated after upload by a process pool
+record_processor = RecordProcessor(
+    DATABASE,
+    blob_store,
+    os.path.join(UPLOAD_FOLDER, "thumbnails"),
+    workers=int(os.environ.get("RECORD_PROCESSING_WORKERS", 2)),
+)
+if (
+    BACKGROUND_SERVICES
+    and os.environ.get("RECORD_PROCESSING_ENABLED", "true").lower() == "true"
+):
+    record_processor.start()
+
+# Record downloads: DOWNLOAD_OFFLOAD is "", "x-accel-redirect" or "x-sendfile"
+download_sender = DownloadSender(
+    UPLOAD_FOLDER,
+    offload=os.environ.get("DOWNLOAD_OFFLOAD", "").lower(),
+    accel_prefix=os.environ.get("DOWNLOAD_ACCEL_PREFIX", "/protected-uploads/"),
+)
+
 # Configure Gemini API with new client approach
 GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY")
 if not GEMINI_API_KEY:
@@ -49,20 +157,144 @@ if not GEMINI_API_KEY:
 CONTEXT_AWARENESS = os.environ.get("CONTEXT_AWARENESS", "false").lower() == "true"
 print(f"Context awareness is {'enabled' if CONTEXT_AWARENESS else 'disabled'}")
 
+# Use a local fake Gemini client instead of the real API (development/testing)
+GEMINI_FAKE = os.environ.get("GEMINI_FAKE", "false").lower() == "true"
+
 # Initialize the client with the new approach
 client = None
-try:
-    client = genai.Client(api_key=GEMINI_API_KEY)
-    print("Successfully initialized Gemini client")
-except Exception as e:
-    print(f"Error initializing Gemini client: {str(e)}")
+if GEMINI_FAKE:
+    client = FakeGeminiClient(latency=float(os.environ.get("GEMINI_FAKE_LATENCY", 0.5)))
+    print("Using local fake Gemini client")
+else:
+    try:
+        client = genai.Client(api_key=GEMINI_API_KEY)
+        print("Successfully initialized Gemini client")
+    except Exception as e:
+        print(f"Error initializing Gemini client: {str(e)}")
+
+# Replies shown when the AI service could not answer (never cached)
+AI_EMPTY_REPLY = "I'm sorry, I couldn't generate a proper response. Please try again or contact support if the issue persists."
+AI_BUSY_REPLY = "The AI assistant is handling a lot of questions right now. Please try again in a moment."
+AI_TIMEOUT_REPLY = (
+    "The AI service is taking too long to respond. Please try again in a few moments."
+)
+AI_ERROR_REPLY = "I apologize, but I'm having trouble connecting to the AI service right now. Please try again in a few moments."
+AI_FALLBACK_REPLIES = (AI_EMPTY_REPLY, AI_BUSY_REPLY, AI_TIMEOUT_REPLY, AI_ERROR_REPLY)
+
+# Gemini calls run on a dedicated asyncio loop with bounded concurrency
+gemini = None
+if client is not None:
+    gemini = GeminiDispatcher(
+        client,
+        max_in_flight=int(os.environ.get("GEMINI_MAX_IN_FLIGHT", 32)),
+        max_queued=int(os.environ.get("GEMINI_MAX_QUEUED", 256)),
+        timeout=float(os.environ.get("GEMINI_TIMEOUT", 30)),
+    )
+
+
+# Pool of long-lived SQLite connections shared by all requests
+db_pool = ConnectionPool(
+    DATABASE,
+    max_size=int(os.environ.get("DB_POOL_SIZE", 8)),
+    timeout=float(os.environ.get("DB_POOL_TIMEOUT", 10)),
+)
 
 
-# Function to get database connection
+# Function to get database connection (one pooled connection per request)
 def get_db_connection():
-    conn = sqlite3.connect(DATABASE)
-    conn.row_factory = sqlite3.Row
-    return conn
+    if "db" not in g:
+        g.db = db_pool.acquire()
+        if metrics.enabled:
+            g.db_timed = TimedConnection(g.db, metrics, add_request_db_time)
+    return g.db_timed if metrics.enabled else g.db
+
+
+def stream_template(template_name, **context):
+    """Render a template chunk by chunk instead of building one string."""
+    app.update_template_context(context)
+    template = app.jinja_env.get_template(template_name)
+    # Send the render signals like render_template() so the template timing
+    # covers streamed pages too (including time spent waiting on the client)
+    before_render_template.send(app, template=template, context=context)
+
+    def generate():
+        yield from template.generate(context)
+        template_rendered.send(app, template=template, context=context)
+
+    return Response(stream_with_context(generate()))
+
+
+@app.teardown_appcontext
+def release_db_connection(exception=None):
+    g.pop("db_timed", None)
+    conn = g.pop("db", None)
+    if conn is not None:
+        db_pool.release(conn)
+
+
+# Appointment reminders are sent by a background scheduler
+reminder_scheduler = ReminderScheduler(
+    DATABASE,
+    refill_interval=float(os.environ.get("REMINDER_REFILL_INTERVAL", 300)),
+    batch_size=int(os.environ.get("REMINDER_BATCH_SIZE", 500)),
+)
+if (
+    BACKGROUND_SERVICES
+    and os.environ.get("REMINDERS_ENABLED", "true").lower() == "true"
+):
+    reminder_scheduler.start()
+
+# Deliver anything left in the email outbox by a previous run
+if BACKGROUND_SERVICES and SENDER_EMAIL:
+    mailer.start()
+
+
+# Cache of AI answers for repeated non-contextual symptom questions
+# (a similarity threshold of 0 disables near-duplicate matching)
+response_cache = ResponseCache(
+    max_size=int(os.environ.get("RESPONSE_CACHE_SIZE", 2000)),
+    ttl=float(os.environ.get("RESPONSE_CACHE_TTL", 86400)),
+    similarity_threshold=float(os.environ.get("RESPONSE_CACHE_SIMILARITY", 0.85))
+    or None,
+)
+
+
+def warm_response_cache(limit):
+    """Seed the response cache with recent answers from the symptoms table."""
+    placeholders = ", ".join("?" for _ in AI_FALLBACK_REPLIES)
+    conn = db_pool.acquire()
+    try:
+        rows = conn.execute(
+            f"""
+            SELECT symptom, advice FROM symptoms
+            WHERE advice NOT IN ({placeholders})
+            ORDER BY id DESC LIMIT ?
+            """,
+            (*AI_FALLBACK_REPLIES, limit),
+        ).fetchall()
+    except sqlite3.Error as e:
+        print(f"Could not warm response cache: {str(e)}")
+        return 0
+    finally:
+        db_pool.release(conn)
+    # Oldest first so the most recent answers end up most recently used
+    return response_cache.warm(reversed(rows))
+
+
+if not CONTEXT_AWARENESS:
+    warm_response_cache(int(os.environ.get("RESPONSE_CACHE_WARM", 1000)))
+
+
+# Per-user preference cache consulted by before_request
+preference_cache = PreferenceCache(
+    max_size=int(os.environ.get("PREFERENCE_CACHE_SIZE", 10000)),
+    ttl=float(os.environ.get("PREFERENCE_CACHE_TTL", 300)),
+)
+
+# Each user's current week, trimester and baby size, recomputed once a day
+pregnancy_state_cache = PregnancyStateCache(
+    max_size=int(os.environ.get("PREGNANCY_STATE_CACHE_SIZE", 10000))
+)
 
 
 # Landing Route
@@ -91,7 +323,6 @@ def register():
             (name, phone, password),
         )
         conn.commit()
-        conn.close()
 
         flash("Registration successful! Please login.")
         return redirect(url_for("login"))
@@ -111,7 +342,6 @@ def login():
             "SELECT * FROM users WHERE phone=? AND password=?", (phone, password)
         )
         user = cur.fetchone()
-        conn.close()
 
         if user:
             session["user_id"] = user["id"]
@@ -150,20 +380,19 @@ def upload_record():
             return redirect(request.url)
 
         filename = f"user_{session['user_id']}_{secure_filename(file.filename or '')}"
-        filepath = os.path.join(app.config["UPLOAD_FOLDER"], filename)
-        file.save(filepath)
 
         conn = get_db_connection()
+        blob_hash, filepath = blob_store.add_stream(conn, file.stream)
         cur = conn.cursor()
         cur.execute(
             """
-            INSERT INTO health_records (user_id, file_name, file_path)
-            VALUES (?, ?, ?)
+            INSERT INTO health_records (user_id, file_name, file_path, blob_hash)
+            VALUES (?, ?, ?, ?)
         """,
-            (session["user_id"], filename, filepath),
+            (session["user_id"], filename, filepath, blob_hash),
         )
         conn.commit()
-        conn.close()
+        record_processor.enqueue(blob_hash, filename)
 
         flash("File uploaded successfully!")
         return redirect(url_for("records"))
@@ -171,31 +400,230 @@ def upload_record():
     return render_template("upload_record.html")
 
 
+# Resumable uploads (tus 1.0 style): POST creates an upload, PATCH appends a
+# chunk at Upload-Offset (chunks may be sent in parallel), HEAD reports the
+# offset to resume from. The record appears once the last byte is stored.
+TUS_HEADERS = {"Tus-Resumable": "1.0.0", "Cache-Control": "no-store"}
+
+
+def upload_error(error):
+    return jsonify({"error": str(error)}), error.status, TUS_HEADERS
+
+
+@app.route("/uploads", methods=["POST"])
+def create_upload():
+    if "user_id" not in session:
+        return jsonify({"error": "Not authenticated"}), 401
+
+    try:
+        length = int(request.headers.get("Upload-Length", ""))
+    except ValueError:
+        return jsonify({"error": "Upload-Length is required"}), 400, TUS_HEADERS
+
+    try:
+        metadata = parse_metadata(request.headers.get("Upload-Metadata"))
+        file_name = secure_filename(metadata.get("filename", ""))
+        if not file_name:
+            raise UploadError("Upload-Metadata must include a filename")
+        upload_id = resumable_uploads.create(session["user_id"], file_name, length)
+    except UploadError as e:
+        return upload_error(e)
+
+    headers = dict(TUS_HEADERS)
+    headers["Location"] = url_for("upload_status", upload_id=upload_id)
+    headers["Upload-Offset"] = "0"
+    return "", 201, headers
+
+
+@app.route("/uploads/<upload_id>", methods=["HEAD"])
+def upload_status(upload_id):
+    if "user_id" not in session:
+        return "", 401
+
+    try:
+        upload = resumable_uploads.get(upload_id, session["user_id"])
+    except UploadError as e:
+        return "", e.status, TUS_HEADERS
+
+    headers = dict(TUS_HEADERS)
+    headers["Upload-Offset"] = str(upload["received"])
+    headers["Upload-Length"] = str(upload["length"])
+    return "", 200, headers
+
+
+@app.route("/uploads/<upload_id>", methods=["PATCH"])
+def upload_chunk(upload_id):
+    if "user_id" not in session:
+        return jsonify({"error": "Not authenticated"}), 401
+
+    if request.mimetype != "application/offset+octet-stream":
+        return (
+            jsonify({"error": "Content-Type must be application/offset+octet-stream"}),
+            415,
+            TUS_HEADERS,
+        )
+    if request.content_length is None:
+        return jsonify({"error": "Content-Length is required"}), 411, TUS_HEADERS
+    try:
+        offset = int(request.headers.get("Upload-Offset", ""))
+    except ValueError:
+        return jsonify({"error": "Upload-Offset is required"}), 400, TUS_HEADERS
+
+    try:
+        received, completed = resumable_uploads.write_chunk(
+            upload_id,
+            session["user_id"],
+            offset,
+            request.stream,
+            request.content_length,
+        )
+    except UploadError as e:
+        return upload_error(e)
+
+    headers = dict(TUS_HEADERS)
+    headers["Upload-Offset"] = str(received)
+    if completed is not None:
+        record_processor.enqueue(completed["sha256"], completed["file_name"])
+        headers["Upload-Sha256"] = completed["sha256"]
+        headers["Location"] = url_for("records")
+    return "", 204, headers
+
+
+@app.route("/uploads/<upload_id>", methods=["DELETE"])
+def cancel_upload(upload_id):
+    if "user_id" not in session:
+        return jsonify({"error": "Not authenticated"}), 401
+
+    try:
+        resumable_uploads.delete(upload_id, session["user_id"])
+    except UploadError as e:
+        return upload_error(e)
+    return "", 204, TUS_HEADERS
+
+
+# Characters of extracted text shown under a record in the listing
+PREVIEW_CHARS = 160
+
+
+# One page of a user's records, newest first, keyed on (upload_date, id),
+# with the cached preview derivatives (never the original files)
+def records_page(user_id, cursor, limit):
+    conn = get_db_connection()
+    cur = conn.cursor()
+    after = decode_cursor(cursor, 2)
+    if after is None:
+        cur.execute(
+            """
+            SELECT r.id, r.file_name, r.upload_date,
+                   d.thumbnail_path IS NOT NULL AS has_thumbnail,
+                   substr(d.text, 1, ?) AS preview
+            FROM health_records r
+            LEFT JOIN blob_derivatives d ON d.blob_hash = r.blob_hash
+            WHERE r.user_id = ?
+            ORDER BY r.upload_date DESC, r.id DESC
+            LIMIT ?
+        """,
+            (PREVIEW_CHARS, user_id, limit + 1),
+        )
+    else:
+        cur.execute(
+            """
+            SELECT r.id, r.file_name, r.upload_date,
+                   d.thumbnail_path IS NOT NULL AS has_thumbnail,
+                   substr(d.text, 1, ?) AS preview
+            FROM health_records r
+            LEFT JOIN blob_derivatives d ON d.blob_hash = r.blob_hash
+            WHERE r.user_id = ? AND (r.upload_date, r.id) < (?, ?)
+            ORDER BY r.upload_date DESC, r.id DESC
+            LIMIT ?
+        """,
+            (PREVIEW_CHARS, user_id, after[0], after[1], limit + 1),
+        )
+    return split_page(cur.fetchall(), limit, lambda r: (r["upload_date"], r["id"]))
+
+
 # View Records (with download link)
 @app.route("/records")
 def records():
     if "user_id" not in session:
         return redirect(url_for("login"))
 
+    try:
+        records, next_cursor = records_page(
+            session["user_id"], request.args.get("cursor"), PAGE_SIZE
+        )
+    except ValueError:
+        return redirect(url_for("records"))
+
+    return stream_template("records.html", records=records, next_cursor=next_cursor)
+
+
+# Records as JSON for infinite scroll: ?cursor=<next_cursor>&limit=<n>
+@app.route("/api/records")
+def api_records():
+    if "user_id" not in session:
+        return jsonify({"error": "Not authenticated"}), 401
+
+    limit = page_limit(request.args.get("limit"), PAGE_SIZE, MAX_PAGE_SIZE)
+    try:
+        records, next_cursor = records_page(
+            session["user_id"], request.args.get("cursor"), limit
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    return jsonify(
+        {
+            "records": [
+                {
+                    "id": record["id"],
+                    "file_name": record["file_name"],
+                    "upload_date": record["upload_date"],
+                    "download_url": url_for("download_record", record_id=record["id"]),
+                    "thumbnail_url": (
+                        url_for("record_thumbnail", record_id=record["id"])
+                        if record["has_thumbnail"]
+                        else None
+                    ),
+                    "preview": record["preview"],
+                }
+                for record in records
+            ],
+            "next_cursor": next_cursor,
+        }
+    )
+
+
+# Download a record by name (older links; the newest upload of that name)
+@app.route("/download/<filename>")
+def download_file(filename):
+    if "user_id" not in session:
+        return redirect(url_for("login"))
+
     conn = get_db_connection()
     cur = conn.cursor()
     cur.execute(
         """
-        SELECT file_name, upload_date
+        SELECT file_path
         FROM health_records
-        WHERE user_id=?
+        WHERE user_id=? AND file_name=?
+        ORDER BY upload_date DESC
+        LIMIT 1
     """,
-        (session["user_id"],),
+        (session["user_id"], filename),
     )
-    records = cur.fetchall()
-    conn.close()
+    record = cur.fetchone()
 
-    return render_template("records.html", records=records)
+    if record and os.path.exists(record["file_path"]):
+        return download_sender.send(record["file_path"], filename)
+    else:
+        flash("File not found or unauthorized.")
+        return redirect(url_for("records"))
 
 
-# Download File Route
-@app.route("/download/<filename>")
-def download_file(filename):
+# Download one record; same-named uploads are separate records
+@app.route("/records/<int:record_id>/download")
+def download_record(record_id):
     if "user_id" not in session:
         return redirect(url_for("login"))
 
@@ -203,22 +631,138 @@ def download_file(filename):
     cur = conn.cursor()
     cur.execute(
         """
-        SELECT file_path
+        SELECT file_name, file_path
         FROM health_records
-        WHERE user_id=? AND file_name=?
+        WHERE id = ? AND user_id = ?
     """,
-        (session["user_id"], filename),
+        (record_id, session["user_id"]),
     )
     record = cur.fetchone()
-    conn.close()
 
     if record and os.path.exists(record["file_path"]):
-        return send_file(record["file_path"], as_attachment=True)
+        return download_sender.send(record["file_path"], record["file_name"])
     else:
         flash("File not found or unauthorized.")
         return redirect(url_for("records"))
 
 
+# Preview image generated by the record processor
+@app.route("/records/<int:record_id>/thumbnail")
+def record_thumbnail(record_id):
+    if "user_id" not in session:
+        return "", 401
+
+    conn = get_db_connection()
+    cur = conn.cursor()
+    cur.execute(
+        """
+        SELECT d.thumbnail_path
+        FROM health_records r
+        JOIN blob_derivatives d ON d.blob_hash = r.blob_hash
+        WHERE r.id = ? AND r.user_id = ?
+    """,
+        (record_id, session["user_id"]),
+    )
+    row = cur.fetchone()
+    if row is None or row["thumbnail_path"] is None:
+        return "", 404
+    path = os.path.abspath(row["thumbnail_path"])
+    if not os.path.exists(path):
+        return "", 404
+
+    # Thumbnails are named by content hash, so they never change
+    response = send_file(path, mimetype="image/jpeg", max_age=86400)
+    response.cache_control.public = False
+    response.cache_control.private = True
+    return response
+
+
+# Best matches of a search box entry among a user's records and symptoms.
+# Each index returns its top rows by rank (bm25, see migrations.py) so
+# snippets are only built for rows that can make the final list. bm25
+# scores from the two indexes come from different corpora and are not
+# comparable, so the lists are interleaved by position (record first).
+def search_entries(user_id, text, limit):
+    match = fts_query(text, user_id)
+    if match is None:
+        return []
+
+    conn = get_db_connection()
+    cur = conn.cursor()
+    cur.execute(
+        """
+        SELECT *, ROW_NUMBER() OVER (ORDER BY score) AS position FROM (
+            SELECT 'record' AS kind, r.id, r.file_name AS title,
+                   r.upload_date AS date,
+                   highlight(record_search, 1, char(2), char(3)) AS title_match,
+                   snippet(record_search, 2, char(2), char(3), '…', 16) AS snippet,
+                   record_search.rank AS score
+            FROM record_search
+            JOIN health_records r ON r.id = record_search.rowid
+            WHERE record_search MATCH ? AND r.user_id = ?
+            ORDER BY record_search.rank
+            LIMIT ?
+        )
+        UNION ALL
+        SELECT *, ROW_NUMBER() OVER (ORDER BY score) FROM (
+            SELECT 'symptom', s.id, s.symptom, s.date,
+                   highlight(symptom_search, 1, char(2), char(3)),
+                   snippet(symptom_search, 2, char(2), char(3), '…', 16),
+                   symptom_search.rank AS score
+            FROM symptom_search
+            JOIN symptoms s ON s.id = symptom_search.rowid
+            WHERE symptom_search MATCH ? AND s.user_id = ?
+            ORDER BY symptom_search.rank
+            LIMIT ?
+        )
+        ORDER BY position, kind
+        LIMIT ?
+    """,
+        (match, user_id, limit, match, user_id, limit, limit),
+    )
+    return [
+        {
+            "kind": row["kind"],
+            "id": row["id"],
+            "title": row["title"],
+            "date": row["date"],
+            "title_html": highlight(row["title_match"]),
+            "snippet_html": highlight(row["snippet"]),
+            "url": (
+                url_for("download_record", record_id=row["id"])
+                if row["kind"] == "record"
+                else None
+            ),
+        }
+        for row in cur.fetchall()
+    ]
+
+
+# Search health records (names and extracted text) and symptom history
+@app.route("/search")
+def search():
+    if "user_id" not in session:
+        return redirect(url_for("login"))
+
+    query = request.args.get("q", "").strip()
+    results = search_entries(session["user_id"], query, PAGE_SIZE)
+    return render_template("search.html", query=query, results=results)
+
+
+# Search results as JSON: ?q=<text>&limit=<n> (highlights are escaped HTML)
+@app.route("/api/search")
+def api_search():
+    if "user_id" not in session:
+        return jsonify({"error": "Not authenticated"}), 401
+
+    limit = page_limit(request.args.get("limit"), PAGE_SIZE, MAX_PAGE_SIZE)
+    results = search_entries(session["user_id"], request.args.get("q", ""), limit)
+    for result in results:
+        result["title_html"] = str(result["title_html"])
+        result["snippet_html"] = str(result["snippet_html"])
+    return jsonify({"results": results})
+
+
 # Symptom Checker Route (updated with Gemini AI integration)
 @app.route("/symptom_checker", methods=["GET", "POST"])
 def symptom_checker():
@@ -232,6 +776,76 @@ def symptom_checker():
     return render_template("symptom_checker.html", chat_history=session["chat_history"])
 
 
+# Build the Gemini prompt for a symptom question (shared by /chat and /chat/stream)
+def build_chat_prompt(user_message, chat_history):
+    # Check if context awareness is enabled from environment variable
+    if CONTEXT_AWARENESS:
+        # Get recent conversation history for context
+        history_to_include = chat_history[-10:]
+
+        # Include system instruction about pregnancy advice
+        system_instruction = """
+        You are a helpful medical assistant specializing in pregnancy-related symptoms.
+        Provide helpful information, potential causes, and general guidance. Include
+        a disclaimer that this is general information and the person should consult with
+        their healthcare provider for personalized medical advice.
+        """
+
+        return [
+            {
+                "role": "user",
+                "parts": [
+                    {
+                        "text": f"{system_instruction}\n\nConversation history:\n"
+                        + "\n".join(
+                            [
+                                f"{m['role']}: {m['content']}"
+                                for m in history_to_include[:-1]
+                            ]
+                        )
+                        + f"\n\nCurrent question: {user_message}"
+                    }
+                ],
+            }
+        ]
+
+    # Non-context aware mode - use simple prompt with pregnancy context
+    return f"""
+    You are a helpful medical assistant specializing in pregnancy-related symptoms.
+    Please provide information about the following pregnancy symptom or concern:
+
+    {user_message}
+
+    Provide helpful information, potential causes, and general guidance. Include
+    a disclaimer that this is general information and the person should consult with
+    their healthcare provider for personalized medical advice.
+    """
+
+
+# Record a finished exchange in the session history and the symptoms table
+def save_chat_reply(user_message, bot_message):
+    session.setdefault("chat_history", []).append(
+        {"role": "assistant", "content": bot_message}
+    )
+
+    # Persist limited history in session
+    if len(session["chat_history"]) > CHAT_HISTORY_LIMIT:
+        session["chat_history"] = session["chat_history"][-CHAT_HISTORY_LIMIT:]
+    session.modified = True
+
+    # Save symptom and AI advice to database
+    conn = get_db_connection()
+    cur = conn.cursor()
+    cur.execute(
+        "INSERT INTO symptoms (user_id, symptom, advice) VALUES (?, ?, ?)",
+        (session["user_id"], user_message, bot_message),
+    )
+    conn.commit()
+
+
+# Answers immediately from the response cache (or with a configuration
+# error); otherwise starts a Gemini job and returns 202 with its id, so the
+# worker never waits on the model. The reply is collected from /chat/<job>.
 @app.route("/chat", methods=["POST"])
 def chat():
     if "user_id" not in session:
@@ -249,124 +863,174 @@ def chat():
 
     # Add user message to chat history
     session["chat_history"].append({"role": "user", "content": user_message})
+    session.modified = True
 
     try:
         # Check if Gemini API is properly configured
-        if not GEMINI_API_KEY:
+        if not GEMINI_API_KEY and not GEMINI_FAKE:
             bot_message = "AI service not properly configured. Please contact support."
-        elif client is None:
+        elif gemini is None:
             bot_message = "AI model could not be initialized. Please try again later."
         else:
-            try:
-                # Check if context awareness is enabled from environment variable
-                if CONTEXT_AWARENESS:
-                    print("Using context-aware conversation mode")
-                    # Get recent conversation history for context
-                    history_to_include = (
-                        session["chat_history"][-10:]
-                        if len(session["chat_history"]) > 10
-                        else session["chat_history"]
+            # Non-contextual answers depend only on the question, so
+            # repeated questions can be served from the response cache
+            bot_message = None
+            if not CONTEXT_AWARENESS:
+                bot_message = response_cache.get(user_message)
+
+            if bot_message is None:
+                try:
+                    job_id = gemini.start(
+                        build_chat_prompt(user_message, session["chat_history"]),
+                        owner=session["user_id"],
+                        data=user_message,
                     )
-
-                    # Format conversation history for the Gemini model
-                    formatted_history = []
-                    for msg in history_to_include:
-                        if msg["role"] == "user":
-                            formatted_history.append(
-                                {"role": "user", "parts": [msg["content"]]}
-                            )
-                        else:
-                            formatted_history.append(
-                                {"role": "model", "parts": [msg["content"]]}
-                            )
-
-                    # Start a new conversation with history
-                    print("Starting conversation with history")
-
-                    # Include system instruction about pregnancy advice
-                    system_instruction = """
-                    You are a helpful medical assistant specializing in pregnancy-related symptoms.
-                    Provide helpful information, potential causes, and general guidance. Include
-                    a disclaimer that this is general information and the person should consult with
-                    their healthcare provider for personalized medical advice.
-                    """
-
-                    # Add latest user query
-                    print("Generating contextual response")
-                    response = client.models.generate_content(
-                        model="gemini-2.0-flash",
-                        contents=[
-                            {
-                                "role": "user",
-                                "parts": [
-                                    {
-                                        "text": f"{system_instruction}\n\nConversation history:\n"
-                                        + "\n".join(
-                                            [
-                                                f"{m['role']}: {m['content']}"
-                                                for m in history_to_include[:-1]
-                                            ]
-                                        )
-                                        + f"\n\nCurrent question: {user_message}"
-                                    }
-                                ],
-                            }
-                        ],
-                    )
-                    bot_message = response.text
-                    print("Contextual response generated")
-                else:
-                    # Non-context aware mode - use simple prompt
-                    print("Using standard non-context mode")
-                    # Prepare prompt with pregnancy context
-                    prompt = f"""
-                    You are a helpful medical assistant specializing in pregnancy-related symptoms.
-                    Please provide information about the following pregnancy symptom or concern:
-
-                    {user_message}
-
-                    Provide helpful information, potential causes, and general guidance. Include
-                    a disclaimer that this is general information and the person should consult with
-                    their healthcare provider for personalized medical advice.
-                    """
-
-                    # Generate response using the new client approach
-                    response = client.models.generate_content(
-                        model="gemini-2.0-flash", contents=prompt
+                    return (
+                        jsonify({"job": job_id, "history": session["chat_history"]}),
+                        202,
                     )
+                except GeminiBusy:
+                    bot_message = AI_BUSY_REPLY
 
-                    # Get text from response
-                    bot_message = response.text
+        save_chat_reply(user_message, bot_message)
+        return jsonify({"reply": bot_message, "history": session["chat_history"]})
 
-                # Ensure we have valid text content
-                if not bot_message or bot_message.strip() == "":
-                    bot_message = "I'm sorry, I couldn't generate a proper response. Please try again or contact support if the issue persists."
-            except Exception as api_error:
-                print(f"Gemini API Error: {str(api_error)}")
-                bot_message = "I apologize, but I'm having trouble connecting to the AI service right now. Please try again in a few moments."
+    except Exception as e:
+        print(f"Chat endpoint error: {str(e)}")
+        return jsonify({"error": f"An unexpected error occurred: {str(e)}"}), 500
 
-        # Add bot response to chat history
-        session["chat_history"].append({"role": "assistant", "content": bot_message})
 
-        # Persist limited history in session
-        if len(session["chat_history"]) > 20:
-            session["chat_history"] = session["chat_history"][-20:]
+# Progress of a /chat job: text received after ``offset`` while it runs, then
+# the full reply once (which is when it is cached, saved and added to history)
+@app.route("/chat/<job_id>")
+def chat_job(job_id):
+    if "user_id" not in session:
+        return jsonify({"error": "Not authenticated"}), 401
 
-        # Save symptom and AI advice to database
+    user_id = session["user_id"]
+    job = gemini.job(job_id, owner=user_id) if gemini is not None else None
+    if job is None:
+        return jsonify({"error": "Unknown chat job"}), 404
+
+    if not job.done:
+        text = job.text()
+        offset = min(max(request.args.get("offset", 0, type=int), 0), len(text))
+        return jsonify({"done": False, "delta": text[offset:], "offset": len(text)})
+
+    job = gemini.collect(job_id, owner=user_id)
+    if job is None:
+        return jsonify({"error": "Unknown chat job"}), 404
+    user_message = job.data
+    metrics.observe("gemini_seconds", job.elapsed, call="job")
+
+    error = job.error()
+    bot_message = job.text()
+    if isinstance(error, GeminiTimeout):
+        bot_message = AI_TIMEOUT_REPLY
+    elif error is not None:
+        print(f"Gemini API Error: {str(error)}")
+        bot_message = AI_ERROR_REPLY
+    elif not bot_message.strip():
+        bot_message = AI_EMPTY_REPLY
+    elif not CONTEXT_AWARENESS:
+        response_cache.put(user_message, bot_message)
+
+    try:
+        save_chat_reply(user_message, bot_message)
+    except Exception as e:
+        print(f"Chat endpoint error: {str(e)}")
+        return jsonify({"error": f"An unexpected error occurred: {str(e)}"}), 500
+    return jsonify(
+        {"done": True, "reply": bot_message, "history": session["chat_history"]}
+    )
+
+
+# Streaming variant of /chat: forwards Gemini chunks as Server-Sent Events
+@app.route("/chat/stream", methods=["POST"])
+def chat_stream():
+    if "user_id" not in session:
+        return jsonify({"error": "Not authenticated"}), 401
+
+    data = request.json or {}
+    user_message = data.get("message", "").strip()
+
+    if not user_message:
+        return jsonify({"error": "No message provided"}), 400
+
+    if not GEMINI_API_KEY and not GEMINI_FAKE:
+        return jsonify({"error": "AI service not properly configured."}), 503
+    if gemini is None:
+        return jsonify({"error": "AI model could not be initialized."}), 503
+
+    # Record the user's message before the response headers go out
+    chat_history = session.get("chat_history", [])
+    chat_history.append({"role": "user", "content": user_message})
+    session["chat_history"] = chat_history[-CHAT_HISTORY_LIMIT:]
+
+    cached = None if CONTEXT_AWARENESS else response_cache.get(user_message)
+    try:
+        if cached is not None:
+            chunks = iter([cached])
+        else:
+            chunks = metrics.timed_iter(
+                gemini.stream(build_chat_prompt(user_message, chat_history)),
+                "gemini_seconds",
+                call="stream",
+            )
+    except GeminiBusy:
+        return (
+            jsonify({"error": "The AI assistant is busy. Please try again shortly."}),
+            503,
+        )
+
+    user_id = session["user_id"]
+
+    def sse(payload):
+        return f"data: {json.dumps(payload)}\n\n"
+
+    def generate():
+        parts = []
+        failed = False
+        try:
+            for text in chunks:
+                parts.append(text)
+                yield sse({"delta": text})
+        except GeminiTimeout:
+            parts.append("\n\n" + AI_TIMEOUT_REPLY)
+            failed = True
+        except Exception as api_error:
+            print(f"Gemini API Error: {str(api_error)}")
+            parts.append(AI_ERROR_REPLY)
+            failed = True
+
+        bot_message = "".join(parts)
+        if not bot_message.strip():
+            bot_message = AI_EMPTY_REPLY
+        elif cached is None and not failed and not CONTEXT_AWARENESS:
+            response_cache.put(user_message, bot_message)
+
+        # Save symptom and AI advice to database once the reply is complete
         conn = get_db_connection()
         cur = conn.cursor()
         cur.execute(
             "INSERT INTO symptoms (user_id, symptom, advice) VALUES (?, ?, ?)",
-            (session["user_id"], user_message, bot_message),
+            (user_id, user_message, bot_message),
         )
         conn.commit()
-        conn.close()
 
-        return jsonify({"reply": bot_message, "history": session["chat_history"]})
+        # Server-side sessions can still be written after the headers were sent
+        if hasattr(app.session_interface, "persist"):
+            chat_history.append({"role": "assistant", "content": bot_message})
+            session["chat_history"] = chat_history[-CHAT_HISTORY_LIMIT:]
+            app.session_interface.persist(app, session)
 
-    except Exception as e:
-        print(f"Chat endpoint error: {str(e)}")
-        return jsonify({"error": f"An unexpected error occurred: {str(e)}"}), 500
+        yield sse({"done": True, "reply": bot_message})
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @app.route("/clear_chat", methods=["POST"])
@@ -376,50 +1040,57 @@ def clear_chat():
     return jsonify({"status": "success", "message": "Chat history cleared"})
 
 
+# Every diet plan, precomputed from the rule table at startup
+diet_plans = DietPlans.from_file(os.environ.get("DIET_RULES_FILE", DEFAULT_RULES_PATH))
+
+# Seven-day plans solved against nutrient targets (cached per selection)
+meal_planner = MealPlanner.from_file(os.environ.get("FOODS_FILE", DEFAULT_FOODS_PATH))
+
+
 # Diet Plan Route
 @app.route("/diet_plan", methods=["GET", "POST"])
 def diet_plan():
     if "user_id" not in session:
         return redirect(url_for("login"))
 
-    # Predefined options
-    trimesters = ["First Trimester", "Second Trimester", "Third Trimester"]
-    health_conditions = [
-        "None",
-        "Gestational Diabetes",
-        "Hypertension",
-        "Anemia",
-        "Nausea",
-        "Constipation",
-    ]
-    diets = ["Vegetarian", "Vegan", "Non-Vegetarian"]
-    cultures = ["Indian", "Mediterranean", "Western", "Asian"]
-
     # Default selected values
     selected_trimester = None
     selected_condition = None
     selected_diet = None
     selected_culture = None
+    selected_length = "day"
     selected_plan = None
+    weekly_plan = None
 
     if request.method == "POST":
         selected_trimester = request.form["trimester"]
         selected_condition = request.form["condition"]
         selected_diet = request.form["diet"]
         selected_culture = request.form["culture"]
-
-        # Generate diet plan based on inputs
-        selected_plan = generate_diet_plan(
-            selected_trimester, selected_condition, selected_diet, selected_culture
+        selected_length = request.form.get("plan_length", "day")
+
+        # None (no plan shown) for values that are not in the rule table
+        selections = (
+            selected_trimester,
+            selected_condition,
+            selected_diet,
+            selected_culture,
         )
+        if selected_length == "week":
+            weekly_plan = meal_planner.plan_week(*selections)
+        else:
+            selected_plan = diet_plans.plan(*selections)
 
     return render_template(
         "diet_plan.html",
-        trimesters=trimesters,
-        health_conditions=health_conditions,
-        diets=diets,
-        cultures=cultures,
+        trimesters=diet_plans.options["trimester"],
+        health_conditions=diet_plans.options["condition"],
+        diets=diet_plans.options["diet"],
+        cultures=diet_plans.options["culture"],
         selected_plan=selected_plan,
+        weekly_plan=weekly_plan,
+        nutrients=meal_planner.nutrient_info,
+        selected_length=selected_length,
         selected_trimester=selected_trimester,
         selected_condition=selected_condition,
         selected_diet=selected_diet,
@@ -427,146 +1098,6 @@ def diet_plan():
     )
 
 
-def generate_diet_plan(trimester, condition, diet_type, culture):
-    # 🌱 Start with trimester-specific meals (base diet)
-    diet = {}
-
-    if trimester == "First Trimester":
-        diet = {
-            "Breakfast": "Whole grain toast with avocado & boiled egg",
-            "Snack": "Ginger tea with crackers",
-            "Lunch": "Vegetable soup with whole grain bread",
-            "Evening Snack": "Fruit salad with almonds",
-            "Dinner": "Light khichdi with mint chutney",
-        }
-    elif trimester == "Second Trimester":
-        diet = {
-            "Breakfast": "Oats with chia seeds, banana, and walnuts",
-            "Snack": "Greek yogurt with berries",
-            "Lunch": "Grilled chicken with quinoa and spinach salad",
-            "Evening Snack": "Boiled egg with flaxseed",
-            "Dinner": "Palak paneer with brown rice",
-        }
-    elif trimester == "Third Trimester":
-        diet = {
-            "Breakfast": "Ragi porridge with dates & almonds",
-            "Snack": "Milk with dry fruits",
-            "Lunch": "Lentil curry with spinach and brown rice",
-            "Evening Snack": "Sesame laddoo with coconut water",
-            "Dinner": "Stuffed paratha with vegetable soup",
-        }
-
-    # 💉 Layer: Health Condition Adjustments
-    if condition == "Gestational Diabetes":
-        diet.update(
-            {
-                "Breakfast": "Oats with chia, flaxseed & cinnamon (low GI)",
-                "Snack": "Roasted chickpeas and cucumber sticks",
-                "Lunch": "Grilled chicken with quinoa and leafy greens (low GI)",
-                "Evening Snack": "Nuts, seeds, and berries (low sugar)",
-            }
-        )
-    elif condition == "Hypertension":
-        diet.update(
-            {
-                "Breakfast": "Banana smoothie with flaxseed",
-                "Snack": "Watermelon salad with mint",
-                "Lunch": "Grilled salmon with sweet potato & spinach",
-                "Evening Snack": "Yogurt with flaxseed",
-            }
-        )
-    elif condition == "Anemia":
-        diet.update(
-            {
-                "Breakfast": "Beetroot and carrot smoothie",
-                "Snack": "Dates stuffed with almonds",
-                "Lunch": "Spinach dal with brown rice",
-                "Evening Snack": "Pomegranate juice",
-            }
-        )
-    elif condition == "Nausea":
-        diet.update(
-            {
-                "Breakfast": "Dry toast with ginger lemon tea",
-                "Snack": "Crackers with nut butter",
-                "Lunch": "Light vegetable broth with rice crackers",
-            }
-        )
-    elif condition == "Constipation":
-        diet.update(
-            {
-                "Breakfast": "Flaxseed oatmeal with prunes",
-                "Snack": "Papaya cubes with lemon",
-                "Lunch": "Palak curry with brown rice",
-                "Evening Snack": "Chia pudding with mango",
-            }
-        )
-
-    # 🌿 Layer: Dietary Preference (only apply if needed)
-    if diet_type == "Vegetarian":
-        diet.update(
-            {
-                "Lunch": "Palak paneer with quinoa",
-                "Dinner": "Rajma curry with brown rice & salad",
-            }
-        )
-    elif diet_type == "Vegan":
-        diet.update(
-            {
-                "Lunch": "Chickpea quinoa salad",
-                "Dinner": "Tofu stir fry with millet",
-            }
-        )
-    elif diet_type == "Non-Vegetarian":
-        diet.update(
-            {
-                "Lunch": "Chicken curry with brown rice",
-                "Dinner": "Grilled fish with roasted vegetables",
-            }
-        )
-
-    # 🌎 Layer: Cultural Customization
-    if culture == "Indian":
-        diet.update(
-            {
-                "Breakfast": "Poha with peanuts & curry leaves",
-                "Lunch": "Dal tadka with roti and vegetable sabzi",
-                "Dinner": "Aloo methi with curd and roti",
-            }
-        )
-    elif culture == "Mediterranean":
-        diet.update(
-            {
-                "Breakfast": "Greek yogurt with figs, walnuts & honey",
-                "Lunch": "Falafel bowl with hummus & tabbouleh",
-                "Dinner": "Grilled eggplant with tahini sauce and couscous",
-            }
-        )
-    elif culture == "Western":
-        diet.update(
-            {
-                "Breakfast": "Scrambled eggs with avocado toast",
-                "Lunch": "Chicken Caesar salad",
-                "Dinner": "Baked salmon with quinoa and vegetables",
-            }
-        )
-    elif culture == "Asian":
-        diet.update(
-            {
-                "Breakfast": "Rice porridge with vegetables",
-                "Lunch": "Stir-fried tofu with vegetables & rice",
-                "Dinner": "Miso soup with vegetable sushi (cooked options)",
-            }
-        )
-
-    # 💧 Final touch: Hydration (always same)
-    diet["Hydration"] = (
-        "At least 10 glasses of water, including coconut water & herbal teas."
-    )
-
-    return diet
-
-
 # Book Appointment
 
 
@@ -605,13 +1136,14 @@ def book_appointment():
         specialization = request.form["specialization"]
         location = request.form["location"]
 
-        # Fetch real hospitals
-        result = get_hospitals(location=location, specialization=specialization)
-        hospitals = result.get("hospitals", [])
-        if "error" in result:
-            flash(str(result["error"]))
-
-        if "confirm" in request.form:
+        if "confirm" not in request.form:
+            # Fetch real hospitals (the confirm step only needs the chosen name)
+            with metrics.timer("hospital_search_seconds"):
+                result = get_hospitals(location=location, specialization=specialization)
+            hospitals = result.get("hospitals", [])
+            if "error" in result:
+                flash(str(result["error"]))
+        else:
             hospital_name = request.form["hospital_name"]
             date = request.form["date"]
             time = request.form["time"]
@@ -626,7 +1158,8 @@ def book_appointment():
                 (session["user_id"], hospital_name, specialization, date, time),
             )
             conn.commit()
-            conn.close()
+            # Schedule the reminder now in case it is due before the next refill
+            reminder_scheduler.wake()
 
             flash(f"Appointment booked at {hospital_name} on {date} at {time}.")
             return redirect(url_for("appointments"))
@@ -636,36 +1169,83 @@ def book_appointment():
     )
 
 
+# One page of a user's appointments, latest first, keyed on (date, time, id)
+def appointments_page(user_id, cursor, limit):
+    conn = get_db_connection()
+    cur = conn.cursor()
+    after = decode_cursor(cursor, 3)
+    if after is None:
+        cur.execute(
+            """
+            SELECT id, hospital_name, specialization, date, time, status
+            FROM appointments
+            WHERE user_id = ?
+            ORDER BY date DESC, time DESC, id DESC
+            LIMIT ?
+        """,
+            (user_id, limit + 1),
+        )
+    else:
+        cur.execute(
+            """
+            SELECT id, hospital_name, specialization, date, time, status
+            FROM appointments
+            WHERE user_id = ? AND (date, time, id) < (?, ?, ?)
+            ORDER BY date DESC, time DESC, id DESC
+            LIMIT ?
+        """,
+            (user_id, after[0], after[1], after[2], limit + 1),
+        )
+    return split_page(cur.fetchall(), limit, lambda r: (r["date"], r["time"], r["id"]))
+
+
 # View Appointments
 @app.route("/appointments")
 def appointments():
     if "user_id" not in session:
         return redirect(url_for("login"))
 
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute(
-        """
-        SELECT id, hospital_name, specialization, date, time, status
-        FROM appointments
-        WHERE user_id=?
-    """,
-        (session["user_id"],),
+    try:
+        appointments, next_cursor = appointments_page(
+            session["user_id"], request.args.get("cursor"), PAGE_SIZE
+        )
+    except ValueError:
+        return redirect(url_for("appointments"))
+
+    return stream_template(
+        "appointments.html", appointments=appointments, next_cursor=next_cursor
     )
-    appointments = cur.fetchall()
-    conn.close()
 
-    return render_template("appointments.html", appointments=appointments)
+
+# Appointments as JSON for infinite scroll: ?cursor=<next_cursor>&limit=<n>
+@app.route("/api/appointments")
+def api_appointments():
+    if "user_id" not in session:
+        return jsonify({"error": "Not authenticated"}), 401
+
+    limit = page_limit(request.args.get("limit"), PAGE_SIZE, MAX_PAGE_SIZE)
+    try:
+        appointments, next_cursor = appointments_page(
+            session["user_id"], request.args.get("cursor"), limit
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    return jsonify(
+        {
+            "appointments": [dict(appointment) for appointment in appointments],
+            "next_cursor": next_cursor,
+        }
+    )
 
 
 def get_exercises():
-    conn = sqlite3.connect("pregnancy.db")
+    conn = get_db_connection()
     cursor = conn.cursor()
     cursor.execute("SELECT name, image, reps FROM exercises")
     exercises = [
         {"name": row[0], "image": row[1], "reps": row[2]} for row in cursor.fetchall()
     ]
-    conn.close()
     return exercises
 
 
@@ -679,14 +1259,31 @@ def exercises():
 # Pregnancy Tracker Page
 @app.route("/pregnancy")
 def pregnancy():
+    # Calculations are only stored for signed-in users
+    if "user_id" not in session:
+        return render_template("pregnancy.html", pregnancy_data=[], pregnancy_state={})
+
     conn = get_db_connection()
     cur = conn.cursor()
     cur.execute(
-        "SELECT id, date_type, input_date, calculated_due_date FROM pregnancy_records"
+        """
+        SELECT id, date_type, input_date, calculated_due_date
+        FROM pregnancy_records
+        WHERE user_id = ?
+        ORDER BY id DESC
+        LIMIT ?
+        """,
+        (session["user_id"], PREGNANCY_HISTORY_SIZE),
+    )
+    pregnancy_data = [
+        dict(row, calculated_due_date=display_date(row["calculated_due_date"]))
+        for row in cur.fetchall()
+    ]
+    return render_template(
+        "pregnancy.html",
+        pregnancy_data=pregnancy_data,
+        pregnancy_state=current_pregnancy_state(session["user_id"]),
     )
-    pregnancy_data = cur.fetchall()
-    conn.close()
-    return render_template("pregnancy.html", pregnancy_data=pregnancy_data)
 
 
 # Baby size data by week
@@ -715,9 +1312,99 @@ BABY_SIZE_DATA = {
     18: {"size": "144 mm", "weight": "190g", "comparison": "Bell pepper"},
     19: {"size": "152 mm", "weight": "240g", "comparison": "Mango"},
     20: {"size": "160 mm", "weight": "300g", "comparison": "Banana"},
-    # ... Add data for weeks 21-40
+    # From week 21 babies are measured head to heel rather than head to bottom
+    21: {"size": "267 mm", "weight": "360g", "comparison": "Carrot"},
+    22: {"size": "278 mm", "weight": "430g", "comparison": "Spaghetti squash"},
+    23: {"size": "289 mm", "weight": "500g", "comparison": "Large mango"},
+    24: {"size": "300 mm", "weight": "600g", "comparison": "Ear of corn"},
+    25: {"size": "346 mm", "weight": "660g", "comparison": "Rutabaga"},
+    26: {"size": "356 mm", "weight": "760g", "comparison": "Head of lettuce"},
+    27: {"size": "366 mm", "weight": "875g", "comparison": "Cauliflower"},
+    28: {"size": "376 mm", "weight": "1kg", "comparison": "Eggplant"},
+    29: {"size": "386 mm", "weight": "1.2kg", "comparison": "Butternut squash"},
+    30: {"size": "399 mm", "weight": "1.3kg", "comparison": "Cabbage"},
+    31: {"size": "411 mm", "weight": "1.5kg", "comparison": "Coconut"},
+    32: {"size": "424 mm", "weight": "1.7kg", "comparison": "Jicama"},
+    33: {"size": "437 mm", "weight": "1.9kg", "comparison": "Pineapple"},
+    34: {"size": "450 mm", "weight": "2.1kg", "comparison": "Cantaloupe"},
+    35: {"size": "462 mm", "weight": "2.4kg", "comparison": "Honeydew melon"},
+    36: {"size": "474 mm", "weight": "2.6kg", "comparison": "Romaine lettuce"},
+    37: {"size": "486 mm", "weight": "2.9kg", "comparison": "Swiss chard"},
+    38: {"size": "498 mm", "weight": "3.1kg", "comparison": "Leek"},
+    39: {"size": "507 mm", "weight": "3.3kg", "comparison": "Small watermelon"},
+    40: {"size": "512 mm", "weight": "3.5kg", "comparison": "Small pumpkin"},
 }
 
+DISPLAY_DATE_FORMAT = "%B %d, %Y"
+
+
+def display_date(value):
+    """A stored ISO date as shown on the pregnancy page; other text as is."""
+    try:
+        return pregnancy_dates.parse_date(value).strftime(DISPLAY_DATE_FORMAT)
+    except (TypeError, ValueError):
+        return value
+
+
+def baby_size(week):
+    """Size line for ``week``; None outside the table (e.g. after week 40)."""
+    size_info = BABY_SIZE_DATA.get(week)
+    if size_info is None:
+        return None
+    return f"{size_info['size']} and {size_info['weight']} (about the size of a {size_info['comparison']})"
+
+
+def pregnancy_state(conception_date, due_date, today):
+    """Week, trimester, baby size and days remaining on ``today``."""
+    state = pregnancy_dates.progress(conception_date, due_date, today)
+    week = state["current_week"]
+    state["due_date"] = due_date.strftime(DISPLAY_DATE_FORMAT)
+    state["baby_size"] = baby_size(week)
+    state["message"] = get_week_message(week)
+    return state
+
+
+def current_pregnancy_state(user_id):
+    """
+    ``pregnancy_state()`` of the user's latest calculation ({} if none),
+    computed on the first request of the day for that calculation and
+    cached until the next.
+    """
+    today = date.today()
+    # Read from the (user_id, id, ...) index alone; comparing the id keeps
+    # the cache right when another worker process saved a newer calculation
+    conn = get_db_connection()
+    cur = conn.cursor()
+    cur.execute(
+        """
+        SELECT id, calculated_due_date, conception_date
+        FROM pregnancy_records
+        WHERE user_id = ?
+        ORDER BY id DESC
+        LIMIT 1
+        """,
+        (user_id,),
+    )
+    row = cur.fetchone()
+    record_id = row["id"] if row is not None else None
+    state = pregnancy_state_cache.get(user_id, today, record_id)
+    if state is not None:
+        return state
+
+    state = {}
+    if row is not None:
+        try:
+            state = pregnancy_state(
+                pregnancy_dates.parse_date(row["conception_date"]),
+                pregnancy_dates.parse_date(row["calculated_due_date"]),
+                today,
+            )
+        except (TypeError, ValueError):
+            # Saved before conception dates were stored
+            pass
+    pregnancy_state_cache.set(user_id, today, record_id, state)
+    return state
+
 
 @app.route("/calculate_due_date", methods=["POST"])
 def calculate_due_date():
@@ -726,77 +1413,44 @@ def calculate_due_date():
         input_date_str = request.form.get("input_date")
         if not input_date_str:
             return jsonify({"error": "Input date is required"})
-        input_date = datetime.strptime(input_date_str, "%Y-%m-%d")
-        today = datetime.now()
-
-        # Calculate conception and due dates based on input type
-        if date_type == "Ultrasound":
-            # Get weeks and days from ultrasound measurements
-            us_weeks = int(request.form.get("us_weeks", 0))
-            us_days = int(request.form.get("us_days", 0))
-
-            # Calculate total days of pregnancy at ultrasound
-            total_pregnancy_days = (us_weeks * 7) + us_days
-
-            # Calculate conception date by subtracting pregnancy length from ultrasound date
-            # and adding 14 days (LMP to conception offset)
-            conception_date = input_date - timedelta(days=total_pregnancy_days - 14)
-
-            # Calculate due date from conception date
-            due_date = conception_date + timedelta(days=266)
-        elif date_type == "LMP":
-            cycle_length = int(request.form.get("cycle_length", 28))
-            ovulation_day = cycle_length - 14
-            conception_date = input_date + timedelta(days=ovulation_day)
-            due_date = input_date + timedelta(days=280)
-        elif date_type == "Conception Date":
-            conception_date = input_date
-            due_date = input_date + timedelta(days=266)
-        elif date_type == "Due Date":
-            due_date = input_date
-            conception_date = input_date - timedelta(days=266)
-        elif date_type == "IVF Transfer Date":
-            embryo_age = int(request.form.get("embryo_age", 3))
-            conception_date = input_date - timedelta(days=embryo_age)
-            due_date = conception_date + timedelta(days=266)
-        else:
-            return jsonify({"error": f"Unsupported date type: {date_type}"})
-
-        # Calculate current week and days remaining
-        days_pregnant = (
-            today - conception_date
-        ).days + 14  # Add 14 days as pregnancy is counted from LMP
-        current_week = (days_pregnant // 7) + 1
-        days_remaining = (due_date - today).days
-
-        # Determine trimester
-        if current_week <= 13:
-            trimester = "First Trimester"
-        elif current_week <= 26:
-            trimester = "Second Trimester"
-        else:
-            trimester = "Third Trimester"
-
-        # Get baby size information
-        size_info = BABY_SIZE_DATA.get(
-            current_week,
-            {
-                "size": "Not available",
-                "weight": "Not available",
-                "comparison": "Not available",
-            },
+        params = {
+            name: pregnancy_dates.parse_param(name, request.form.get(name))
+            for name in pregnancy_dates.DEFAULTS
+        }
+        conception_date, due_date = pregnancy_dates.conception_and_due(
+            date_type, pregnancy_dates.parse_date(input_date_str), **params
         )
-        baby_size = f"{size_info['size']} and {size_info['weight']} (about the size of a {size_info['comparison']})"
+        today = date.today()
+        state = pregnancy_state(conception_date, due_date, today)
+
+        if "user_id" in session:
+            conn = get_db_connection()
+            cur = conn.cursor()
+            cur.execute(
+                """
+                INSERT INTO pregnancy_records
+                    (user_id, date_type, input_date, cycle_length, embryo_age,
+                     calculated_due_date, conception_date, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+                """,
+                (
+                    session["user_id"],
+                    date_type,
+                    input_date_str,
+                    params["cycle_length"],
+                    params["embryo_age"],
+                    due_date.isoformat(),
+                    conception_date.isoformat(),
+                ),
+            )
+            conn.commit()
+            # The newest calculation is the user's current pregnancy
+            pregnancy_state_cache.set(session["user_id"], today, cur.lastrowid, state)
 
         return jsonify(
             {
-                "due_date": due_date.strftime("%B %d, %Y"),
-                "current_week": current_week,
-                "trimester": trimester,
-                "baby_size": baby_size,
-                "conception_date": conception_date.strftime("%B %d, %Y"),
-                "days_remaining": days_remaining,
-                "message": get_week_message(current_week),
+                **state,
+                "conception_date": conception_date.strftime(DISPLAY_DATE_FORMAT),
             }
         )
 
@@ -804,6 +1458,84 @@ def calculate_due_date():
         return jsonify({"error": str(e)})
 
 
+@app.route("/calculate_due_date/batch", methods=["POST"])
+def calculate_due_date_batch():
+    """
+    Due dates for many patients at once, from a CSV (uploaded as ``file``
+    or sent as ``text/csv``) or a JSON list of rows with the same fields as
+    the calculator form. Answers in the same format unless ``format`` is
+    given; CSV answers repeat the input columns before the results.
+    """
+    if "user_id" not in session:
+        return jsonify({"error": "Not authenticated"}), 401
+
+    too_many = f"At most {DUE_DATE_BATCH_MAX_ROWS} rows per batch"
+    # Refuse oversized bodies before they are read, not after parsing; with a
+    # Content-Length the WSGI layer never reads past it
+    if request.content_length is None:
+        return jsonify({"error": "Content-Length is required"}), 411
+    if request.content_length > DUE_DATE_BATCH_MAX_BYTES:
+        return (
+            jsonify({"error": f"At most {DUE_DATE_BATCH_MAX_BYTES} bytes per batch"}),
+            413,
+        )
+    try:
+        upload = request.files.get("file")
+        if upload is not None or request.mimetype == "text/csv":
+            source = "csv"
+            stream = upload.stream if upload is not None else request.stream
+            columns = pregnancy_dates.read_csv_columns(
+                io.TextIOWrapper(stream, encoding="utf-8-sig", newline=""),
+                max_rows=DUE_DATE_BATCH_MAX_ROWS + 1,
+            )
+            as_of = request.form.get("as_of")
+        else:
+            source = "json"
+            body = request.get_json(silent=True)
+            if isinstance(body, dict):
+                rows, as_of = body.get("rows"), body.get("as_of")
+            else:
+                rows, as_of = body, None
+            if not isinstance(rows, list) or not all(
+                isinstance(row, dict) for row in rows
+            ):
+                return jsonify({"error": "Expected a list of rows or a CSV"}), 400
+            if len(rows) > DUE_DATE_BATCH_MAX_ROWS:
+                return jsonify({"error": too_many}), 413
+            columns = pregnancy_dates.rows_to_columns(rows)
+        as_of = as_of or request.args.get("as_of")
+        today = pregnancy_dates.parse_date(as_of) if as_of else None
+    except (UnicodeDecodeError, csv.Error, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+
+    count = max((len(values) for values in columns.values()), default=0)
+    if count > DUE_DATE_BATCH_MAX_ROWS:
+        return jsonify({"error": too_many}), 413
+    try:
+        result = pregnancy_dates.calculate_batch(columns, today)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    if request.args.get("format", source) == "csv":
+        out = io.StringIO()
+        pregnancy_dates.write_csv_columns(
+            out, {**columns, **pregnancy_dates.output_columns(result)}
+        )
+        return Response(
+            out.getvalue(),
+            mimetype="text/csv",
+            headers={"Content-Disposition": "attachment; filename=due_dates.csv"},
+        )
+    records = pregnancy_dates.output_records(result)
+    return jsonify(
+        {
+            "count": result["count"],
+            "errors": sum(1 for record in records if record["error"]),
+            "results": records,
+        }
+    )
+
+
 def get_week_message(week):
     """Return a specific message based on the current week of pregnancy."""
     if week < 1:
@@ -898,7 +1630,6 @@ def profile1():
     # Fetch user profile data
     cur.execute("SELECT * FROM pregnancy_profile WHERE user_id = ?", (user_id,))
     profile = cur.fetchone()
-    conn.close()
 
     return render_template("profile1.html", profile=profile)
 
@@ -980,7 +1711,6 @@ def save_profile():
         )
 
     conn.commit()
-    conn.close()
 
     return redirect("/profile1")
 
@@ -1001,7 +1731,6 @@ def settings():
         "SELECT * FROM user_preferences WHERE user_id = ?", (session["user_id"],)
     )
     preferences_row = cur.fetchone()
-    conn.close()
 
     # Create a default preferences dictionary
     default_preferences = {
@@ -1080,7 +1809,17 @@ def save_preferences():
             )
 
         conn.commit()
-        conn.close()
+
+        # Write-through so the next request sees the new values without a query
+        preference_cache.set(
+            session["user_id"],
+            {
+                "theme_color": theme_color,
+                "dark_mode": bool(dark_mode),
+                "show_nsfw": bool(show_nsfw),
+                "language": language,
+            },
+        )
 
         # Update session with new preferences
         session["preferences"] = {
@@ -1106,42 +1845,56 @@ def change_language():
     return jsonify({"status": "success"})
 
 
+# Internal runtime statistics (connection pool usage, etc.)
+def runtime_stats():
+    return {
+        "db_pool": db_pool.stats(),
+        "preference_cache": preference_cache.stats(),
+        "gemini": gemini.stats() if gemini else None,
+        "response_cache": response_cache.stats(),
+        "hospital_search_cache": search_cache.stats(),
+        "reminders": reminder_scheduler.stats(),
+        "mailer": mailer.stats(),
+        "uploads": resumable_uploads.stats(),
+        "record_processing": record_processor.stats(),
+        "meal_planner": meal_planner.stats(),
+        "pregnancy_state": pregnancy_state_cache.stats(),
+    }
+
+
+@app.route("/stats")
+def stats():
+    if not MONITORING_TOKEN:
+        abort(404)
+    if not monitoring_allowed(request, MONITORING_TOKEN):
+        abort(403)
+    return jsonify(runtime_stats())
+
+
+# The same numbers as gauges on /metrics
+metrics.add_collector("runtime", runtime_stats)
+
+
 @app.before_request
 def before_request():
+    # Static files never render templates, so skip the preference lookup
+    if request.endpoint == "static":
+        return
+
+    preferences = DEFAULT_PREFERENCES
     if "user_id" in session:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        cur.execute(
-            "SELECT * FROM user_preferences WHERE user_id = ?", (session["user_id"],)
-        )
-        preferences_row = cur.fetchone()
-        conn.close()
-
-        if preferences_row:
-            # SQLite Row objects need to be accessed using indexing, not .get()
-            g.theme_color = (
-                preferences_row["theme_color"]
-                if "theme_color" in preferences_row.keys()
-                else "blue"
-            )
-            g.dark_mode = (
-                bool(preferences_row["dark_mode"])
-                if "dark_mode" in preferences_row.keys()
-                else False
-            )
-            g.language = (
-                preferences_row["language"]
-                if "language" in preferences_row.keys()
-                else "en"
-            )
-        else:
-            g.theme_color = "blue"
-            g.dark_mode = False
-            g.language = "en"
-    else:
-        g.theme_color = "blue"
-        g.dark_mode = False
-        g.language = "en"
+        user_id = session["user_id"]
+        preferences = preference_cache.get(user_id)
+        if preferences is None:
+            conn = get_db_connection()
+            cur = conn.cursor()
+            cur.execute("SELECT * FROM user_preferences WHERE user_id = ?", (user_id,))
+            preferences = preferences_from_row(cur.fetchone())
+            preference_cache.set(user_id, preferences)
+
+    g.theme_color = preferences["theme_color"]
+    g.dark_mode = preferences["dark_mode"]
+    g.language = preferences["language"]
 
 
 @app.context_processor
@@ -0,0 +1,8 @@
+"""
+Benchmark tooling for the app.
+
+- ``datagen``: builds a large synthetic pregnancy.db
+- ``fakes``: local stand-ins for Gemini and Google Maps
+- ``run``: drives the main routes in-process or over HTTP and writes
+  per-route throughput and latency percentiles to JSON
+"""
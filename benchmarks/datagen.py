@@ -0,0 +1,184 @@
+"""
+Generate a large synthetic pregnancy.db for benchmarking.
+
+User ``n`` (1-based) logs in with phone ``user_phone(n)`` and password
+``user_password(n)``.
+
+Usage:
+    python -m benchmarks.datagen bench/pregnancy.db --users 100000 --symptoms 2000000
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import time
+from datetime import date, timedelta
+from typing import Iterator, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from migrations import migrate  # noqa: E402
+
+SYMPTOMS = [
+    "nausea in the morning",
+    "lower back pain",
+    "swollen feet",
+    "heartburn after meals",
+    "trouble sleeping",
+    "mild headaches",
+    "leg cramps at night",
+    "feeling dizzy when standing",
+    "spotting",
+    "frequent urination",
+]
+SPECIALIZATIONS = ["Gynecologist", "General Physical", "Pediatrician", "Dentist"]
+EXERCISES = [
+    ("Pelvic Tilt", "pelvic_tilt.jpg", "10-15 repetitions"),
+    ("Kegel Exercises", "kegel.jpg", "10 repetitions, hold for 5-10 seconds each"),
+    ("Wall Slide", "wall_slide.jpg", "10-12 repetitions"),
+    ("Side-Lying Leg Lift", "side_leg_lift.jpg", "10 repetitions each side"),
+    ("Seated Twist", "seated_twist.jpg", "5 repetitions each side"),
+]
+
+
+def user_phone(n: int) -> str:
+    return f"9{n:09d}"
+
+
+def user_password(n: int) -> str:
+    return f"pass{n}"
+
+
+def _insert(conn, sql: str, rows: Iterator[Tuple], batch_size: int = 50000) -> int:
+    count = 0
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            conn.executemany(sql, batch)
+            count += len(batch)
+            batch = []
+    if batch:
+        conn.executemany(sql, batch)
+        count += len(batch)
+    return count
+
+
+def generate(
+    path: str,
+    users: int = 100000,
+    symptoms: int = 2000000,
+    appointments: int = 300000,
+    records: int = 300000,
+    seed: int = 42,
+) -> None:
+    if os.path.exists(path):
+        raise FileExistsError(f"{path} already exists")
+    migrate(path, verbose=False)
+
+    rng = random.Random(seed)
+    start_day = date(2024, 1, 1)
+    conn = sqlite3.connect(path)
+    # Bulk load: no journal, no fsync; the file is throwaway if this fails
+    conn.execute("PRAGMA journal_mode = OFF")
+    conn.execute("PRAGMA synchronous = OFF")
+
+    def day(offset_days: int) -> str:
+        return (start_day + timedelta(days=offset_days)).isoformat()
+
+    steps = [
+        (
+            "users",
+            "INSERT INTO users (name, phone, password) VALUES (?, ?, ?)",
+            (
+                (f"User {n}", user_phone(n), user_password(n))
+                for n in range(1, users + 1)
+            ),
+        ),
+        (
+            "symptoms",
+            "INSERT INTO symptoms (user_id, symptom, date, advice) VALUES (?, ?, ?, ?)",
+            (
+                (
+                    rng.randint(1, users),
+                    rng.choice(SYMPTOMS),
+                    day(rng.randint(0, 730)),
+                    "Rest, stay hydrated and talk to your healthcare provider.",
+                )
+                for _ in range(symptoms)
+            ),
+        ),
+        (
+            "appointments",
+            """
+            INSERT INTO appointments
+            (user_id, hospital_name, specialization, date, time, status)
+            VALUES (?, ?, ?, ?, ?, 'Pending')
+            """,
+            (
+                (
+                    rng.randint(1, users),
+                    f"Hospital {rng.randint(1, 2000)}",
+                    rng.choice(SPECIALIZATIONS),
+                    day(rng.randint(0, 730)),
+                    f"{rng.randint(8, 17):02d}:{rng.choice(['00', '30'])}",
+                )
+                for _ in range(appointments)
+            ),
+        ),
+        (
+            "health_records",
+            """
+            INSERT INTO health_records (user_id, file_name, file_path, upload_date)
+            VALUES (?, ?, ?, ?)
+            """,
+            (
+                (
+                    rng.randint(1, users),
+                    f"record_{i}.pdf",
+                    os.path.join("uploads", f"record_{i}.pdf"),
+                    day(rng.randint(0, 730)) + " 12:00:00",
+                )
+                for i in range(records)
+            ),
+        ),
+        (
+            "exercises",
+            "INSERT INTO exercises (name, image, reps) VALUES (?, ?, ?)",
+            iter(EXERCISES),
+        ),
+    ]
+
+    for table, sql, rows in steps:
+        started = time.perf_counter()
+        count = _insert(conn, sql, rows)
+        conn.commit()
+        print(f"{table}: {count} rows in {time.perf_counter() - started:.1f}s")
+
+    started = time.perf_counter()
+    conn.execute("ANALYZE")
+    conn.commit()
+    conn.close()
+    print(f"analyze: {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("path")
+    parser.add_argument("--users", type=int, default=100000)
+    parser.add_argument("--symptoms", type=int, default=2000000)
+    parser.add_argument("--appointments", type=int, default=300000)
+    parser.add_argument("--records", type=int, default=300000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    generate(
+        args.path,
+        users=args.users,
+        symptoms=args.symptoms,
+        appointments=args.appointments,
+        records=args.records,
+        seed=args.seed,
+    )
@@ -0,0 +1,267 @@
+"""
+Compare record download throughput across serving strategies.
+
+A file of ``--size-mb`` is served through ``DownloadSender`` by three
+servers, each in its own process:
+
+- ``copy``: Werkzeug's threaded server, which has no ``wsgi.file_wrapper``
+  and copies the file through Python in chunks
+- ``sendfile``: a wsgiref server whose file wrapper uses ``socket.sendfile``
+  (zero-copy, as gunicorn does)
+- ``offload``: ``DOWNLOAD_OFFLOAD=x-accel-redirect``; only the app's share
+  of the work is measured, since the front-end server sends the file
+
+For each, full downloads and random single-range requests are timed.
+
+Usage:
+    python -m benchmarks.downloads --workdir bench --size-mb 512
+"""
+
+import argparse
+import http.client
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from benchmarks.run import _wait_for_port, git_commit  # noqa: E402
+
+STRATEGIES = ["copy", "sendfile", "offload"]
+FILE_NAME = "bench_download.bin"
+
+
+def create_file(path: str, size_mb: int) -> None:
+    if os.path.exists(path) and os.path.getsize(path) == size_mb << 20:
+        return
+    block = os.urandom(1 << 20)
+    with open(path, "wb") as f:
+        for _ in range(size_mb):
+            f.write(block)
+
+
+def make_app(root: str, offload: str):
+    from flask import Flask
+
+    from downloads import DownloadSender
+
+    app = Flask(__name__)
+    sender = DownloadSender(root, offload=offload)
+
+    @app.route("/download/<filename>")
+    def download(filename):
+        return sender.send(os.path.join(root, filename), filename)
+
+    return app
+
+
+def serve(args) -> None:
+    strategy = args.strategy
+    app = make_app(args.workdir, "x-accel-redirect" if strategy == "offload" else "")
+
+    if strategy == "sendfile":
+        from socketserver import ThreadingMixIn
+        from wsgiref.simple_server import (
+            ServerHandler,
+            WSGIRequestHandler,
+            WSGIServer,
+            make_server,
+        )
+
+        class SendfileServerHandler(ServerHandler):
+            def sendfile(self):
+                # Called for wsgi.file_wrapper results, like gunicorn does
+                file = self.result.filelike
+                length = int(self.headers["Content-Length"])
+                self.send_headers()
+                self._flush()
+                self.request_handler.connection.sendfile(file, file.tell(), length)
+                self.bytes_sent += length
+                return True
+
+        class Handler(WSGIRequestHandler):
+            def handle(self):
+                self.raw_requestline = self.rfile.readline(65537)
+                if not self.parse_request():
+                    return
+                handler = SendfileServerHandler(
+                    self.rfile, self.wfile, self.get_stderr(), self.get_environ()
+                )
+                handler.request_handler = self
+                handler.run(self.server.get_app())
+
+            def log_request(self, *args, **kwargs):
+                pass
+
+        class Server(ThreadingMixIn, WSGIServer):
+            daemon_threads = True
+
+        make_server(
+            "127.0.0.1", args.port, app, server_class=Server, handler_class=Handler
+        ).serve_forever()
+    else:
+        from werkzeug.serving import WSGIRequestHandler, run_simple
+
+        class QuietHandler(WSGIRequestHandler):
+            def log_request(self, *args, **kwargs):
+                pass
+
+        run_simple(
+            "127.0.0.1", args.port, app, threaded=True, request_handler=QuietHandler
+        )
+
+
+def fetch(port: int, headers: Dict[str, str]) -> int:
+    """GET the benchmark file and return the number of body bytes read."""
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=120)
+    conn.request("GET", f"/download/{FILE_NAME}", headers=headers)
+    response = conn.getresponse()
+    if response.status not in (200, 206):
+        raise RuntimeError(f"Unexpected status {response.status}")
+    buffer = bytearray(1 << 20)
+    view = memoryview(buffer)
+    total = 0
+    while True:
+        read = response.readinto(view)
+        if not read:
+            break
+        total += read
+    conn.close()
+    return total
+
+
+def measure(
+    port: int, size: int, repeats: int, ranges: int, range_mb: int, seed: int
+) -> Dict[str, Any]:
+    rng = random.Random(seed)
+    started = time.perf_counter()
+    full_bytes = sum(fetch(port, {}) for _ in range(repeats))
+    full_elapsed = time.perf_counter() - started
+
+    range_size = min(range_mb << 20, size)
+    started = time.perf_counter()
+    range_bytes = 0
+    for _ in range(ranges):
+        start = rng.randrange(0, size - range_size + 1)
+        header = f"bytes={start}-{start + range_size - 1}"
+        range_bytes += fetch(port, {"Range": header})
+    range_elapsed = time.perf_counter() - started
+
+    return {
+        "full": {
+            "requests": repeats,
+            "bytes": full_bytes,
+            "seconds": round(full_elapsed, 3),
+            "mb_per_second": round(full_bytes / (1 << 20) / full_elapsed, 1),
+        },
+        "range": {
+            "requests": ranges,
+            "bytes": range_bytes,
+            "seconds": round(range_elapsed, 3),
+            "mb_per_second": round(range_bytes / (1 << 20) / range_elapsed, 1),
+        },
+    }
+
+
+def measure_offload(port: int, requests: int) -> Dict[str, Any]:
+    """Time the app's response (headers only) when the proxy sends the file."""
+    latencies = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+        conn.request("GET", f"/download/{FILE_NAME}")
+        response = conn.getresponse()
+        response.read()
+        if "X-Accel-Redirect" not in response.headers:
+            raise RuntimeError("Offload header missing")
+        conn.close()
+        latencies.append(time.perf_counter() - started)
+    latencies.sort()
+    return {
+        "requests": requests,
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 3),
+        "max_ms": round(latencies[-1] * 1000, 3),
+    }
+
+
+def run_strategy(args, strategy: str, port: int) -> Optional[Dict[str, Any]]:
+    server = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "benchmarks.downloads",
+            "--serve",
+            strategy,
+            "--workdir",
+            args.workdir,
+            "--port",
+            str(port),
+        ],
+        cwd=REPO_DIR,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        _wait_for_port("127.0.0.1", port)
+        if strategy == "offload":
+            return measure_offload(port, args.ranges * 10)
+        size = os.path.getsize(os.path.join(args.workdir, FILE_NAME))
+        return measure(port, size, args.repeats, args.ranges, args.range_mb, args.seed)
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--workdir", required=True, help="directory for the file")
+    parser.add_argument("--size-mb", type=int, default=512)
+    parser.add_argument("--repeats", type=int, default=3, help="full downloads")
+    parser.add_argument("--ranges", type=int, default=20, help="range requests")
+    parser.add_argument("--range-mb", type=int, default=16)
+    parser.add_argument("--strategies", nargs="+", default=STRATEGIES)
+    parser.add_argument("--port", type=int, default=5065)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="JSON results file (default: print)")
+    parser.add_argument("--serve", choices=STRATEGIES, dest="strategy")
+    args = parser.parse_args()
+    args.workdir = os.path.abspath(args.workdir)
+
+    if args.strategy:
+        serve(args)
+        return
+
+    os.makedirs(args.workdir, exist_ok=True)
+    create_file(os.path.join(args.workdir, FILE_NAME), args.size_mb)
+    results = {}
+    for offset, strategy in enumerate(args.strategies):
+        results[strategy] = run_strategy(args, strategy, args.port + offset)
+        print(f"{strategy}: {json.dumps(results[strategy])}")
+
+    report = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "config": {
+            key: value
+            for key, value in vars(args).items()
+            if key not in ("output", "workdir", "strategy")
+        },
+        "strategies": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+        print(f"Results written to {args.output}")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
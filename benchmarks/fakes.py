@@ -0,0 +1,63 @@
+import hashlib
+import os
+import time
+from typing import Any, Dict, List
+
+
+class FakeMapsClient:
+    """
+    Local stand-in for ``googlemaps.Client`` (``geocode`` and ``places`` only).
+
+    Results are deterministic for a given query so caches behave as they
+    would against the real API, and each call sleeps for ``latency`` seconds.
+    """
+
+    def __init__(self, latency: float = 0.05, results: int = 5):
+        self.latency = latency
+        self.results = results
+        self.calls = 0
+
+    def _seed(self, text: str) -> int:
+        return int(hashlib.sha1(text.encode("utf-8")).hexdigest()[:8], 16)
+
+    def geocode(self, location: str) -> List[Dict[str, Any]]:
+        self.calls += 1
+        time.sleep(self.latency)
+        seed = self._seed(location.lower())
+        lat = (seed % 14000) / 100 - 70
+        lng = (seed // 14000 % 36000) / 100 - 180
+        return [{"geometry": {"location": {"lat": lat, "lng": lng}}}]
+
+    def places(self, query: str, location=None, radius=None, type=None):
+        self.calls += 1
+        time.sleep(self.latency)
+        seed = self._seed(f"{query}|{location}")
+        return {
+            "results": [
+                {
+                    "name": f"{query.split(',')[0].title()} Clinic {seed % 97 + i}",
+                    "vicinity": f"{seed % 900 + i} Example Road",
+                    "rating": round(3 + (seed >> i) % 20 / 10, 1),
+                    "user_ratings_total": seed % 500,
+                    "place_id": f"fake-{seed:x}-{i}",
+                }
+                for i in range(self.results)
+            ]
+        }
+
+
+def install(gemini_latency: float = 0.05, maps_latency: float = 0.05) -> None:
+    """
+    Route Gemini and Google Maps calls to local fakes.
+
+    Must run before ``app`` is imported: the Gemini fake is selected through
+    the ``GEMINI_FAKE`` setting, while the Maps client is swapped in place.
+    """
+    os.environ["GEMINI_FAKE"] = "true"
+    os.environ["GEMINI_FAKE_LATENCY"] = str(gemini_latency)
+    # Keep background workers from competing with the measured requests
+    os.environ.setdefault("REMINDERS_ENABLED", "false")
+
+    import hospital_utils
+
+    hospital_utils.gmaps_client = FakeMapsClient(latency=maps_latency)
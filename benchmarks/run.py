@@ -0,0 +1,425 @@
+"""
+Drive the main routes and report throughput and latency percentiles.
+
+``inprocess`` mode calls the routes through the Flask test client, so it
+measures the application code without any HTTP server. ``http`` mode starts
+the app in a threaded server process (or targets ``--url``) and runs a
+multi-process load generator against it. Gemini and Google Maps are always
+replaced by local fakes (see fakes.py) when the app is started from here.
+
+Usage:
+    python -m benchmarks.datagen bench/pregnancy.db
+    python -m benchmarks.run inprocess --workdir bench --requests 500
+    python -m benchmarks.run http --workdir bench --processes 4 --duration 30
+"""
+
+import argparse
+import http.client
+import json
+import math
+import multiprocessing
+import os
+import random
+import socket
+import sqlite3
+import subprocess
+import sys
+import time
+import urllib.parse
+from datetime import date, datetime, timedelta
+from http.cookies import SimpleCookie
+from typing import Any, Dict, List, Optional, Tuple
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from benchmarks.datagen import SPECIALIZATIONS, user_password, user_phone  # noqa
+
+CITIES = ["New York", "Boston", "Chicago", "Austin", "Seattle", "Denver", "Miami"]
+QUESTIONS = [
+    "Is it normal to have {} at week {}?",
+    "What can I do about {} in week {}?",
+    "Should I worry about {} at {} weeks pregnant?",
+]
+SYMPTOMS = ["nausea", "back pain", "headaches", "heartburn", "cramps", "fatigue"]
+
+# Relative frequency of each route in the http load mix (login is measured
+# whenever a worker starts a new session)
+ROUTE_WEIGHTS = {
+    "dashboard": 3,
+    "chat": 2,
+    "appointments": 2,
+    "records": 2,
+    "book_appointment": 1,
+    "calculate_due_date": 2,
+    "pregnancy": 1,
+}
+ROUTES = ["login"] + list(ROUTE_WEIGHTS)
+
+
+def build_request(
+    route: str, rng: random.Random, user: int
+) -> Tuple[str, str, Optional[Dict[str, str]], Optional[Dict[str, Any]]]:
+    """Return (method, path, form, json) for one request to ``route``."""
+    if route == "login":
+        form = {"phone": user_phone(user), "password": user_password(user)}
+        return "POST", "/login", form, None
+    if route == "chat":
+        question = rng.choice(QUESTIONS).format(
+            rng.choice(SYMPTOMS), rng.randint(4, 40)
+        )
+        return "POST", "/chat", None, {"message": question}
+    if route == "book_appointment":
+        form = {
+            "specialization": rng.choice(SPECIALIZATIONS),
+            "location": rng.choice(CITIES),
+        }
+        return "POST", "/book_appointment", form, None
+    if route == "calculate_due_date":
+        lmp = date.today() - timedelta(days=rng.randint(14, 270))
+        form = {
+            "date_type": "LMP",
+            "input_date": lmp.isoformat(),
+            "cycle_length": "28",
+        }
+        return "POST", "/calculate_due_date", form, None
+    return "GET", f"/{route}", None, None
+
+
+def chat_job_path(status: int, body: bytes) -> Optional[str]:
+    """Where to poll for the reply when /chat answered with a job."""
+    if status != 202:
+        return None
+    return f"/chat/{json.loads(body)['job']}"
+
+
+def chat_done(body: bytes) -> bool:
+    return bool(json.loads(body).get("done"))
+
+
+def is_error(route: str, status: int, location: str = "") -> bool:
+    if status >= 400:
+        return True
+    # Any redirect to the login page means the session was not accepted
+    return route != "login" and "/login" in location
+
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = math.ceil(p / 100 * len(sorted_values))
+    return sorted_values[min(max(rank, 1), len(sorted_values)) - 1]
+
+
+def summarize(samples: Dict[str, List[float]], errors: Dict[str, int], elapsed: float):
+    routes = {}
+    for route, latencies in samples.items():
+        latencies = sorted(latencies)
+        routes[route] = {
+            "requests": len(latencies),
+            "errors": errors.get(route, 0),
+            "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+            "mean_ms": (
+                round(sum(latencies) / len(latencies) * 1000, 3) if latencies else 0.0
+            ),
+            "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+            "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+            "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        }
+    return routes
+
+
+def user_count(workdir: str) -> int:
+    conn = sqlite3.connect(os.path.join(workdir, "pregnancy.db"))
+    try:
+        return conn.execute("SELECT MAX(id) FROM users").fetchone()[0] or 0
+    finally:
+        conn.close()
+
+
+def load_app(workdir: str, gemini_latency: float, maps_latency: float):
+    """Import the app with fakes installed, using ``workdir`` for its files."""
+    os.chdir(workdir)
+    from benchmarks import fakes
+
+    fakes.install(gemini_latency=gemini_latency, maps_latency=maps_latency)
+    import app
+
+    return app.app
+
+
+def run_inprocess(args) -> Dict[str, Any]:
+    users = user_count(args.workdir)
+    flask_app = load_app(args.workdir, args.gemini_latency, args.maps_latency)
+    client = flask_app.test_client()
+    rng = random.Random(args.seed)
+
+    samples: Dict[str, List[float]] = {}
+    errors: Dict[str, int] = {}
+    started = time.perf_counter()
+    for route in args.routes:
+        samples[route] = []
+        for _ in range(args.requests):
+            user = rng.randint(1, users)
+            if route != "login":
+                with client.session_transaction() as sess:
+                    sess["user_id"] = user
+                    sess["name"] = f"User {user}"
+            method, path, form, payload = build_request(route, rng, user)
+            began = time.perf_counter()
+            response = client.open(path, method=method, data=form, json=payload)
+            # Streamed pages render while the body is read, and closing the
+            # response tears down their request context
+            response.get_data()
+            response.close()
+            # Chat replies are collected from a job, so poll until it is done
+            poll = chat_job_path(response.status_code, response.get_data())
+            while poll is not None:
+                response = client.get(poll)
+                if response.status_code != 200 or chat_done(response.get_data()):
+                    break
+                time.sleep(0.01)
+            samples[route].append(time.perf_counter() - began)
+            if is_error(route, response.status_code, response.location or ""):
+                errors[route] = errors.get(route, 0) + 1
+    elapsed = time.perf_counter() - started
+
+    # Throughput is per route here, since routes are measured one at a time
+    routes = summarize(samples, errors, 0)
+    for route, stats in routes.items():
+        busy = sum(samples[route])
+        stats["throughput_rps"] = round(len(samples[route]) / busy, 2) if busy else 0.0
+    return {"elapsed_seconds": round(elapsed, 3), "routes": routes}
+
+
+class HttpSession:
+    """Keep-alive HTTP connection that tracks the session cookie."""
+
+    def __init__(self, url: str):
+        parsed = urllib.parse.urlparse(url)
+        self.host = parsed.hostname
+        self.port = parsed.port or 80
+        self.conn = http.client.HTTPConnection(self.host, self.port, timeout=60)
+        self.cookies: Dict[str, str] = {}
+        self.body = b""
+
+    def request(self, method, path, form=None, payload=None) -> Tuple[int, str]:
+        headers = {}
+        body = None
+        if form is not None:
+            body = urllib.parse.urlencode(form)
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+        elif payload is not None:
+            body = json.dumps(payload)
+            headers["Content-Type"] = "application/json"
+        if self.cookies:
+            headers["Cookie"] = "; ".join(f"{k}={v}" for k, v in self.cookies.items())
+
+        try:
+            self.conn.request(method, path, body=body, headers=headers)
+            response = self.conn.getresponse()
+        except (http.client.HTTPException, OSError):
+            # Server closed the connection (e.g. HTTP/1.0): reconnect once
+            self.conn.close()
+            self.conn.request(method, path, body=body, headers=headers)
+            response = self.conn.getresponse()
+        self.body = response.read()
+        for header in response.headers.get_all("Set-Cookie") or []:
+            for name, morsel in SimpleCookie(header).items():
+                self.cookies[name] = morsel.value
+        return response.status, response.headers.get("Location", "")
+
+
+def _load_worker(url, users, duration, relogin, seed, results):
+    rng = random.Random(seed)
+    routes = list(ROUTE_WEIGHTS)
+    weights = [ROUTE_WEIGHTS[r] for r in routes]
+    samples: Dict[str, List[float]] = {route: [] for route in ROUTES}
+    errors: Dict[str, int] = {}
+
+    session = None
+    deadline = time.perf_counter() + duration
+    done = 0
+    while time.perf_counter() < deadline:
+        if session is None or done % relogin == 0:
+            if session is not None:
+                session.conn.close()
+            session = HttpSession(url)
+            user = rng.randint(1, users)
+            route = "login"
+        else:
+            route = rng.choices(routes, weights)[0]
+        method, path, form, payload = build_request(route, rng, user)
+        began = time.perf_counter()
+        try:
+            status, location = session.request(method, path, form, payload)
+            poll = chat_job_path(status, session.body)
+            while poll is not None:
+                status, location = session.request("GET", poll)
+                if status != 200 or chat_done(session.body):
+                    break
+                time.sleep(0.01)
+        except (http.client.HTTPException, OSError):
+            status, location = 599, ""
+        samples[route].append(time.perf_counter() - began)
+        if is_error(route, status, location):
+            errors[route] = errors.get(route, 0) + 1
+        done += 1
+    results.put((samples, errors))
+
+
+def _wait_for_port(host: str, port: int, timeout: float = 60.0) -> None:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection((host, port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"Server on {host}:{port} did not start")
+
+
+def run_http(args) -> Dict[str, Any]:
+    users = user_count(args.workdir)
+    server = None
+    url = args.url
+    if url is None:
+        url = f"http://127.0.0.1:{args.port}"
+        server = subprocess.Popen(
+            [
+                sys.executable,
+                "-m",
+                "benchmarks.run",
+                "serve",
+                "--workdir",
+                args.workdir,
+                "--port",
+                str(args.port),
+                "--gemini-latency",
+                str(args.gemini_latency),
+                "--maps-latency",
+                str(args.maps_latency),
+            ],
+            cwd=REPO_DIR,
+            stdout=subprocess.DEVNULL,
+        )
+        _wait_for_port("127.0.0.1", args.port)
+
+    try:
+        results: multiprocessing.Queue = multiprocessing.Queue()
+        workers = [
+            multiprocessing.Process(
+                target=_load_worker,
+                args=(url, users, args.duration, args.relogin, args.seed + i, results),
+            )
+            for i in range(args.processes)
+        ]
+        started = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        collected = [results.get() for _ in workers]
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - started
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    samples: Dict[str, List[float]] = {route: [] for route in ROUTES}
+    errors: Dict[str, int] = {}
+    for worker_samples, worker_errors in collected:
+        for route, latencies in worker_samples.items():
+            samples[route].extend(latencies)
+        for route, count in worker_errors.items():
+            errors[route] = errors.get(route, 0) + count
+
+    routes = summarize(samples, errors, elapsed)
+    total = sum(len(latencies) for latencies in samples.values())
+    return {
+        "elapsed_seconds": round(elapsed, 3),
+        "total_requests": total,
+        "throughput_rps": round(total / elapsed, 2),
+        "routes": routes,
+    }
+
+
+def serve(args) -> None:
+    from werkzeug.serving import WSGIRequestHandler, run_simple
+
+    class QuietHandler(WSGIRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive
+
+        def log_request(self, *args, **kwargs):
+            pass
+
+    flask_app = load_app(args.workdir, args.gemini_latency, args.maps_latency)
+    run_simple(
+        "127.0.0.1", args.port, flask_app, threaded=True, request_handler=QuietHandler
+    )
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=REPO_DIR,
+            stderr=subprocess.DEVNULL,
+            text=True,
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("mode", choices=["inprocess", "http", "serve"])
+    parser.add_argument(
+        "--workdir", required=True, help="directory holding the pregnancy.db to use"
+    )
+    parser.add_argument("--output", help="JSON results file (default: print)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--gemini-latency", type=float, default=0.05)
+    parser.add_argument("--maps-latency", type=float, default=0.05)
+    # inprocess
+    parser.add_argument("--requests", type=int, default=200, help="per route")
+    parser.add_argument("--routes", nargs="+", default=ROUTES, choices=ROUTES)
+    # http
+    parser.add_argument("--url", help="benchmark an already running server")
+    parser.add_argument("--port", type=int, default=5055)
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument(
+        "--relogin", type=int, default=50, help="requests per login session"
+    )
+    args = parser.parse_args()
+    args.workdir = os.path.abspath(args.workdir)
+
+    if args.mode == "serve":
+        serve(args)
+        return
+
+    result = run_inprocess(args) if args.mode == "inprocess" else run_http(args)
+    report = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "mode": args.mode,
+        "config": {
+            key: value
+            for key, value in vars(args).items()
+            if key not in ("output", "workdir")
+        },
+        **result,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+        print(f"Results written to {args.output}")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
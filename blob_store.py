@@ -0,0 +1,189 @@
+"""
+Content-addressed storage for uploaded health records.
+
+Each distinct file is stored once under ``<root>/ab/cd/<sha256>``, with a
+row in the ``blobs`` table counting the ``health_records`` that point at it,
+so re-uploads of the same report cost no extra disk space or backup I/O.
+
+Usage:
+    python blob_store.py import [--database pregnancy.db] [--uploads uploads]
+    python blob_store.py gc [--database pregnancy.db] [--uploads uploads]
+"""
+
+import argparse
+import hashlib
+import os
+import sqlite3
+import tempfile
+from typing import BinaryIO, Dict, Tuple
+
+READ_SIZE = 1 << 20
+
+
+def file_sha256(path: str) -> str:
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        for data in iter(lambda: f.read(READ_SIZE), b""):
+            hasher.update(data)
+    return hasher.hexdigest()
+
+
+class BlobStore:
+    """
+    Files named by their SHA-256, sharded two directory levels deep.
+
+    ``add()`` moves a finished file into the store (or drops it if the
+    content is already there) and bumps the reference count using the
+    caller's connection, so the count commits together with the
+    ``health_records`` row that references the blob. Files only ever enter
+    the store by rename, never by copy, so ``root`` must be on the same
+    filesystem as the upload folder.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self.tmp_dir = os.path.join(root, "tmp")
+        os.makedirs(self.tmp_dir, exist_ok=True)
+
+    def path(self, sha256: str) -> str:
+        return os.path.join(self.root, sha256[:2], sha256[2:4], sha256)
+
+    def place(self, src_path: str, sha256: str) -> str:
+        """Move ``src_path`` into the store (dropping it if already stored)."""
+        path = self.path(sha256)
+        if os.path.exists(path):
+            os.remove(src_path)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(src_path, path)
+        return path
+
+    def add(
+        self, conn: sqlite3.Connection, src_path: str, sha256: str, references: int = 1
+    ) -> str:
+        """
+        Store ``src_path`` (consumed) under ``sha256`` and return its path.
+
+        The caller commits ``conn``.
+        """
+        size = os.path.getsize(src_path)
+        path = self.place(src_path, sha256)
+        self.reference(conn, sha256, size, references)
+        return path
+
+    def reference(
+        self, conn: sqlite3.Connection, sha256: str, size: int, references: int = 1
+    ) -> None:
+        """Count ``references`` more rows pointing at ``sha256``."""
+        conn.execute(
+            """
+            INSERT INTO blobs (hash, size, refcount) VALUES (?, ?, ?)
+            ON CONFLICT(hash) DO UPDATE SET refcount = refcount + excluded.refcount
+            """,
+            (sha256, size, references),
+        )
+
+    def add_stream(self, conn: sqlite3.Connection, stream: BinaryIO) -> Tuple[str, str]:
+        """Copy ``stream`` into the store, hashing as it is written."""
+        hasher = hashlib.sha256()
+        fd, tmp_path = tempfile.mkstemp(dir=self.tmp_dir)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for data in iter(lambda: stream.read(READ_SIZE), b""):
+                    hasher.update(data)
+                    f.write(data)
+            sha256 = hasher.hexdigest()
+            return sha256, self.add(conn, tmp_path, sha256)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def release(self, conn: sqlite3.Connection, sha256: str) -> None:
+        """Drop one reference; unreferenced blobs are removed by ``gc()``."""
+        conn.execute(
+            "UPDATE blobs SET refcount = refcount - 1 WHERE hash = ? AND refcount > 0",
+            (sha256,),
+        )
+
+    def gc(self, conn: sqlite3.Connection) -> Dict[str, int]:
+        """
+        Delete unreferenced blobs and files the table does not know about.
+
+        Run while no uploads are in progress: a blob is placed on disk just
+        before its row is committed.
+        """
+        removed_rows = 0
+        for row in conn.execute(
+            "SELECT hash FROM blobs WHERE refcount <= 0"
+        ).fetchall():
+            conn.execute(
+                "DELETE FROM blobs WHERE hash = ? AND refcount <= 0", (row[0],)
+            )
+            removed_rows += 1
+        conn.commit()
+
+        known = {
+            row[0] for row in conn.execute("SELECT hash FROM blobs WHERE refcount > 0")
+        }
+        removed_files = 0
+        for directory, _, files in os.walk(self.root):
+            if directory == self.tmp_dir:
+                continue
+            for name in files:
+                if name not in known:
+                    os.remove(os.path.join(directory, name))
+                    removed_files += 1
+        return {"rows": removed_rows, "files": removed_files}
+
+
+def import_records(database: str, store: BlobStore) -> Dict[str, int]:
+    """Move records stored before the blob store into it, deduplicating."""
+    conn = sqlite3.connect(database)
+    stats = {"records": 0, "blobs": 0, "missing": 0}
+    try:
+        paths = conn.execute(
+            """
+            SELECT file_path, COUNT(*) FROM health_records
+            WHERE blob_hash IS NULL AND file_path IS NOT NULL
+            GROUP BY file_path
+            """
+        ).fetchall()
+        for file_path, references in paths:
+            if not os.path.isfile(file_path):
+                stats["missing"] += references
+                continue
+            sha256 = file_sha256(file_path)
+            existed = conn.execute(
+                "SELECT 1 FROM blobs WHERE hash = ?", (sha256,)
+            ).fetchone()
+            blob_path = store.add(conn, file_path, sha256, references)
+            conn.execute(
+                """
+                UPDATE health_records SET blob_hash = ?, file_path = ?
+                WHERE file_path = ? AND blob_hash IS NULL
+                """,
+                (sha256, blob_path, file_path),
+            )
+            conn.commit()
+            stats["records"] += references
+            stats["blobs"] += 0 if existed else 1
+    finally:
+        conn.close()
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("command", choices=["import", "gc"])
+    parser.add_argument("--database", default="pregnancy.db")
+    parser.add_argument("--uploads", default="uploads")
+    args = parser.parse_args()
+
+    store = BlobStore(os.path.join(args.uploads, "blobs"))
+    if args.command == "import":
+        print(import_records(args.database, store))
+    else:
+        conn = sqlite3.connect(args.database)
+        print(store.gc(conn))
+        conn.close()
@@ -0,0 +1,150 @@
+import queue
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+# PRAGMAs applied once when a pooled connection is first opened
+DEFAULT_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "cache_size": -20000,  # negative value = size in KiB (~20 MB)
+    "mmap_size": 268435456,  # 256 MB
+    "temp_store": "MEMORY",
+    "busy_timeout": 5000,
+}
+
+
+class PoolTimeout(Exception):
+    """Raised when no pooled connection became available in time."""
+
+
+class ConnectionPool:
+    """
+    Bounded pool of long-lived SQLite connections.
+
+    Connections are opened lazily up to ``max_size`` and configured once with
+    ``DEFAULT_PRAGMAS``. Callers check a connection out with ``acquire()`` and
+    hand it back with ``release()``; any transaction left open is rolled back
+    before the connection is reused.
+    """
+
+    def __init__(
+        self,
+        database: str,
+        max_size: int = 8,
+        timeout: float = 10.0,
+        pragmas: Optional[Dict[str, Any]] = None,
+    ):
+        self.database = database
+        self.max_size = max_size
+        self.timeout = timeout
+        self.pragmas = DEFAULT_PRAGMAS if pragmas is None else pragmas
+
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._opened = 0
+
+        # Metrics
+        self._checkouts = 0
+        self._in_use = 0
+        self._timeouts = 0
+        self._waits = 0
+        self._wait_time_total = 0.0
+        self._wait_time_max = 0.0
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.database, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        for name, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+        return conn
+
+    def acquire(self) -> sqlite3.Connection:
+        """Check a connection out of the pool, opening a new one if allowed."""
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = None
+            with self._lock:
+                if self._opened < self.max_size:
+                    self._opened += 1
+                    open_new = True
+                else:
+                    open_new = False
+            if open_new:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._lock:
+                        self._opened -= 1
+                    raise
+            else:
+                # Pool exhausted - wait for another request to release one
+                started = time.perf_counter()
+                try:
+                    conn = self._idle.get(timeout=self.timeout)
+                except queue.Empty:
+                    with self._lock:
+                        self._timeouts += 1
+                    raise PoolTimeout(
+                        f"No database connection available after {self.timeout}s"
+                    )
+                waited = time.perf_counter() - started
+                with self._lock:
+                    self._waits += 1
+                    self._wait_time_total += waited
+                    self._wait_time_max = max(self._wait_time_max, waited)
+
+        with self._lock:
+            self._checkouts += 1
+            self._in_use += 1
+        return conn
+
+    def release(self, conn: sqlite3.Connection, discard: bool = False) -> None:
+        """Return a connection to the pool (or close it if ``discard``)."""
+        with self._lock:
+            self._in_use -= 1
+
+        if not discard:
+            try:
+                if conn.in_transaction:
+                    conn.rollback()
+            except sqlite3.Error:
+                discard = True
+
+        if discard:
+            try:
+                conn.close()
+            finally:
+                with self._lock:
+                    self._opened -= 1
+            return
+
+        self._idle.put(conn)
+
+    def close_all(self) -> None:
+        """Close every idle connection (used on shutdown and in scripts)."""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._opened -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Snapshot of pool usage counters."""
+        with self._lock:
+            return {
+                "max_size": self.max_size,
+                "opened": self._opened,
+                "in_use": self._in_use,
+                "idle": self._idle.qsize(),
+                "checkouts": self._checkouts,
+                "waits": self._waits,
+                "timeouts": self._timeouts,
+                "wait_time_total_ms": round(self._wait_time_total * 1000, 3),
+                "wait_time_max_ms": round(self._wait_time_max * 1000, 3),
+            }
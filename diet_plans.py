@@ -0,0 +1,163 @@
+"""
+Table-driven diet plans.
+
+``diet_rules.json`` lists the choices for each option (trimester, condition,
+diet, culture) and an ordered list of rules. A rule applies when every
+option in its ``when`` matches the selection (a list matches any of its
+values; an empty ``when`` always applies) and sets the meals it names, so
+later rules override earlier ones: base meals per trimester, then condition,
+diet and culture adjustments, then rules for specific combinations. Every
+combination is resolved once at load time into a read-only lookup table,
+so serving a plan is a single dict lookup.
+
+Usage:
+    python diet_plans.py show "Second Trimester" Anemia Vegan Indian
+    python diet_plans.py bench [--cultures 200]
+"""
+
+import argparse
+import itertools
+import json
+import os
+import random
+import time
+from types import MappingProxyType
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+DEFAULT_RULES_PATH = os.path.join(os.path.dirname(__file__), "diet_rules.json")
+
+
+def build_plan(
+    rules: List[Dict[str, Any]], selection: Dict[str, str]
+) -> Dict[str, str]:
+    """Apply every matching rule, in order, to an empty plan."""
+    plan: Dict[str, str] = {}
+    for rule in rules:
+        if all(
+            selection[option] in (value if isinstance(value, list) else [value])
+            for option, value in rule["when"].items()
+        ):
+            plan.update(rule["meals"])
+    return plan
+
+
+class DietPlans:
+    """
+    Every diet plan, precomputed from a rule table.
+
+    ``plan()`` returns a shared read-only mapping (or None for a combination
+    outside the table); nothing is built per request.
+    """
+
+    def __init__(self, rules: Dict[str, Any]):
+        self.options: Mapping[str, Tuple[str, ...]] = MappingProxyType(
+            {name: tuple(values) for name, values in rules["options"].items()}
+        )
+        self._validate(rules["rules"])
+
+        plans = {}
+        for values in itertools.product(*self.options.values()):
+            selection = dict(zip(self.options, values))
+            plans[values] = MappingProxyType(build_plan(rules["rules"], selection))
+        self._plans: Mapping[Tuple[str, ...], Mapping[str, str]] = MappingProxyType(
+            plans
+        )
+
+    @classmethod
+    def from_file(cls, path: str = DEFAULT_RULES_PATH) -> "DietPlans":
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def _validate(self, rules: List[Dict[str, Any]]) -> None:
+        for index, rule in enumerate(rules):
+            for option, value in rule["when"].items():
+                if option not in self.options:
+                    raise ValueError(f"Diet rule {index}: unknown option {option!r}")
+                for choice in value if isinstance(value, list) else [value]:
+                    if choice not in self.options[option]:
+                        raise ValueError(
+                            f"Diet rule {index}: {choice!r} is not a {option} choice"
+                        )
+
+    def __len__(self) -> int:
+        return len(self._plans)
+
+    def plan(self, *values: str) -> Optional[Mapping[str, str]]:
+        """The plan for one value per option, in the order of ``options``."""
+        return self._plans.get(values)
+
+
+def synthetic_rules(rules: Dict[str, Any], cultures: int) -> Dict[str, Any]:
+    """``rules`` with ``cultures`` extra cultures, each with its own rule."""
+    rules = json.loads(json.dumps(rules))
+    names = [f"Culture {i}" for i in range(cultures)]
+    rules["options"]["culture"] += names
+    rules["rules"][-1:-1] = [
+        {
+            "when": {"culture": name},
+            "meals": {"Breakfast": f"{name} breakfast", "Dinner": f"{name} dinner"},
+        }
+        for name in names
+    ]
+    return rules
+
+
+def benchmark(cultures: int = 200, lookups: int = 100000) -> Dict[str, Any]:
+    """Compare table lookups with building each plan from the rules."""
+    with open(DEFAULT_RULES_PATH, encoding="utf-8") as f:
+        base_rules = json.load(f)
+
+    results = []
+    for extra in (0, cultures):
+        rules = synthetic_rules(base_rules, extra)
+        started = time.perf_counter()
+        plans = DietPlans(rules)
+        build_s = time.perf_counter() - started
+
+        rng = random.Random(7)
+        keys = [
+            tuple(rng.choice(values) for values in plans.options.values())
+            for _ in range(lookups)
+        ]
+        started = time.perf_counter()
+        for key in keys:
+            plans.plan(*key)
+        lookup_s = time.perf_counter() - started
+
+        # Building on demand is slow enough to time on a sample
+        sample = keys[: max(lookups // 100, 1)]
+        started = time.perf_counter()
+        for key in sample:
+            build_plan(rules["rules"], dict(zip(plans.options, key)))
+        rebuild_s = time.perf_counter() - started
+
+        results.append(
+            {
+                "rules": len(rules["rules"]),
+                "combinations": len(plans),
+                "build_seconds": round(build_s, 3),
+                "avg_lookup_us": round(lookup_s / lookups * 1e6, 3),
+                "avg_rebuild_us": round(rebuild_s / len(sample) * 1e6, 3),
+            }
+        )
+    return {"lookups": lookups, "tables": results}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    show_parser = subparsers.add_parser("show", help="print one plan")
+    show_parser.add_argument("values", nargs="+")
+    show_parser.add_argument("--rules", default=DEFAULT_RULES_PATH)
+
+    bench_parser = subparsers.add_parser("bench", help="benchmark plan retrieval")
+    bench_parser.add_argument("--cultures", type=int, default=200)
+    bench_parser.add_argument("--lookups", type=int, default=100000)
+
+    args = parser.parse_args()
+    if args.command == "show":
+        plan = DietPlans.from_file(args.rules).plan(*args.values)
+        print(json.dumps(dict(plan) if plan is not None else None, indent=2))
+    else:
+        print(json.dumps(benchmark(args.cultures, args.lookups), indent=2))
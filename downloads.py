@@ -0,0 +1,112 @@
+import mimetypes
+import os
+from urllib.parse import quote
+
+from flask import Response, request, send_file
+from werkzeug.wsgi import wrap_file
+
+# DOWNLOAD_OFFLOAD values: hand the transfer to the front-end server, or
+# (empty) stream the file from the app
+OFFLOAD_MODES = ("", "x-accel-redirect", "x-sendfile")
+
+
+class RangeFile:
+    """
+    A file opened at a range start that reads no further than its end.
+
+    ``fileno()`` stays available, so servers that ``sendfile()`` from the
+    current position (gunicorn stops after Content-Length) keep doing so;
+    servers that iterate with ``read()`` get exactly the range.
+    """
+
+    def __init__(self, path: str, start: int, length: int):
+        self._file = open(path, "rb")
+        self._file.seek(start)
+        self._remaining = length
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0 or size > self._remaining:
+            size = self._remaining
+        if size <= 0:
+            return b""
+        data = self._file.read(size)
+        self._remaining -= len(data)
+        return data
+
+    def fileno(self) -> int:
+        return self._file.fileno()
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class DownloadSender:
+    """
+    Sends stored files as attachments, with Range and conditional support.
+
+    With ``offload`` set, the response only carries an ``X-Accel-Redirect``
+    (nginx) or ``X-Sendfile`` (Apache, lighttpd) header and the front-end
+    server transfers the file, handling Range and If-* headers itself; the
+    worker is free as soon as the headers are out. nginx needs an internal
+    location mapping ``accel_prefix`` to ``root``.
+
+    Otherwise the file goes out through the WSGI server's
+    ``wsgi.file_wrapper``, which servers such as gunicorn turn into
+    ``sendfile()``. Werkzeug handles ETag/Last-Modified (304, 412) and Range
+    (206, 416); single ranges are re-wrapped as a ``RangeFile`` so they stay
+    zero-copy too.
+    """
+
+    def __init__(
+        self, root: str, offload: str = "", accel_prefix: str = "/protected-uploads/"
+    ):
+        if offload not in OFFLOAD_MODES:
+            raise ValueError(f"Unknown download offload mode: {offload}")
+        self.root = os.path.abspath(root)
+        self.offload = offload
+        self.accel_prefix = "/" + accel_prefix.strip("/") + "/"
+
+    def _offload_response(self, path: str, download_name: str) -> Response:
+        mimetype = mimetypes.guess_type(download_name)[0] or "application/octet-stream"
+        response = Response(mimetype=mimetype)
+        if self.offload == "x-accel-redirect":
+            relative = os.path.relpath(path, self.root).replace(os.sep, "/")
+            response.headers["X-Accel-Redirect"] = self.accel_prefix + quote(relative)
+        else:
+            response.headers["X-Sendfile"] = path
+        response.headers.set(
+            "Content-Disposition", "attachment", filename=download_name
+        )
+        response.cache_control.private = True
+        return response
+
+    def send(self, path: str, download_name: str = None) -> Response:
+        path = os.path.abspath(path)
+        download_name = download_name or os.path.basename(path)
+
+        # Files outside the upload folder have no offload mapping
+        inside_root = os.path.commonpath([self.root, path]) == self.root
+        if self.offload and inside_root:
+            return self._offload_response(path, download_name)
+
+        response = send_file(
+            path, as_attachment=True, download_name=download_name, conditional=True
+        )
+        response.cache_control.private = True
+
+        # Werkzeug serves a range by reading through a Python wrapper; hand
+        # the server a file already positioned at the range start instead
+        if (
+            response.status_code == 206
+            and response.content_range
+            and "wsgi.file_wrapper" in request.environ
+        ):
+            response.response.close()
+            content_range = response.content_range
+            response.response = wrap_file(
+                request.environ,
+                RangeFile(
+                    path, content_range.start, content_range.stop - content_range.start
+                ),
+            )
+        return response
@@ -0,0 +1,388 @@
+import asyncio
+import concurrent.futures
+import queue
+import threading
+import time
+import uuid
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Optional
+
+DEFAULT_MODEL = "gemini-2.0-flash"
+
+# Marks the end of a streamed response on the hand-off queue
+_STREAM_END = object()
+
+
+class GeminiBusy(Exception):
+    """Raised when too many Gemini requests are already queued."""
+
+
+class GeminiTimeout(Exception):
+    """Raised when a Gemini request did not finish within its deadline."""
+
+
+class _FakeAsyncModels:
+    def __init__(self, owner):
+        self._owner = owner
+
+    async def generate_content(self, model, contents, config=None):
+        self._owner.calls += 1
+        await asyncio.sleep(self._owner.latency)
+        return SimpleNamespace(text=self._owner.reply_for(contents))
+
+    async def generate_content_stream(self, model, contents, config=None):
+        self._owner.calls += 1
+        words = self._owner.reply_for(contents).split(" ")
+        chunk_size = self._owner.stream_chunk_words
+
+        async def chunks():
+            for start in range(0, len(words), chunk_size):
+                await asyncio.sleep(self._owner.latency / len(words) * chunk_size)
+                text = " ".join(words[start : start + chunk_size])
+                if start + chunk_size < len(words):
+                    text += " "
+                yield SimpleNamespace(text=text)
+
+        return chunks()
+
+
+class FakeGeminiClient:
+    """
+    Local stand-in for ``genai.Client`` used for development and testing.
+
+    Only the async surface used by the dispatcher (``client.aio.models``) is
+    implemented. Replies are canned and the latency is configurable so load
+    tests can simulate a slow model without network access.
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.5,
+        reply: Optional[str] = None,
+        stream_chunk_words: int = 4,
+    ):
+        self.latency = latency
+        self.reply = reply
+        self.stream_chunk_words = stream_chunk_words
+        self.calls = 0
+        self.aio = SimpleNamespace(models=_FakeAsyncModels(self))
+
+    def reply_for(self, contents) -> str:
+        if self.reply is not None:
+            return self.reply
+        return (
+            "This is a simulated response from the local Gemini stand-in. "
+            "Please consult with your healthcare provider for personalized "
+            "medical advice."
+        )
+
+
+class GeminiJob:
+    """
+    A reply being generated on the dispatcher loop, collected by polling.
+
+    ``parts`` grows as chunks arrive, so callers can show partial text
+    before the job is done. ``data`` is whatever the caller attached when
+    starting it.
+    """
+
+    def __init__(self, owner, future, parts: List[str], timeout: float, data=None):
+        self.owner = owner
+        self.future = future
+        self.parts = parts
+        self.timeout = timeout
+        self.data = data
+        self.started = time.monotonic()
+        self.finished: Optional[float] = None
+
+    def text(self) -> str:
+        return "".join(list(self.parts))
+
+    @property
+    def done(self) -> bool:
+        return self.future.done()
+
+    @property
+    def elapsed(self) -> float:
+        return (self.finished or time.monotonic()) - self.started
+
+    def error(self) -> Optional[BaseException]:
+        """The failure of a finished job, with timeouts as ``GeminiTimeout``."""
+        if self.future.cancelled() or isinstance(
+            self.future.exception(), asyncio.TimeoutError
+        ):
+            return GeminiTimeout(f"AI response took longer than {self.timeout}s")
+        return self.future.exception()
+
+
+class GeminiDispatcher:
+    """
+    Runs Gemini requests on a dedicated asyncio event loop thread.
+
+    Flask workers hand prompts to the loop with ``generate()`` instead of
+    calling the blocking client themselves. At most ``max_in_flight`` requests
+    talk to the API at once; up to ``max_queued`` more wait for a slot and
+    anything beyond that is rejected immediately with ``GeminiBusy``. Each
+    request has a deadline and is cancelled on the loop when it expires.
+
+    ``start()`` runs a request as a ``GeminiJob`` that nothing waits on, so a
+    web worker can return at once and collect the reply with ``job()`` and
+    ``collect()`` on later requests. Jobs nobody collects are dropped
+    ``job_ttl`` seconds after their deadline.
+    """
+
+    def __init__(
+        self,
+        client,
+        model: str = DEFAULT_MODEL,
+        max_in_flight: int = 32,
+        max_queued: int = 256,
+        timeout: float = 30.0,
+        job_ttl: float = 300.0,
+    ):
+        self.client = client
+        self.model = model
+        self.max_in_flight = max_in_flight
+        self.max_queued = max_queued
+        self.timeout = timeout
+        self.job_ttl = job_ttl
+        self._jobs: Dict[str, GeminiJob] = {}
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._start_lock = threading.Lock()
+        self._lock = threading.Lock()
+
+        # Metrics
+        self._pending = 0
+        self._in_flight = 0
+        self._completed = 0
+        self._failed = 0
+        self._timeouts = 0
+        self._rejected = 0
+        self._latency_total = 0.0
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._start_lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                ready = threading.Event()
+
+                def run():
+                    asyncio.set_event_loop(loop)
+                    self._semaphore = asyncio.Semaphore(self.max_in_flight)
+                    loop.call_soon(ready.set)
+                    loop.run_forever()
+
+                threading.Thread(
+                    target=run, name="gemini-dispatcher", daemon=True
+                ).start()
+                ready.wait()
+                self._loop = loop
+            return self._loop
+
+    async def _generate(self, contents, timeout: float) -> str:
+        assert self._semaphore is not None
+        async with self._semaphore:
+            with self._lock:
+                self._in_flight += 1
+            started = time.perf_counter()
+            try:
+                response = await asyncio.wait_for(
+                    self.client.aio.models.generate_content(
+                        model=self.model, contents=contents
+                    ),
+                    timeout,
+                )
+            finally:
+                with self._lock:
+                    self._in_flight -= 1
+                    self._latency_total += time.perf_counter() - started
+        return response.text
+
+    def _done(self, future: concurrent.futures.Future) -> None:
+        with self._lock:
+            self._pending -= 1
+            if future.cancelled():
+                self._timeouts += 1
+            elif future.exception() is not None:
+                if isinstance(future.exception(), asyncio.TimeoutError):
+                    self._timeouts += 1
+                else:
+                    self._failed += 1
+            else:
+                self._completed += 1
+
+    def _admit(self) -> None:
+        with self._lock:
+            if self._pending >= self.max_in_flight + self.max_queued:
+                self._rejected += 1
+                raise GeminiBusy("Too many AI requests in progress")
+            self._pending += 1
+
+    def submit(self, contents, timeout: Optional[float] = None):
+        """Schedule a request and return a ``concurrent.futures.Future``."""
+        self._admit()
+        loop = self._ensure_loop()
+        future = asyncio.run_coroutine_threadsafe(
+            self._generate(contents, timeout or self.timeout), loop
+        )
+        future.add_done_callback(self._done)
+        return future
+
+    def generate(self, contents, timeout: Optional[float] = None) -> str:
+        """Run a request on the dispatcher loop and wait for its text."""
+        timeout = timeout or self.timeout
+        future = self.submit(contents, timeout)
+        try:
+            # Allow for time spent waiting on the in-flight semaphore
+            return future.result(timeout=timeout * 2)
+        except (concurrent.futures.TimeoutError, asyncio.TimeoutError):
+            future.cancel()
+            raise GeminiTimeout(f"AI response took longer than {timeout}s")
+
+    async def _stream(
+        self, contents, timeout: float, sink: Callable[[str], None]
+    ) -> None:
+        assert self._semaphore is not None
+
+        async def consume():
+            response = await self.client.aio.models.generate_content_stream(
+                model=self.model, contents=contents
+            )
+            async for chunk in response:
+                if chunk.text:
+                    sink(chunk.text)
+
+        async with self._semaphore:
+            with self._lock:
+                self._in_flight += 1
+            started = time.perf_counter()
+            try:
+                await asyncio.wait_for(consume(), timeout)
+            finally:
+                with self._lock:
+                    self._in_flight -= 1
+                    self._latency_total += time.perf_counter() - started
+
+    def stream(self, contents, timeout: Optional[float] = None):
+        """
+        Stream a response, returning an iterator of text chunks.
+
+        The capacity check happens immediately so callers can report
+        ``GeminiBusy`` before they start sending a response. Closing the
+        iterator early (e.g. client disconnect) cancels the request.
+        """
+        timeout = timeout or self.timeout
+        self._admit()
+
+        chunks: queue.Queue = queue.Queue()
+        loop = self._ensure_loop()
+        future = asyncio.run_coroutine_threadsafe(
+            self._stream(contents, timeout, chunks.put), loop
+        )
+        future.add_done_callback(self._done)
+        future.add_done_callback(lambda _: chunks.put(_STREAM_END))
+
+        def iterate():
+            try:
+                while True:
+                    try:
+                        # Deadline covers time spent waiting for a free slot
+                        item = chunks.get(timeout=timeout * 2)
+                    except queue.Empty:
+                        raise GeminiTimeout(f"AI response took longer than {timeout}s")
+                    if item is _STREAM_END:
+                        break
+                    yield item
+
+                if future.cancelled():
+                    raise GeminiTimeout(f"AI response took longer than {timeout}s")
+                error = future.exception()
+                if isinstance(error, asyncio.TimeoutError):
+                    raise GeminiTimeout(f"AI response took longer than {timeout}s")
+                if error is not None:
+                    raise error
+            finally:
+                if not future.done():
+                    future.cancel()
+
+        return iterate()
+
+    def start(
+        self, contents, owner=None, timeout: Optional[float] = None, data=None
+    ) -> str:
+        """
+        Start a streamed request as a ``GeminiJob`` and return its id.
+
+        Raises ``GeminiBusy`` right away when the queue is full.
+        """
+        timeout = timeout or self.timeout
+        self._expire_jobs()
+        self._admit()
+
+        parts: List[str] = []
+        loop = self._ensure_loop()
+        future = asyncio.run_coroutine_threadsafe(
+            self._stream(contents, timeout, parts.append), loop
+        )
+        job = GeminiJob(owner, future, parts, timeout, data)
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._jobs[job_id] = job
+        future.add_done_callback(self._done)
+        future.add_done_callback(lambda _: setattr(job, "finished", time.monotonic()))
+        return job_id
+
+    def job(self, job_id: str, owner=None) -> Optional[GeminiJob]:
+        """
+        The job ``job_id`` started by ``owner``, or None.
+
+        A job still running past twice its timeout (the deadline plus time
+        spent waiting for a slot) is cancelled and reports ``GeminiTimeout``.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None or job.owner != owner:
+            return None
+        if not job.done and job.elapsed > job.timeout * 2:
+            job.future.cancel()
+        return job
+
+    def collect(self, job_id: str, owner=None) -> Optional[GeminiJob]:
+        """Remove and return a finished job; None if unknown or still running."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.owner != owner or not job.done:
+                return None
+            return self._jobs.pop(job_id)
+
+    def _expire_jobs(self) -> None:
+        now = time.monotonic()
+        with self._lock:
+            expired = [
+                job_id
+                for job_id, job in self._jobs.items()
+                if now - job.started > job.timeout * 2 + self.job_ttl
+            ]
+            jobs = [self._jobs.pop(job_id) for job_id in expired]
+        for job in jobs:
+            job.future.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            finished = self._completed + self._failed
+            return {
+                "max_in_flight": self.max_in_flight,
+                "max_queued": self.max_queued,
+                "pending": self._pending,
+                "jobs": len(self._jobs),
+                "in_flight": self._in_flight,
+                "completed": self._completed,
+                "failed": self._failed,
+                "timeouts": self._timeouts,
+                "rejected": self._rejected,
+                "avg_latency_ms": (
+                    round(self._latency_total / finished * 1000, 3) if finished else 0.0
+                ),
+            }
@@ -0,0 +1,185 @@
+import json
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from db_pool import ConnectionPool
+
+DAY = 86400
+
+
+class IncompleteSearch(Exception):
+    """
+    Raised by a places fetcher that could only gather part of the results
+    (e.g. some queries missed the deadline). The partial results are served
+    but not cached.
+    """
+
+    def __init__(self, hospitals: List[Dict[str, Any]]):
+        super().__init__(f"Incomplete hospital search ({len(hospitals)} results)")
+        self.hospitals = hospitals
+
+
+class HospitalSearchCache:
+    """
+    Two-tier SQLite cache in front of the Google Maps API.
+
+    The geocode tier maps a normalized location string to coordinates and
+    is kept for a long time (addresses rarely move). The places tier maps
+    (rounded lat, rounded lng, specialization) to a list of hospitals with a
+    shorter freshness window; once an entry is stale but still younger than
+    ``stale_ttl`` it is served immediately while a background thread fetches
+    a replacement (stale-while-revalidate). Both tables come from
+    migrations.py.
+    """
+
+    def __init__(
+        self,
+        database: str,
+        geocode_ttl: float = 30 * DAY,
+        places_ttl: float = DAY,
+        stale_ttl: float = 7 * DAY,
+        precision: int = 2,
+    ):
+        self.pool = ConnectionPool(database, max_size=4)
+        self.geocode_ttl = geocode_ttl
+        self.places_ttl = places_ttl
+        self.stale_ttl = stale_ttl
+        # 2 decimal places is roughly a 1 km grid
+        self.precision = precision
+
+        self._refreshing: set = set()
+        self._lock = threading.Lock()
+        self._counters = {
+            "geocode_hits": 0,
+            "geocode_misses": 0,
+            "places_hits": 0,
+            "places_stale_hits": 0,
+            "places_misses": 0,
+            "background_refreshes": 0,
+            "refresh_errors": 0,
+            "incomplete_searches": 0,
+        }
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._counters[name] += 1
+
+    def _query(self, sql: str, params: tuple):
+        conn = self.pool.acquire()
+        try:
+            return conn.execute(sql, params).fetchone()
+        finally:
+            self.pool.release(conn)
+
+    def _write(self, sql: str, params: tuple) -> None:
+        conn = self.pool.acquire()
+        try:
+            conn.execute(sql, params)
+            conn.commit()
+        finally:
+            self.pool.release(conn)
+
+    def geocode(
+        self,
+        location: str,
+        fetch: Callable[[str], Optional[Tuple[float, float]]],
+    ) -> Optional[Tuple[float, float]]:
+        """Return (lat, lng) for ``location``, calling ``fetch`` on a miss."""
+        query = " ".join(location.lower().split())
+        row = self._query(
+            "SELECT lat, lng, fetched_at FROM geocode_cache WHERE query = ?", (query,)
+        )
+        if row and time.time() - row["fetched_at"] < self.geocode_ttl:
+            self._count("geocode_hits")
+            return row["lat"], row["lng"]
+
+        self._count("geocode_misses")
+        coordinates = fetch(location)
+        if coordinates is not None:
+            self._write(
+                """
+                INSERT OR REPLACE INTO geocode_cache (query, lat, lng, fetched_at)
+                VALUES (?, ?, ?, ?)
+                """,
+                (query, coordinates[0], coordinates[1], time.time()),
+            )
+        return coordinates
+
+    def _store_places(self, key: tuple, hospitals: List[Dict[str, Any]]) -> None:
+        self._write(
+            """
+            INSERT OR REPLACE INTO places_cache
+            (lat_key, lng_key, specialization, payload, fetched_at)
+            VALUES (?, ?, ?, ?, ?)
+            """,
+            (*key, json.dumps(hospitals), time.time()),
+        )
+
+    def _refresh(
+        self, key: tuple, lat: float, lng: float, specialization: str, fetch
+    ) -> None:
+        try:
+            self._store_places(key, fetch(lat, lng, specialization))
+            self._count("background_refreshes")
+        except IncompleteSearch:
+            # Keep serving the stale entry rather than caching partial results
+            self._count("incomplete_searches")
+        except Exception as e:
+            self._count("refresh_errors")
+            print(f"Background hospital refresh failed: {str(e)}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def places(
+        self,
+        lat: float,
+        lng: float,
+        specialization: str,
+        fetch: Callable[[float, float, str], List[Dict[str, Any]]],
+    ) -> List[Dict[str, Any]]:
+        """Return hospitals near (lat, lng), calling ``fetch`` on a miss."""
+        key = (
+            round(lat, self.precision),
+            round(lng, self.precision),
+            specialization.lower(),
+        )
+        row = self._query(
+            """
+            SELECT payload, fetched_at FROM places_cache
+            WHERE lat_key = ? AND lng_key = ? AND specialization = ?
+            """,
+            key,
+        )
+
+        if row:
+            age = time.time() - row["fetched_at"]
+            if age < self.places_ttl:
+                self._count("places_hits")
+                return json.loads(row["payload"])
+            if age < self.stale_ttl:
+                self._count("places_stale_hits")
+                with self._lock:
+                    start_refresh = key not in self._refreshing
+                    self._refreshing.add(key)
+                if start_refresh:
+                    threading.Thread(
+                        target=self._refresh,
+                        args=(key, lat, lng, specialization, fetch),
+                        daemon=True,
+                    ).start()
+                return json.loads(row["payload"])
+
+        self._count("places_misses")
+        try:
+            hospitals = fetch(lat, lng, specialization)
+        except IncompleteSearch as e:
+            self._count("incomplete_searches")
+            return e.hospitals
+        self._store_places(key, hospitals)
+        return hospitals
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self._counters, refreshing=len(self._refreshing))
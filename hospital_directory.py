@@ -0,0 +1,380 @@
+"""
+Offline hospital directory with a spatial grid index.
+
+Providers are imported once into a SQLite table and loaded into memory as a
+uniform lat/lng grid, with one grid per specialization acting as an inverted
+index. ``nearest()`` walks grid rings outward from the query point, so
+"nearest N gynecologists within R km" touches only a handful of cells.
+``locate()`` resolves a city or postcode to the centre of its providers,
+so searches by place name work without a geocoding service.
+
+Usage:
+    python hospital_directory.py import providers.csv [--db hospitals.db]
+    python hospital_directory.py bench [--count 100000]
+"""
+
+import argparse
+import csv
+import heapq
+import json
+import math
+import os
+import random
+import sqlite3
+import time
+from array import array
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from migrations import add_column, table_columns
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = 111.32
+
+
+def haversine_km(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    """Great-circle distance between two points in kilometres."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlmb = math.radians(lng2 - lng1)
+    a = (
+        math.sin(dphi / 2) ** 2
+        + math.cos(phi1) * math.cos(phi2) * math.sin(dlmb / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def _place_key(value) -> str:
+    """Case- and spacing-insensitive form of a city or postcode."""
+    return " ".join(str(value or "").lower().split())
+
+
+def _split_specializations(value) -> List[str]:
+    if isinstance(value, (list, tuple)):
+        items = value
+    else:
+        items = str(value or "").replace(";", ",").split(",")
+    return [item.strip() for item in items if item.strip()]
+
+
+class HospitalDirectory:
+    """In-memory spatial index over a list of providers."""
+
+    def __init__(self, providers: Iterable[Dict[str, Any]], cell_km: float = 5.0):
+        self.cell_deg = cell_km / KM_PER_DEGREE
+        self.cell_km = cell_km
+
+        self._lat = array("d")
+        self._lng = array("d")
+        self._records: List[Tuple[str, str, Any, str, Tuple[str, ...]]] = []
+        # specialization ("" = any) -> grid cell -> provider indexes
+        self._grids: Dict[str, Dict[Tuple[int, int], List[int]]] = {"": {}}
+        # city / postcode -> [sum of lat, sum of lng, providers]
+        self._places: Dict[str, List[float]] = {}
+
+        for provider in providers:
+            self._add(provider)
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def _cell(self, lat: float, lng: float) -> Tuple[int, int]:
+        return int(math.floor(lat / self.cell_deg)), int(
+            math.floor(lng / self.cell_deg)
+        )
+
+    def _add(self, provider: Dict[str, Any]) -> None:
+        index = len(self._records)
+        lat, lng = float(provider["lat"]), float(provider["lng"])
+        specializations = tuple(_split_specializations(provider.get("specializations")))
+        self._lat.append(lat)
+        self._lng.append(lng)
+        self._records.append(
+            (
+                provider.get("name", "Unknown"),
+                provider.get("address", ""),
+                provider.get("rating", "N/A"),
+                provider.get("phone", ""),
+                specializations,
+            )
+        )
+
+        for place in (provider.get("city"), provider.get("postcode")):
+            key = _place_key(place)
+            if key:
+                totals = self._places.setdefault(key, [0.0, 0.0, 0])
+                totals[0] += lat
+                totals[1] += lng
+                totals[2] += 1
+
+        cell = self._cell(lat, lng)
+        self._grids[""].setdefault(cell, []).append(index)
+        for specialization in specializations:
+            grid = self._grids.setdefault(specialization.lower(), {})
+            grid.setdefault(cell, []).append(index)
+
+    def nearest(
+        self,
+        lat: float,
+        lng: float,
+        specialization: Optional[str] = None,
+        limit: int = 5,
+        radius_km: float = 10.0,
+    ) -> List[Dict[str, Any]]:
+        """Return up to ``limit`` providers within ``radius_km``, closest first."""
+        grid = self._grids.get((specialization or "").lower())
+        if not grid:
+            return []
+
+        center_row, center_col = self._cell(lat, lng)
+        # Longitude cells shrink towards the poles
+        lng_scale = max(math.cos(math.radians(lat)), 0.01)
+        max_ring = int(math.ceil(radius_km / (self.cell_km * lng_scale))) + 1
+
+        best: List[Tuple[float, int]] = []  # max-heap of (-distance, index)
+        for ring in range(max_ring + 1):
+            for row in range(center_row - ring, center_row + ring + 1):
+                on_edge_row = row in (center_row - ring, center_row + ring)
+                step = 1 if on_edge_row else 2 * ring
+                for col in range(center_col - ring, center_col + ring + 1, step or 1):
+                    for index in grid.get((row, col), ()):
+                        distance = haversine_km(
+                            lat, lng, self._lat[index], self._lng[index]
+                        )
+                        if distance > radius_km:
+                            continue
+                        if len(best) < limit:
+                            heapq.heappush(best, (-distance, index))
+                        elif distance < -best[0][0]:
+                            heapq.heapreplace(best, (-distance, index))
+
+            # Everything within ``ring`` cells (scaled for longitude) is covered
+            covered_km = ring * self.cell_km * lng_scale
+            if len(best) == limit and -best[0][0] <= covered_km:
+                break
+
+        results = []
+        for negative_distance, index in sorted(best, reverse=True):
+            name, address, rating, phone, specializations = self._records[index]
+            results.append(
+                {
+                    "name": name,
+                    "address": address,
+                    "rating": rating,
+                    "phone": phone,
+                    "specializations": list(specializations),
+                    "distance_km": round(-negative_distance, 2),
+                }
+            )
+        return results
+
+    def locate(self, location: str) -> Optional[Tuple[float, float]]:
+        """
+        Centre of the providers in a city or postcode, or None if unknown.
+
+        The whole text is tried first, then each comma-separated part, so
+        "Springfield, IL" and "SW1A 1AA, London" resolve too.
+        """
+        parts = [location] + str(location or "").split(",")
+        for part in parts:
+            totals = self._places.get(_place_key(part))
+            if totals:
+                return totals[0] / totals[2], totals[1] / totals[2]
+        return None
+
+    @classmethod
+    def from_database(cls, database: str, **kwargs) -> Optional["HospitalDirectory"]:
+        """Load the directory from ``providers``; None if there is no data."""
+        if not os.path.exists(database):
+            return None
+        conn = sqlite3.connect(database)
+        conn.row_factory = sqlite3.Row
+        try:
+            columns = table_columns(conn, "providers")
+            # Directories imported before providers had a city and postcode
+            places = ", ".join(
+                name if name in columns else f"NULL AS {name}"
+                for name in ("city", "postcode")
+            )
+            rows = conn.execute(
+                f"""
+                SELECT name, address, {places}, lat, lng, rating, phone,
+                       specializations
+                FROM providers
+                """
+            ).fetchall()
+        except sqlite3.OperationalError:
+            return None
+        finally:
+            conn.close()
+        if not rows:
+            return None
+        return cls((dict(row) for row in rows), **kwargs)
+
+
+def create_table(conn: sqlite3.Connection) -> None:
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS providers (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            address TEXT,
+            city TEXT,
+            postcode TEXT,
+            lat REAL NOT NULL,
+            lng REAL NOT NULL,
+            rating REAL,
+            phone TEXT,
+            specializations TEXT
+        )
+        """
+    )
+    # Directories imported before providers had a city and postcode
+    add_column(conn, "providers", "city", "TEXT")
+    add_column(conn, "providers", "postcode", "TEXT")
+
+
+def read_providers(path: str) -> Iterable[Dict[str, Any]]:
+    """Read providers from a CSV (header row) or JSON (list of objects) file."""
+    if path.lower().endswith(".json"):
+        with open(path, encoding="utf-8") as f:
+            yield from json.load(f)
+        return
+    with open(path, newline="", encoding="utf-8") as f:
+        yield from csv.DictReader(f)
+
+
+def import_providers(
+    path: str, database: str, replace: bool = False, batch_size: int = 5000
+) -> int:
+    """Bulk-load a provider file into the ``providers`` table."""
+    conn = sqlite3.connect(database)
+    create_table(conn)
+    if replace:
+        conn.execute("DELETE FROM providers")
+
+    count = 0
+    batch = []
+    for provider in read_providers(path):
+        batch.append(
+            (
+                provider["name"],
+                provider.get("address", ""),
+                provider.get("city") or None,
+                provider.get("postcode") or None,
+                float(provider["lat"]),
+                float(provider["lng"]),
+                float(provider["rating"]) if provider.get("rating") else None,
+                provider.get("phone", ""),
+                ",".join(_split_specializations(provider.get("specializations"))),
+            )
+        )
+        if len(batch) >= batch_size:
+            count += _insert(conn, batch)
+            batch = []
+    count += _insert(conn, batch)
+
+    conn.commit()
+    conn.close()
+    return count
+
+
+def _insert(conn: sqlite3.Connection, batch: list) -> int:
+    conn.executemany(
+        """
+        INSERT INTO providers
+            (name, address, city, postcode, lat, lng, rating, phone, specializations)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        batch,
+    )
+    return len(batch)
+
+
+def synthetic_providers(count: int, seed: int = 42) -> List[Dict[str, Any]]:
+    """Providers scattered around a few metro areas, for benchmarking."""
+    rng = random.Random(seed)
+    centers = [
+        ("New York", 40.71, -74.01),
+        ("Los Angeles", 34.05, -118.24),
+        ("Mumbai", 19.08, 72.88),
+        ("London", 51.51, -0.13),
+    ]
+    specialties = [
+        "General Physical",
+        "Gynecologist",
+        "Pediatrician",
+        "Cardiologist",
+        "Dermatologist",
+        "Neurologist",
+        "Orthopedist",
+        "Psychiatrist",
+    ]
+    providers = []
+    for i in range(count):
+        city, lat, lng = rng.choice(centers)
+        providers.append(
+            {
+                "name": f"Provider {i}",
+                "address": f"{i} Synthetic St",
+                "city": city,
+                "lat": lat + rng.gauss(0, 0.3),
+                "lng": lng + rng.gauss(0, 0.3),
+                "rating": round(rng.uniform(3, 5), 1),
+                "specializations": rng.sample(specialties, rng.randint(1, 3)),
+            }
+        )
+    return providers
+
+
+def benchmark(count: int = 100000, queries: int = 2000) -> Dict[str, float]:
+    providers = synthetic_providers(count)
+
+    started = time.perf_counter()
+    directory = HospitalDirectory(providers)
+    build_s = time.perf_counter() - started
+
+    rng = random.Random(7)
+    points = []
+    for _ in range(queries):
+        provider = providers[rng.randrange(count)]
+        points.append(
+            (provider["lat"] + rng.gauss(0, 0.02), provider["lng"] + rng.gauss(0, 0.02))
+        )
+    started = time.perf_counter()
+    for lat, lng in points:
+        directory.nearest(lat, lng, "Gynecologist", limit=5, radius_km=10)
+    query_s = time.perf_counter() - started
+
+    return {
+        "providers": count,
+        "build_seconds": round(build_s, 3),
+        "queries": queries,
+        "avg_query_us": round(query_s / queries * 1e6, 1),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    import_parser = subparsers.add_parser("import", help="bulk-import a CSV/JSON file")
+    import_parser.add_argument("path")
+    import_parser.add_argument(
+        "--db", default=os.getenv("HOSPITAL_DIRECTORY_DB", "hospitals.db")
+    )
+    import_parser.add_argument(
+        "--replace", action="store_true", help="delete existing providers first"
+    )
+
+    bench_parser = subparsers.add_parser("bench", help="benchmark nearest lookups")
+    bench_parser.add_argument("--count", type=int, default=100000)
+    bench_parser.add_argument("--queries", type=int, default=2000)
+
+    args = parser.parse_args()
+    if args.command == "import":
+        started = time.perf_counter()
+        imported = import_providers(args.path, args.db, replace=args.replace)
+        elapsed = time.perf_counter() - started
+        print(f"Imported {imported} providers into {args.db} in {elapsed:.2f}s")
+    else:
+        print(json.dumps(benchmark(args.count, args.queries), indent=2))
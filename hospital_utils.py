@@ -1,12 +1,27 @@
+import json
 import os
-import smtplib
-from datetime import datetime, timedelta
+import random
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Any, Dict, List, Optional, Tuple
 
-import googlemaps
 from dotenv import load_dotenv
-from geopy.geocoders import Nominatim
 from requests.exceptions import RequestException
 
+from hospital_cache import HospitalSearchCache, IncompleteSearch
+from hospital_directory import HospitalDirectory
+from mailer import Mailer
+from migrations import migrate
+from reminders import send_due_reminders
+
+# Try to import googlemaps for actual API calls
+try:
+    import googlemaps
+
+    GOOGLEMAPS_AVAILABLE = True
+except ImportError:
+    GOOGLEMAPS_AVAILABLE = False
+    print("Warning: googlemaps library not found. Using mock hospital data.")
+
 # Load environment variables from .env file
 load_dotenv()
 
@@ -15,8 +30,57 @@ GOOGLE_MAPS_API_KEY = os.getenv("GOOGLE_MAPS_API_KEY")
 SENDER_EMAIL = os.getenv("SENDER_EMAIL")
 SENDER_PASSWORD = os.getenv("SENDER_PASSWORD")
 
-gmaps_client = googlemaps.Client(key=GOOGLE_MAPS_API_KEY)
-geolocator = Nominatim(user_agent="hospital_locator")
+# The outbox and the search caches may live in their own database files;
+# their tables come from the migrations like the rest of the schema
+EMAIL_OUTBOX_DB = os.getenv("EMAIL_OUTBOX_DB", "pregnancy.db")
+HOSPITAL_CACHE_DB = os.getenv("HOSPITAL_CACHE_DB", "pregnancy.db")
+for database in sorted({EMAIL_OUTBOX_DB, HOSPITAL_CACHE_DB}):
+    migrate(database)
+
+# Outgoing email is queued in an outbox and sent in batches over one SMTP
+# connection; point SMTP_HOST/SMTP_PORT at a local server for testing
+mailer = Mailer(
+    EMAIL_OUTBOX_DB,
+    host=os.getenv("SMTP_HOST", "smtp.gmail.com"),
+    port=int(os.getenv("SMTP_PORT", 587)),
+    sender=SENDER_EMAIL,
+    username=SENDER_EMAIL,
+    password=SENDER_PASSWORD,
+    starttls=os.getenv("SMTP_STARTTLS", "true").lower() == "true",
+    batch_size=int(os.getenv("EMAIL_BATCH_SIZE", 50)),
+    max_attempts=int(os.getenv("EMAIL_MAX_ATTEMPTS", 5)),
+)
+
+# Initialize Google Maps client if API key is available
+gmaps_client = None
+if GOOGLE_MAPS_API_KEY and GOOGLEMAPS_AVAILABLE:
+    try:
+        gmaps_client = googlemaps.Client(key=GOOGLE_MAPS_API_KEY)
+    except Exception as e:
+        print(f"Error initializing Google Maps client: {str(e)}")
+
+# Geocode and places results are cached in SQLite to avoid repeat API calls
+search_cache = HospitalSearchCache(
+    HOSPITAL_CACHE_DB,
+    geocode_ttl=float(os.getenv("GEOCODE_CACHE_TTL", 30 * 86400)),
+    places_ttl=float(os.getenv("PLACES_CACHE_TTL", 86400)),
+    stale_ttl=float(os.getenv("PLACES_CACHE_STALE_TTL", 7 * 86400)),
+)
+
+# Per-keyword Places queries run in parallel under an overall deadline
+places_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("PLACES_MAX_WORKERS", 8)),
+    thread_name_prefix="places-search",
+)
+PLACES_SEARCH_DEADLINE = float(os.getenv("PLACES_SEARCH_DEADLINE", 4))
+
+# Offline provider directory (see hospital_directory.py); when it has been
+# imported, nearby searches are answered locally without calling Places
+hospital_directory = HospitalDirectory.from_database(
+    os.getenv("HOSPITAL_DIRECTORY_DB", "hospitals.db")
+)
+DIRECTORY_RADIUS_KM = float(os.getenv("HOSPITAL_DIRECTORY_RADIUS_KM", 10))
+DIRECTORY_LIMIT = int(os.getenv("HOSPITAL_DIRECTORY_LIMIT", 5))
 
 # Mock database for storing appointments
 appointments = []
@@ -93,155 +157,8 @@ SPECIALTY_KEYWORDS = {
     "surgeon": ["surgeon", "surgery specialist", "operation doctor"],
 }
 
-
-def get_hospitals(
-    location=None, latitude=None, longitude=None, specialization="hospital"
-):
-    """
-    Fetch nearby hospitals based on location or GPS coordinates and specialization.
-    """
-    try:
-        # Validate specialization
-        keywords = SPECIALTY_KEYWORDS.get(specialization.lower(), ["hospital"])
-
-        if location:
-            # Use Google Maps API for geocoding
-            try:
-                geocode_result = gmaps_client.geocode(location)  # type: ignore
-                if not geocode_result:
-                    return {"error": "Invalid location provided."}
-                lat = geocode_result[0]["geometry"]["location"]["lat"]
-                lng = geocode_result[0]["geometry"]["location"]["lng"]
-            except RequestException as e:
-                return {"error": f"Failed to resolve location: {str(e)}"}
-            except Exception as e:
-                return {"error": f"Geocoding error: {str(e)}"}
-        elif latitude and longitude:
-            # Use provided latitude and longitude
-            lat, lng = latitude, longitude
-        else:
-            return {"error": "Either location or GPS coordinates are required."}
-
-        all_hospitals = []
-
-        # Search using each keyword
-        for keyword in keywords:
-            places_result = gmaps_client.places(  # type: ignore
-                query=keyword, location=(lat, lng), radius=5000, type="hospital"
-            )
-            # Add hospitals to the result list
-            for place in places_result.get("results", []):
-                all_hospitals.append(
-                    {
-                        "name": place["name"],
-                        "address": place.get("vicinity", ""),
-                        "rating": place.get("rating", "N/A"),
-                        "user_ratings_total": place.get("user_ratings_total", 0),
-                    }
-                )
-
-        # Remove duplicates by converting the list of dictionaries to a set and back
-        unique_hospitals = [dict(t) for t in {tuple(d.items()) for d in all_hospitals}]
-        return {"hospitals": unique_hospitals}
-
-    except Exception as e:
-        return {"error": str(e)}
-
-
-def book_appointment(hospital_name, user_name, user_email, slot):
-    """
-    Book an appointment and send confirmation email.
-    """
-    if not all([hospital_name, user_name, user_email, slot]):
-        return {"error": "Hospital name, user name, user email, and slot are required."}
-
-    try:
-        # Save appointment in mock database
-        appointment = {
-            "user_name": user_name,
-            "user_email": user_email,
-            "hospital_name": hospital_name,
-            "slot": slot,
-            "reminders_sent": False,
-        }
-        appointments.append(appointment)
-
-        # Send confirmation email
-        send_email(
-            to_email=user_email,
-            subject="Appointment Confirmation",
-            body=f"Hi {user_name},\n\nYour appointment at {hospital_name} has been confirmed for {slot}.\n\nThank you!",
-        )
-
-        return {"message": "Appointment booked successfully!"}
-
-    except Exception as e:
-        return {"error": str(e)}
-
-
-def send_email(to_email, subject, body):
-    """
-    Utility function to send an email.
-    """
-    try:
-        if SENDER_EMAIL is None or SENDER_PASSWORD is None:
-            print("Email credentials not available. Check environment variables.")
-            return
-
-        with smtplib.SMTP("smtp.gmail.com", 587) as server:
-            server.starttls()
-            server.login(SENDER_EMAIL, SENDER_PASSWORD)
-            email_message = f"Subject: {subject}\n\n{body}"
-            server.sendmail(SENDER_EMAIL, to_email, email_message)
-    except Exception as e:
-        print(f"Failed to send email: {e}")
-
-
-def send_reminders():
-    """
-    Send appointment reminders 15-120 minutes before the appointment.
-    """
-    now = datetime.now()
-    for appointment in appointments:
-        if appointment["reminders_sent"]:
-            continue
-
-        slot_time = datetime.strptime(appointment["slot"], "%Y-%m-%d %H:%M")
-        time_diff = slot_time - now
-
-        if timedelta(minutes=15) <= time_diff <= timedelta(minutes=120):
-            # Send reminder email
-            send_email(
-                to_email=appointment["user_email"],
-                subject="Appointment Reminder",
-                body=f"Hi {appointment['user_name']},\n\nThis is a reminder for your appointment at {appointment['hospital_name']} scheduled for {appointment['slot']}.\n\nThank you!",
-            )
-            appointment["reminders_sent"] = True
-
-import json
-import os
-import random
-from typing import Any, Dict, List, Optional
-
-# Try to import googlemaps for actual API calls
-try:
-    import googlemaps
-
-    GOOGLEMAPS_AVAILABLE = True
-except ImportError:
-    GOOGLEMAPS_AVAILABLE = False
-    print("Warning: googlemaps library not found. Using mock hospital data.")
-
-# Get API key from environment
-GOOGLE_MAPS_API_KEY = os.environ.get("GOOGLE_MAPS_API_KEY")
-
-# Initialize Google Maps client if API key is available
-gmaps_client = None
-if GOOGLE_MAPS_API_KEY and GOOGLEMAPS_AVAILABLE:
-    try:
-        gmaps_client = googlemaps.Client(key=GOOGLE_MAPS_API_KEY)
-    except Exception as e:
-        print(f"Error initializing Google Maps client: {str(e)}")
+# Case-insensitive lookup ("General Physical" is stored with capitals above)
+_KEYWORDS_BY_SPECIALTY = {k.lower(): v for k, v in SPECIALTY_KEYWORDS.items()}
 
 # Mock hospital data for testing or when API is unavailable
 MOCK_HOSPITALS = [
@@ -293,75 +210,156 @@ MOCK_HOSPITALS = [
 ]
 
 
-def get_hospitals(
-    location: str, specialization: Optional[str] = None
-) -> Dict[str, Any]:
+def _geocode(location: str) -> Optional[Tuple[float, float]]:
+    """Resolve a location string to coordinates with the Google Maps API."""
+    geocode_result = gmaps_client.geocode(location)  # type: ignore
+    if not geocode_result:
+        return None
+    coordinates = geocode_result[0]["geometry"]["location"]
+    return coordinates["lat"], coordinates["lng"]
+
+
+def _places_query(keyword: str, lat: float, lng: float) -> List[Dict[str, Any]]:
+    """Run one Places text search and return the raw results."""
+    places_result = gmaps_client.places(  # type: ignore
+        query=keyword, location=(lat, lng), radius=5000, type="hospital"
+    )
+    return places_result.get("results", [])
+
+
+def _search_places(lat: float, lng: float, specialization: str) -> List[Dict[str, Any]]:
     """
-    Get hospitals near a location with optional specialization filter.
-    Falls back to mock data if the Google Maps API is not available.
+    Query the Places API for every specialty keyword in parallel and merge
+    the results, de-duplicated by place_id. Keywords that have not answered
+    within ``PLACES_SEARCH_DEADLINE`` seconds are dropped, and the partial
+    result is reported through ``IncompleteSearch`` so it is not cached.
+    """
+    keywords = _KEYWORDS_BY_SPECIALTY.get(specialization.lower(), ["hospital"])
+    futures = [
+        places_executor.submit(_places_query, keyword, lat, lng) for keyword in keywords
+    ]
+    done, not_done = wait(futures, timeout=PLACES_SEARCH_DEADLINE)
+    for future in not_done:
+        future.cancel()
+
+    hospitals = {}
+    complete = not not_done
+    # Merge in keyword order so the most specific keyword's ranking wins
+    for future in futures:
+        if future not in done:
+            continue
+        if future.exception() is not None:
+            print(f"Places query failed: {str(future.exception())}")
+            complete = False
+            continue
+        for place in future.result():
+            key = place.get("place_id") or (place["name"], place.get("vicinity", ""))
+            if key in hospitals:
+                continue
+            hospitals[key] = {
+                "name": place["name"],
+                "address": place.get("vicinity", ""),
+                "rating": place.get("rating", "N/A"),
+                "user_ratings_total": place.get("user_ratings_total", 0),
+                "place_id": place.get("place_id", ""),
+            }
+
+    if not complete:
+        if not hospitals and not done:
+            raise TimeoutError("Hospital search timed out. Please try again.")
+        raise IncompleteSearch(list(hospitals.values()))
+    return list(hospitals.values())
+
+
+def _mock_hospitals(specialization: Optional[str]) -> Dict[str, Any]:
+    """Return a few mock hospitals when the Google Maps API is not available."""
+    filtered_hospitals = MOCK_HOSPITALS
+
+    # Filter by specialization if provided
+    if specialization:
+        filtered_hospitals = [
+            h for h in MOCK_HOSPITALS if specialization in h.get("specializations", [])
+        ]
+
+    # Simulate location-based filtering with 3-5 random results; sample
+    # rather than shuffle so MOCK_HOSPITALS itself is never reordered
+    result_count = min(random.randint(3, 5), len(filtered_hospitals))
+    filtered_hospitals = random.sample(filtered_hospitals, result_count)
 
-    Args:
-        location: City or address to search near
-        specialization: Optional medical specialization to filter by
+    return {
+        "status": "success",
+        "hospitals": filtered_hospitals,
+        "count": len(filtered_hospitals),
+        "source": "Mock Data",
+    }
 
-    Returns:
-        Dict with hospitals and status information
+
+def get_hospitals(
+    location=None, latitude=None, longitude=None, specialization="hospital"
+):
+    """
+    Fetch nearby hospitals based on location or GPS coordinates and specialization.
+    The local ``hospital_directory`` is searched first when it is loaded, and
+    resolves location strings that name one of its cities or postcodes;
+    otherwise geocodes and search results are served from ``search_cache``
+    when possible. Falls back to mock data if neither is available.
     """
     try:
-        # Try to use Google Maps API if available
-        if gmaps_client:
-            # Query for places with the 'hospital' type near the provided location
-            places_result = gmaps_client.places_nearby(  # type: ignore
-                location=location,
-                keyword=f"hospital {specialization}" if specialization else "hospital",
-                radius=5000,  # 5km radius
-                type="hospital",
-            )
+        if gmaps_client is None and hospital_directory is None:
+            return _mock_hospitals(specialization)
+
+        if location:
+            # Cities and postcodes in the directory resolve without a Maps key
+            coordinates = None
+            if hospital_directory is not None:
+                coordinates = hospital_directory.locate(location)
+            if coordinates is None:
+                if gmaps_client is None:
+                    return _mock_hospitals(specialization)
+                # Use Google Maps API for geocoding (cached)
+                try:
+                    coordinates = search_cache.geocode(location, _geocode)
+                except RequestException as e:
+                    return {"error": f"Failed to resolve location: {str(e)}"}
+                except Exception as e:
+                    return {"error": f"Geocoding error: {str(e)}"}
+            if coordinates is None:
+                return {"error": "Invalid location provided."}
+            lat, lng = coordinates
+        elif latitude and longitude:
+            # Use provided latitude and longitude
+            lat, lng = float(latitude), float(longitude)
+        else:
+            return {"error": "Either location or GPS coordinates are required."}
 
-            # Extract relevant hospital data
-            hospitals = []
-            for place in places_result.get("results", []):
-                hospital = {
-                    "name": place.get("name", "Unknown"),
-                    "address": place.get("vicinity", "No address available"),
-                    "rating": place.get("rating", "No rating"),
-                    "specializations": (
-                        [specialization] if specialization else ["General"]
-                    ),
-                    "place_id": place.get("place_id", ""),
+        if hospital_directory is not None:
+            # "hospital" is the generic search, so match any specialization
+            if (specialization or "hospital").lower() == "hospital":
+                specialization = None
+            hospitals = hospital_directory.nearest(
+                lat,
+                lng,
+                specialization,
+                limit=DIRECTORY_LIMIT,
+                radius_km=DIRECTORY_RADIUS_KM,
+            )
+            if hospitals or gmaps_client is None:
+                return {
+                    "status": "success",
+                    "hospitals": hospitals,
+                    "count": len(hospitals),
+                    "source": "Local Directory",
                 }
-                hospitals.append(hospital)
 
-            return {
-                "status": "success",
-                "hospitals": hospitals,
-                "count": len(hospitals),
-                "source": "Google Maps API",
-            }
-        else:
-            # Fall back to mock data if API is not available
-            filtered_hospitals = MOCK_HOSPITALS
-
-            # Filter by specialization if provided
-            if specialization:
-                filtered_hospitals = [
-                    h
-                    for h in MOCK_HOSPITALS
-                    if specialization in h.get("specializations", [])
-                ]
-
-            # Simulate location-based filtering (just randomize for mock data)
-            random.shuffle(filtered_hospitals)
-            # Limit to 3-5 random results for realistic mock data
-            result_count = random.randint(3, min(5, len(filtered_hospitals)))
-            filtered_hospitals = filtered_hospitals[:result_count]
-
-            return {
-                "status": "success",
-                "hospitals": filtered_hospitals,
-                "count": len(filtered_hospitals),
-                "source": "Mock Data",
-            }
+        hospitals = search_cache.places(
+            lat, lng, specialization or "hospital", _search_places
+        )
+        return {
+            "status": "success",
+            "hospitals": hospitals,
+            "count": len(hospitals),
+            "source": "Google Maps API",
+        }
 
     except Exception as e:
         return {
@@ -372,8 +370,64 @@ def get_hospitals(
         }
 
 
+def book_appointment(hospital_name, user_name, user_email, slot):
+    """
+    Book an appointment and send confirmation email.
+    """
+    if not all([hospital_name, user_name, user_email, slot]):
+        return {"error": "Hospital name, user name, user email, and slot are required."}
+
+    try:
+        # Save appointment in mock database
+        appointment = {
+            "user_name": user_name,
+            "user_email": user_email,
+            "hospital_name": hospital_name,
+            "slot": slot,
+            "reminders_sent": False,
+        }
+        appointments.append(appointment)
+
+        # Send confirmation email
+        send_email(
+            to_email=user_email,
+            subject="Appointment Confirmation",
+            body=f"Hi {user_name},\n\nYour appointment at {hospital_name} has been confirmed for {slot}.\n\nThank you!",
+        )
+
+        return {"message": "Appointment booked successfully!"}
+
+    except Exception as e:
+        return {"error": str(e)}
+
+
+def send_email(to_email, subject, body):
+    """
+    Utility function to send an email. The message is stored in the outbox
+    and delivered (with retries) by the background ``mailer``.
+    """
+    try:
+        if SENDER_EMAIL is None:
+            print("Email credentials not available. Check environment variables.")
+            return None
+
+        return mailer.enqueue(to_email, subject, body)
+    except Exception as e:
+        print(f"Failed to queue email: {e}")
+        return None
+
+
+def send_reminders(database="pregnancy.db"):
+    """
+    Send appointment reminders 15-120 minutes before the appointment.
+    Runs one pass of the ``appointments``-table scheduler (see reminders.py);
+    the app normally keeps a ``ReminderScheduler`` running in the background.
+    """
+    return send_due_reminders(database)
+
+
 # For testing purposes
 if __name__ == "__main__":
     # Test with a sample location
-    result = get_hospitals("New York", "Gynecologist")
+    result = get_hospitals("New York", specialization="Gynecologist")
     print(json.dumps(result, indent=2))
@@ -1,157 +1,19 @@
-import os
 import sqlite3
 
-# Create database directory if it doesn't exist
+from migrations import migrate
+
+# Database file
 DB_FILE = "pregnancy.db"
 
 
 def init_db():
     """Initialize the database with required tables."""
+    # Bring the schema up to date (creates the tables on a new database)
+    migrate(DB_FILE)
+
     conn = sqlite3.connect(DB_FILE)
     cur = conn.cursor()
 
-    # Create users table
-    cur.execute(
-        """
-    CREATE TABLE IF NOT EXISTS users (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        name TEXT NOT NULL,
-        phone TEXT UNIQUE NOT NULL,
-        password TEXT NOT NULL,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-    )
-    """
-    )
-
-    # Create pregnancy_profile table
-    cur.execute(
-        """
-    CREATE TABLE IF NOT EXISTS pregnancy_profile (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        user_id INTEGER NOT NULL,
-        due_date TEXT,
-        last_menstrual_period TEXT,
-        previous_pregnancies INTEGER DEFAULT 0,
-        live_births INTEGER DEFAULT 0,
-        miscarriages INTEGER DEFAULT 0,
-        current_week INTEGER DEFAULT 0,
-        doctor_name TEXT,
-        doctor_contact TEXT,
-        hospital_name TEXT,
-        hospital_contact TEXT,
-        blood_type TEXT,
-        allergies TEXT,
-        medications TEXT,
-        pre_existing_conditions TEXT,
-        weight REAL,
-        height REAL,
-        diet TEXT,
-        exercise TEXT,
-        smoking_status TEXT,
-        alcohol_consumption TEXT,
-        caffeine_intake TEXT,
-        stress_levels TEXT,
-        emotional_wellbeing TEXT,
-        partner_name TEXT,
-        partner_contact TEXT,
-        emergency_contact TEXT,
-        birth_preferences TEXT,
-        additional_notes TEXT,
-        FOREIGN KEY (user_id) REFERENCES users (id)
-    )
-    """
-    )
-
-    # Create health_records table
-    cur.execute(
-        """
-    CREATE TABLE IF NOT EXISTS health_records (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        user_id INTEGER NOT NULL,
-        file_name TEXT NOT NULL,
-        file_path TEXT NOT NULL,
-        upload_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        FOREIGN KEY (user_id) REFERENCES users (id)
-    )
-    """
-    )
-
-    # Create symptoms table
-    cur.execute(
-        """
-    CREATE TABLE IF NOT EXISTS symptoms (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        user_id INTEGER NOT NULL,
-        symptom TEXT NOT NULL,
-        advice TEXT NOT NULL,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        FOREIGN KEY (user_id) REFERENCES users (id)
-    )
-    """
-    )
-
-    # Create appointments table
-    cur.execute(
-        """
-    CREATE TABLE IF NOT EXISTS appointments (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        user_id INTEGER NOT NULL,
-        hospital_name TEXT NOT NULL,
-        specialization TEXT NOT NULL,
-        date TEXT NOT NULL,
-        time TEXT NOT NULL,
-        status TEXT DEFAULT 'Scheduled',
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        FOREIGN KEY (user_id) REFERENCES users (id)
-    )
-    """
-    )
-
-    # Create user_preferences table
-    cur.execute(
-        """
-    CREATE TABLE IF NOT EXISTS user_preferences (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        user_id INTEGER UNIQUE NOT NULL,
-        dark_mode INTEGER DEFAULT 0,
-        theme_color TEXT DEFAULT 'blue',
-        show_nsfw INTEGER DEFAULT 0,
-        language TEXT DEFAULT 'en',
-        FOREIGN KEY (user_id) REFERENCES users (id)
-    )
-    """
-    )
-
-    # Create pregnancy_records table
-    cur.execute(
-        """
-    CREATE TABLE IF NOT EXISTS pregnancy_records (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        user_id INTEGER NOT NULL,
-        date_type TEXT NOT NULL,
-        input_date TEXT NOT NULL,
-        calculated_due_date TEXT NOT NULL,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        FOREIGN KEY (user_id) REFERENCES users (id)
-    )
-    """
-    )
-
-    # Create exercises table
-    cur.execute(
-        """
-    CREATE TABLE IF NOT EXISTS exercises (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        name TEXT NOT NULL,
-        image TEXT NOT NULL,
-        reps TEXT NOT NULL,
-        description TEXT,
-        trimester TEXT,
-        difficulty TEXT DEFAULT 'Medium'
-    )
-    """
-    )
-
     # Insert some example exercises
     exercises = [
         (
@@ -0,0 +1,286 @@
+import random
+import smtplib
+import threading
+import time
+from email.message import EmailMessage
+from typing import Any, Dict, List, Optional
+
+from db_pool import ConnectionPool
+
+
+class Mailer:
+    """
+    Email delivery through a persistent SQLite outbox.
+
+    ``enqueue()`` only inserts a row, so callers never wait on SMTP. A
+    background thread claims due messages in batches, sends each batch over
+    a single authenticated SMTP connection and records the outcome. Temporary
+    failures are retried with exponential backoff (plus jitter) until
+    ``max_attempts``; permanent 5xx rejections fail immediately. Rows left
+    in ``sending`` by a crashed process are requeued after ``claim_timeout``.
+    The ``email_outbox`` table comes from migrations.py.
+
+    Point ``host``/``port`` at a local stand-in such as
+    ``python -m aiosmtpd -n -l localhost:8025`` (with ``starttls=False``) to
+    test without a real mail server.
+    """
+
+    def __init__(
+        self,
+        database: str,
+        host: str,
+        port: int = 587,
+        sender: Optional[str] = None,
+        username: Optional[str] = None,
+        password: Optional[str] = None,
+        starttls: bool = True,
+        batch_size: int = 50,
+        max_attempts: int = 5,
+        backoff_base: float = 30.0,
+        backoff_max: float = 3600.0,
+        poll_interval: float = 5.0,
+        claim_timeout: float = 600.0,
+        smtp_timeout: float = 30.0,
+    ):
+        self.pool = ConnectionPool(database, max_size=2)
+        self.host = host
+        self.port = port
+        self.sender = sender or username
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.poll_interval = poll_interval
+        self.claim_timeout = claim_timeout
+        self.smtp_timeout = smtp_timeout
+
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._lock = threading.Lock()
+
+        # Metrics
+        self._enqueued = 0
+        self._sent = 0
+        self._retried = 0
+        self._failed = 0
+        self._batches = 0
+        self._connections = 0
+        self._send_time_total = 0.0
+
+    def enqueue(self, to_email: str, subject: str, body: str) -> int:
+        """Store a message in the outbox and wake the sender."""
+        now = time.time()
+        conn = self.pool.acquire()
+        try:
+            cur = conn.execute(
+                """
+                INSERT INTO email_outbox
+                (to_email, subject, body, next_attempt_at, created_at)
+                VALUES (?, ?, ?, ?, ?)
+                """,
+                (to_email, subject, body, now, now),
+            )
+            conn.commit()
+            message_id = cur.lastrowid
+        finally:
+            self.pool.release(conn)
+
+        with self._lock:
+            self._enqueued += 1
+        self.start()
+        self._wake.set()
+        return message_id
+
+    def _claim(self, now: float) -> List[Dict[str, Any]]:
+        conn = self.pool.acquire()
+        try:
+            # Requeue messages claimed by a sender that never reported back
+            conn.execute(
+                """
+                UPDATE email_outbox SET status = 'pending'
+                WHERE status = 'sending' AND claimed_at < ?
+                """,
+                (now - self.claim_timeout,),
+            )
+            rows = conn.execute(
+                """
+                UPDATE email_outbox SET status = 'sending', claimed_at = ?
+                WHERE id IN (
+                    SELECT id FROM email_outbox
+                    WHERE status = 'pending' AND next_attempt_at <= ?
+                    ORDER BY next_attempt_at
+                    LIMIT ?
+                )
+                RETURNING id, to_email, subject, body, attempts
+                """,
+                (now, now, self.batch_size),
+            ).fetchall()
+            conn.commit()
+        finally:
+            self.pool.release(conn)
+        return [dict(row) for row in rows]
+
+    def _mark_sent(self, message_id: int) -> None:
+        conn = self.pool.acquire()
+        try:
+            conn.execute(
+                """
+                UPDATE email_outbox
+                SET status = 'sent', sent_at = ?, attempts = attempts + 1,
+                    last_error = NULL
+                WHERE id = ?
+                """,
+                (time.time(), message_id),
+            )
+            conn.commit()
+        finally:
+            self.pool.release(conn)
+
+    def _mark_failed(self, message: Dict[str, Any], error: str, permanent: bool):
+        attempts = message["attempts"] + 1
+        if permanent or attempts >= self.max_attempts:
+            status, next_attempt_at = "failed", time.time()
+            with self._lock:
+                self._failed += 1
+        else:
+            delay = min(self.backoff_base * 2 ** (attempts - 1), self.backoff_max)
+            status = "pending"
+            next_attempt_at = time.time() + delay * random.uniform(0.8, 1.2)
+            with self._lock:
+                self._retried += 1
+
+        conn = self.pool.acquire()
+        try:
+            conn.execute(
+                """
+                UPDATE email_outbox
+                SET status = ?, attempts = ?, next_attempt_at = ?, last_error = ?
+                WHERE id = ?
+                """,
+                (status, attempts, next_attempt_at, error[:500], message["id"]),
+            )
+            conn.commit()
+        finally:
+            self.pool.release(conn)
+
+    def _connect(self) -> smtplib.SMTP:
+        server = smtplib.SMTP(self.host, self.port, timeout=self.smtp_timeout)
+        if self.starttls:
+            server.starttls()
+        if self.username and self.password:
+            server.login(self.username, self.password)
+        with self._lock:
+            self._connections += 1
+        return server
+
+    def send_pending(self) -> int:
+        """Send one batch of due messages over a single SMTP connection."""
+        batch = self._claim(time.time())
+        if not batch:
+            return 0
+
+        started = time.perf_counter()
+        sent = 0
+        server = None
+        try:
+            server = self._connect()
+            for position, message in enumerate(batch):
+                email = EmailMessage()
+                email["From"] = self.sender
+                email["To"] = message["to_email"]
+                email["Subject"] = message["subject"]
+                email.set_content(message["body"])
+                try:
+                    server.send_message(email)
+                except smtplib.SMTPResponseException as e:
+                    # 5xx replies will not succeed on retry
+                    self._mark_failed(message, str(e), permanent=e.smtp_code >= 500)
+                    continue
+                except smtplib.SMTPRecipientsRefused as e:
+                    self._mark_failed(message, str(e), permanent=True)
+                    continue
+                except (smtplib.SMTPException, OSError):
+                    # Connection-level problem: retry this and the rest later
+                    for pending in batch[position:]:
+                        self._mark_failed(pending, "SMTP connection lost", False)
+                    raise
+                self._mark_sent(message["id"])
+                sent += 1
+        except (smtplib.SMTPException, OSError) as e:
+            print(f"Failed to send email batch: {e}")
+            if server is None:
+                for message in batch:
+                    self._mark_failed(message, str(e), permanent=False)
+        finally:
+            if server is not None:
+                try:
+                    server.quit()
+                except (smtplib.SMTPException, OSError):
+                    pass
+            with self._lock:
+                self._batches += 1
+                self._sent += sent
+                self._send_time_total += time.perf_counter() - started
+        return sent
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                # Keep draining while full batches are coming back
+                if self.send_pending() >= self.batch_size:
+                    continue
+            except Exception as e:
+                print(f"Mailer error: {str(e)}")
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+
+    def start(self) -> None:
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="mailer", daemon=True
+                )
+                self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+
+    def stats(self) -> Dict[str, Any]:
+        conn = self.pool.acquire()
+        try:
+            # Sent rows pile up for good, so only the queue is counted (a
+            # range of the status index); "sent" is this process's counter
+            counts = dict(
+                conn.execute(
+                    """
+                    SELECT status, COUNT(*) FROM email_outbox
+                    WHERE status IN ('pending', 'sending', 'failed')
+                    GROUP BY status
+                    """
+                ).fetchall()
+            )
+        finally:
+            self.pool.release(conn)
+
+        with self._lock:
+            return {
+                "outbox": counts,
+                "enqueued": self._enqueued,
+                "sent": self._sent,
+                "retried": self._retried,
+                "failed": self._failed,
+                "batches": self._batches,
+                "connections": self._connections,
+                "messages_per_second": (
+                    round(self._sent / self._send_time_total, 2)
+                    if self._send_time_total
+                    else 0.0
+                ),
+                "running": self._thread is not None and self._thread.is_alive(),
+            }
@@ -0,0 +1,329 @@
+"""
+Seven-day meal plans from the local food table.
+
+``foods.json`` holds candidate meals with their nutrients per serving, the
+daily targets and any extra meal slots per trimester, per-condition
+adjustments (required tags, preferred tags, extra weight on a nutrient,
+tighter limits) and the scoring constants. For each day the planner keeps
+the best few candidates per slot, scores every combination of them at once
+with NumPy broadcasting (weighted squared shortfall against the targets,
+calories and limits overshot, meals already eaten that week or from
+another cuisine) and picks the lowest score. Solved weeks are cached per
+(trimester, condition, diet, culture).
+
+Usage:
+    python meal_planner.py show "Third Trimester" Anemia Vegan Indian
+    python meal_planner.py bench
+"""
+
+import argparse
+import itertools
+import json
+import os
+import threading
+import time
+from types import MappingProxyType
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+import numpy as np
+
+DEFAULT_FOODS_PATH = os.path.join(os.path.dirname(__file__), "foods.json")
+DAYS = ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday")
+
+# Limits are soft, but overshooting one costs this much more than missing
+# a target by the same fraction
+LIMIT_FACTOR = 10.0
+
+
+class MealPlanner:
+    """
+    Weekly plans meeting trimester nutrient targets under diet constraints.
+
+    ``plan_week()`` returns a shared read-only mapping with ``days`` (each
+    with ``meals`` by slot and nutrient ``totals``), the ``targets`` and
+    ``limits`` it was solved for, the weekly ``average`` and the
+    ``shortfalls`` (targets the average stays under); None if a choice is
+    not in the food table.
+    """
+
+    def __init__(self, data: Dict[str, Any]):
+        self.slots: Tuple[Tuple[str, str], ...] = tuple(data["slots"].items())
+        self.extra_slots = data.get("extra_slots", {})
+        self.diets: Mapping[str, List[str]] = data["diets"]
+        self.nutrients: Tuple[str, ...] = tuple(data["nutrients"])
+        self.nutrient_info = data["nutrients"]
+        self.targets = data["targets"]
+        self.limits = data["limits"]
+        self.conditions = data["conditions"]
+        self.scoring = data["scoring"]
+
+        self._meals = data["meals"]
+        self.cultures = tuple(sorted({meal["cuisine"] for meal in self._meals}))
+        self._matrix = np.array(
+            [[meal["nutrients"][n] for n in self.nutrients] for meal in self._meals],
+            dtype=np.float64,
+        )
+        self._kinds = np.array([meal["slot"] for meal in self._meals])
+        self._meal_diets = np.array([meal["diet"] for meal in self._meals])
+        self._cuisines = np.array([meal["cuisine"] for meal in self._meals])
+
+        self._plans: Dict[Tuple[str, str, str, str], Mapping[str, Any]] = {}
+        self._lock = threading.Lock()
+
+        # Metrics
+        self._hits = 0
+        self._misses = 0
+        self._solve_time_total = 0.0
+
+    @classmethod
+    def from_file(cls, path: str = DEFAULT_FOODS_PATH) -> "MealPlanner":
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def _vector(self, values: Dict[str, float]) -> np.ndarray:
+        return np.array([values.get(n, 0.0) for n in self.nutrients], dtype=np.float64)
+
+    def _has_tags(self, tags: List[str]) -> np.ndarray:
+        return np.array(
+            [set(tags) <= set(meal["tags"]) for meal in self._meals], dtype=bool
+        )
+
+    def _has_any_tag(self, tags: List[str]) -> np.ndarray:
+        return np.array(
+            [bool(set(tags) & set(meal["tags"])) for meal in self._meals], dtype=bool
+        )
+
+    def plan_week(
+        self, trimester: str, condition: str, diet: str, culture: str
+    ) -> Optional[Mapping[str, Any]]:
+        key = (trimester, condition, diet, culture)
+        with self._lock:
+            plan = self._plans.get(key)
+            if plan is not None:
+                self._hits += 1
+                return plan
+        if (
+            trimester not in self.targets
+            or condition not in self.conditions
+            or diet not in self.diets
+            or culture not in self.cultures
+        ):
+            return None
+
+        started = time.perf_counter()
+        plan = self._solve(*key)
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self._plans[key] = plan
+            self._misses += 1
+            self._solve_time_total += elapsed
+        return plan
+
+    def _solve(
+        self, trimester: str, condition: str, diet: str, culture: str
+    ) -> Mapping[str, Any]:
+        adjust = self.conditions[condition]
+        day_slots = self.slots + tuple(self.extra_slots.get(trimester, {}).items())
+        targets = dict(self.targets[trimester], **adjust.get("targets", {}))
+        limits = dict(self.limits, **adjust.get("limits", {}))
+        weights = {n: info["weight"] for n, info in self.nutrient_info.items()}
+        weights.update(adjust.get("weights", {}))
+
+        target_vec = self._vector(targets)
+        limit_vec = self._vector(limits)
+        has_target = target_vec > 0
+        has_limit = limit_vec > 0
+        weight_vec = self._vector(weights)
+        target_weights = np.where(has_target, weight_vec, 0.0)
+        overshoot_weights = np.array(
+            [
+                weights[n] if self.nutrient_info[n].get("two_sided") else 0.0
+                for n in self.nutrients
+            ]
+        )
+        limit_weights = np.where(has_limit, weight_vec * LIMIT_FACTOR, 0.0)
+        safe_targets = np.where(has_target, target_vec, 1.0)
+        safe_limits = np.where(has_limit, limit_vec, 1.0)
+
+        allowed = np.isin(self._meal_diets, self.diets[diet])
+        allowed &= self._has_tags(adjust.get("require_tags", []))
+        base_penalty = self.scoring["cuisine_penalty"] * (self._cuisines != culture)
+        base_penalty -= self.scoring["prefer_bonus"] * self._has_any_tag(
+            adjust.get("prefer_tags", [])
+        )
+
+        # How much of a day's targets each meal covers on its own, used to
+        # keep the most promising candidates per slot
+        share = np.minimum(self._matrix / safe_targets * len(day_slots), 1.0)
+        density = (share * np.where(has_target, weight_vec, 0.0)).sum(axis=1)
+        density /= max(target_weights.sum(), 1e-9)
+
+        keep = self.scoring["candidates_per_slot"]
+        repeat_penalty = self.scoring["repeat_penalty"]
+        uses = np.zeros(len(self._meals))
+        days = []
+        for day in DAYS:
+            penalty = base_penalty + repeat_penalty * uses
+            slots, candidates = [], []
+            for label, kind in day_slots:
+                index = np.flatnonzero(allowed & (self._kinds == kind))
+                if len(index) == 0:
+                    continue
+                order = np.argsort(penalty[index] - density[index], kind="stable")
+                slots.append(label)
+                candidates.append(index[order[:keep]])
+            if not slots:
+                continue
+
+            # Broadcast slot i along axis i: totals has one entry per
+            # combination of candidates, with nutrients on the last axis
+            ndim = len(candidates)
+            totals = np.zeros([len(c) for c in candidates] + [len(self.nutrients)])
+            score = np.zeros([len(c) for c in candidates])
+            for axis, index in enumerate(candidates):
+                shape = [1] * ndim
+                shape[axis] = len(index)
+                totals += self._matrix[index].reshape(shape + [-1])
+                score += penalty[index].reshape(shape)
+            for a, b in itertools.combinations(range(ndim), 2):
+                # The same meal twice in a day (e.g. both snacks)
+                same = candidates[a][:, None] == candidates[b][None, :]
+                shape = [1] * ndim
+                shape[a], shape[b] = same.shape
+                score += repeat_penalty * 2 * same.reshape(shape)
+
+            ratio = totals / safe_targets
+            score += (np.clip(1.0 - ratio, 0.0, None) ** 2 * target_weights).sum(-1)
+            score += (np.clip(ratio - 1.0, 0.0, None) ** 2 * overshoot_weights).sum(-1)
+            over_limit = np.clip(totals / safe_limits - 1.0, 0.0, None)
+            score += (over_limit**2 * limit_weights).sum(-1)
+
+            best = np.unravel_index(np.argmin(score), score.shape)
+            chosen = [int(candidates[axis][i]) for axis, i in enumerate(best)]
+            for meal in chosen:
+                uses[meal] += 1
+            days.append(
+                MappingProxyType(
+                    {
+                        "day": day,
+                        "meals": MappingProxyType(
+                            {
+                                label: self._meals[meal]["name"]
+                                for label, meal in zip(slots, chosen)
+                            }
+                        ),
+                        "totals": self._rounded(totals[best]),
+                    }
+                )
+            )
+
+        average = np.mean([[d["totals"][n] for n in self.nutrients] for d in days], 0)
+        return MappingProxyType(
+            {
+                "days": tuple(days),
+                "targets": MappingProxyType(targets),
+                "limits": MappingProxyType(limits),
+                "average": self._rounded(average),
+                "shortfalls": self._shortfalls(targets, average),
+            }
+        )
+
+    def _shortfalls(
+        self, targets: Dict[str, float], average: np.ndarray
+    ) -> Tuple[Mapping[str, Any], ...]:
+        # Targets are soft, so food alone can stay under them (iron above
+        # all); calories are two-sided and not reported here
+        shortfalls = []
+        for n, value in zip(self.nutrients, average):
+            target = targets.get(n, 0)
+            info = self.nutrient_info[n]
+            if target > 0 and value < target and not info.get("two_sided"):
+                shortfalls.append(
+                    MappingProxyType(
+                        {
+                            "nutrient": n,
+                            "label": info["label"],
+                            "unit": info["unit"],
+                            "target": target,
+                            "average": round(float(value), 1),
+                            "percent": int(value / target * 100),
+                        }
+                    )
+                )
+        return tuple(shortfalls)
+
+    def _rounded(self, values: np.ndarray) -> Mapping[str, float]:
+        return MappingProxyType(
+            {n: round(float(v), 1) for n, v in zip(self.nutrients, values)}
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "plans": len(self._plans),
+                "hits": self._hits,
+                "misses": self._misses,
+                "avg_solve_ms": (
+                    round(self._solve_time_total / self._misses * 1000, 2)
+                    if self._misses
+                    else 0.0
+                ),
+            }
+
+
+def benchmark(path: str = DEFAULT_FOODS_PATH, repeats: int = 1000) -> Dict[str, Any]:
+    """Solve every combination once, then time cached retrieval."""
+    planner = MealPlanner.from_file(path)
+    keys = list(
+        itertools.product(
+            planner.targets, planner.conditions, planner.diets, planner.cultures
+        )
+    )
+    started = time.perf_counter()
+    for key in keys:
+        planner.plan_week(*key)
+    solve_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for _ in range(repeats):
+        for key in keys:
+            planner.plan_week(*key)
+    cached_s = time.perf_counter() - started
+
+    return {
+        "meals": len(planner._meals),
+        "combinations": len(keys),
+        "avg_solve_ms": round(solve_s / len(keys) * 1000, 2),
+        "avg_cached_us": round(cached_s / (repeats * len(keys)) * 1e6, 3),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    show_parser = subparsers.add_parser("show", help="print one weekly plan")
+    show_parser.add_argument("values", nargs=4)
+    show_parser.add_argument("--foods", default=DEFAULT_FOODS_PATH)
+
+    bench_parser = subparsers.add_parser("bench", help="benchmark plan solving")
+    bench_parser.add_argument("--foods", default=DEFAULT_FOODS_PATH)
+    bench_parser.add_argument("--repeats", type=int, default=1000)
+
+    args = parser.parse_args()
+    if args.command == "show":
+        plan = MealPlanner.from_file(args.foods).plan_week(*args.values)
+        if plan is None:
+            print("null")
+        else:
+            for day in plan["days"]:
+                print(day["day"])
+                for slot, meal in day["meals"].items():
+                    print(f"  {slot}: {meal}")
+                print(f"  totals: {dict(day['totals'])}")
+            print(f"targets: {dict(plan['targets'])}")
+            print(f"average: {dict(plan['average'])}")
+            for short in plan["shortfalls"]:
+                print(f"short: {short['label']} {short['percent']}% of target")
+    else:
+        print(json.dumps(benchmark(args.foods, args.repeats), indent=2))
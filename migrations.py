@@ -0,0 +1,621 @@
+"""
+Versioned schema migrations for pregnancy.db.
+
+The schema version is kept in ``PRAGMA user_version``. ``migrate()`` applies
+every migration above the current version in order, each in its own
+transaction, and reports how long each one took. Databases created by the
+old ``database.py`` or ``init_db.py`` scripts (or the shipped pregnancy.db)
+are all brought to the same canonical schema: their tables are rebuilt into
+the ``BASE_TABLES`` layout before anything else runs.
+
+Usage:
+    python migrations.py [database] [--status]
+"""
+
+import argparse
+import sqlite3
+import time
+from typing import Callable, List, Tuple
+
+DEFAULT_DATABASE = "pregnancy.db"
+
+
+def table_columns(conn: sqlite3.Connection, table: str) -> List[str]:
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+
+
+def add_column(conn: sqlite3.Connection, table: str, column: str, decl: str) -> bool:
+    """Add ``column`` to ``table`` unless it already exists."""
+    if column in table_columns(conn, table):
+        return False
+    conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+    return True
+
+
+# Tables as used by app.py, in their current layout; the shipped
+# pregnancy.db and the old database.py / init_db.py scripts created
+# variations of them that ``_canonical_tables`` rebuilds into these
+BASE_TABLES = {
+    "users": """
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT,
+        phone TEXT,
+        password TEXT
+    """,
+    "symptoms": """
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        symptom TEXT,
+        date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        advice TEXT,
+        FOREIGN KEY(user_id) REFERENCES users(id)
+    """,
+    "health_records": """
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        file_name TEXT,
+        file_path TEXT,
+        upload_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        blob_hash TEXT REFERENCES blobs(hash),
+        FOREIGN KEY(user_id) REFERENCES users(id)
+    """,
+    "appointments": """
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        doctor_name TEXT,
+        hospital_name TEXT,
+        specialization TEXT,
+        date TEXT,
+        time TEXT,
+        status TEXT DEFAULT 'Pending',
+        reminder_sent INTEGER DEFAULT 0,
+        FOREIGN KEY(user_id) REFERENCES users(id)
+    """,
+    "exercises": """
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        image TEXT NOT NULL,
+        reps TEXT NOT NULL,
+        description TEXT,
+        trimester TEXT,
+        difficulty TEXT DEFAULT 'Medium'
+    """,
+    # user_id is NULL for calculations saved before they had an owner
+    "pregnancy_records": """
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        date_type TEXT NOT NULL,
+        input_date TEXT NOT NULL,
+        cycle_length INTEGER DEFAULT 28,
+        embryo_age INTEGER DEFAULT 0,
+        calculated_due_date TEXT NOT NULL,
+        user_id INTEGER REFERENCES users(id),
+        created_at TIMESTAMP,
+        conception_date TEXT
+    """,
+    "pregnancy_profile": """
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        due_date TEXT,
+        last_menstrual_period TEXT,
+        previous_pregnancies INTEGER,
+        live_births INTEGER,
+        miscarriages INTEGER,
+        current_week INTEGER,
+        doctor_name TEXT,
+        doctor_contact TEXT,
+        hospital_name TEXT,
+        hospital_contact TEXT,
+        blood_type TEXT,
+        allergies TEXT,
+        medications TEXT,
+        pre_existing_conditions TEXT,
+        weight REAL,
+        height REAL,
+        diet TEXT,
+        exercise TEXT,
+        smoking_status TEXT,
+        alcohol_consumption TEXT,
+        caffeine_intake TEXT,
+        stress_levels TEXT,
+        emotional_wellbeing TEXT,
+        partner_name TEXT,
+        partner_contact TEXT,
+        emergency_contact TEXT,
+        birth_preferences TEXT,
+        additional_notes TEXT,
+        FOREIGN KEY(user_id) REFERENCES users(id)
+    """,
+    "user_preferences": """
+        user_id INTEGER PRIMARY KEY,
+        dark_mode BOOLEAN DEFAULT FALSE,
+        theme_color TEXT DEFAULT 'blue',
+        show_nsfw BOOLEAN DEFAULT FALSE,
+        language TEXT DEFAULT 'en',
+        FOREIGN KEY(user_id) REFERENCES users(id)
+    """,
+}
+
+# Columns of older layouts that hold a canonical column under another name
+RENAMED_COLUMNS = {("symptoms", "date"): "created_at"}
+
+
+def _base_schema(conn: sqlite3.Connection) -> None:
+    for table, columns in BASE_TABLES.items():
+        conn.execute(f"CREATE TABLE IF NOT EXISTS {table} ({columns})")
+
+
+def _layout(conn: sqlite3.Connection, table: str, schema: str = "main") -> tuple:
+    """Columns (with types, NOT NULL, defaults), keys and UNIQUE indexes."""
+    columns = [
+        tuple(row[1:]) for row in conn.execute(f"PRAGMA {schema}.table_info({table})")
+    ]
+    keys = sorted(
+        tuple(row[2:5])
+        for row in conn.execute(f"PRAGMA {schema}.foreign_key_list({table})")
+    )
+    unique = sorted(
+        row[1]
+        for row in conn.execute(f"PRAGMA {schema}.index_list({table})")
+        if row[3] == "u"
+    )
+    return columns, keys, len(unique)
+
+
+def _canonical_tables(conn: sqlite3.Connection) -> None:
+    """
+    Rebuild tables that differ from ``BASE_TABLES`` (missing or extra
+    columns, NOT NULL, other defaults, UNIQUE constraints) into that layout.
+
+    The old table is renamed aside, the table is created anew and filled
+    from the columns both layouts share (``RENAMED_COLUMNS`` fills the
+    rest), and the old one is dropped, so every database ends up with the
+    same schema. Legacy ALTER TABLE semantics keep the other tables'
+    foreign keys pointing at the name rather than following the rename.
+    """
+    conn.execute("PRAGMA legacy_alter_table = ON")
+    try:
+        for table, columns in BASE_TABLES.items():
+            _rebuild_if_changed(conn, table, columns)
+    finally:
+        conn.execute("PRAGMA legacy_alter_table = OFF")
+
+
+def _rebuild_if_changed(conn: sqlite3.Connection, table: str, columns: str) -> None:
+    conn.execute(f"CREATE TEMP TABLE canonical_{table} ({columns})")
+    expected = _layout(conn, f"canonical_{table}", "temp")
+    conn.execute(f"DROP TABLE temp.canonical_{table}")
+    if _layout(conn, table) == expected:
+        return
+
+    old = table_columns(conn, table)
+    targets, sources = [], []
+    for column in [row[0] for row in expected[0]]:
+        source = column if column in old else RENAMED_COLUMNS.get((table, column))
+        if source in old:
+            targets.append(column)
+            sources.append(source)
+
+    conn.execute(f"ALTER TABLE {table} RENAME TO {table}_legacy")
+    conn.execute(f"CREATE TABLE {table} ({columns})")
+    conn.execute(
+        f"INSERT INTO {table} ({', '.join(targets)}) "
+        f"SELECT {', '.join(sources)} FROM {table}_legacy"
+    )
+    conn.execute(f"DROP TABLE {table}_legacy")
+
+
+def _indexes(conn: sqlite3.Connection) -> None:
+    """
+    Indexes of the app tables; each query they serve is listed in
+    query_plans.py, which fails on a table scan.
+    """
+    # Login and the per-user pages, read from the index alone
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_users_login ON users (phone, password)"
+    )
+    for table in ("symptoms", "pregnancy_profile"):
+        conn.execute(
+            f"CREATE INDEX IF NOT EXISTS idx_{table}_user_id ON {table} (user_id)"
+        )
+    conn.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_health_records_user_files
+        ON health_records (user_id, file_name, upload_date, file_path)
+        """
+    )
+    # Newest-first keyset pagination; the explicit ``id`` makes the index
+    # order match ``ORDER BY ..., id`` for the cursor, and the records
+    # listing joins previews on blob_hash
+    conn.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_health_records_user_previews
+        ON health_records (user_id, upload_date, id, file_name, blob_hash)
+        """
+    )
+    conn.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_appointments_user_page
+        ON appointments (user_id, date, time, id, hospital_name, specialization, status)
+        """
+    )
+    # The pregnancy page's newest calculations
+    conn.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_pregnancy_records_user_recent
+        ON pregnancy_records
+            (user_id, id, date_type, input_date, calculated_due_date, conception_date)
+        """
+    )
+    # Due-window lookups of the reminder scheduler (see reminders.py)
+    conn.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_appointments_reminder
+        ON appointments (date, time, reminder_sent)
+        """
+    )
+    # Records sharing a blob (search triggers, blob_store.py), and records
+    # stored before the blob store, which import moves in (stays near empty)
+    conn.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_health_records_blob
+        ON health_records (blob_hash)
+        """
+    )
+    conn.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_health_records_unhashed
+        ON health_records (file_path) WHERE blob_hash IS NULL
+        """
+    )
+
+
+def _resumable_uploads(conn: sqlite3.Connection) -> None:
+    """In-progress chunked uploads (see resumable_uploads.py)."""
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS uploads (
+            id TEXT PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            file_name TEXT NOT NULL,
+            length INTEGER NOT NULL,
+            received INTEGER NOT NULL DEFAULT 0,
+            sha256 TEXT,
+            record_id INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            completed_at TIMESTAMP,
+            FOREIGN KEY(user_id) REFERENCES users(id)
+        )
+        """
+    )
+    # Chunks stored beyond the contiguous prefix (parallel uploads); a chunk
+    # claims its range before writing it, with ``claimed_at`` set while the
+    # bytes are in flight and cleared once they are stored
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS upload_ranges (
+            upload_id TEXT NOT NULL,
+            start_offset INTEGER NOT NULL,
+            end_offset INTEGER NOT NULL,
+            claimed_at REAL,
+            FOREIGN KEY(upload_id) REFERENCES uploads(id)
+        )
+        """
+    )
+    conn.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_upload_ranges_upload
+        ON upload_ranges (upload_id, start_offset)
+        """
+    )
+    conn.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_uploads_pending
+        ON uploads (completed_at, created_at)
+        """
+    )
+
+
+def _blob_store(conn: sqlite3.Connection) -> None:
+    """Deduplicated record storage (see blob_store.py)."""
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS blobs (
+            hash TEXT PRIMARY KEY,
+            size INTEGER NOT NULL,
+            refcount INTEGER NOT NULL DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        ) WITHOUT ROWID
+        """
+    )
+    # gc's unreferenced blobs; stays near empty
+    conn.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_blobs_unreferenced
+        ON blobs (hash) WHERE refcount <= 0
+        """
+    )
+
+
+def _record_derivatives(conn: sqlite3.Connection) -> None:
+    """Preview jobs and their results per blob (see record_processing.py)."""
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS record_jobs (
+            blob_hash TEXT PRIMARY KEY,
+            file_name TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            claimed_at REAL,
+            last_error TEXT,
+            created_at REAL NOT NULL
+        )
+        """
+    )
+    conn.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_record_jobs_status
+        ON record_jobs (status, created_at)
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS blob_derivatives (
+            blob_hash TEXT PRIMARY KEY,
+            thumbnail_path TEXT,
+            text TEXT,
+            pages INTEGER,
+            created_at REAL NOT NULL
+        ) WITHOUT ROWID
+        """
+    )
+
+
+def _search_index(conn: sqlite3.Connection) -> None:
+    """
+    FTS5 indexes for /search, kept in sync by triggers. ``owner`` holds
+    ``u<user_id>`` so a query only walks the searching user's postings.
+    Record text arrives later from ``blob_derivatives``.
+    """
+    for table in ("record_search", "symptom_search"):
+        conn.execute(
+            f"""
+            CREATE VIRTUAL TABLE IF NOT EXISTS {table} USING fts5(
+                owner, title, body,
+                tokenize = 'porter unicode61 remove_diacritics 2',
+                prefix = '2 3'
+            )
+            """
+        )
+        # Rank by bm25, with title hits weighing more than body text
+        conn.execute(
+            f"INSERT INTO {table} ({table}, rank) VALUES ('rank', ?)",
+            ("bm25(0.0, 4.0, 1.0)",),
+        )
+
+    conn.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS health_records_search_insert
+        AFTER INSERT ON health_records BEGIN
+            INSERT INTO record_search (rowid, owner, title, body)
+            VALUES (
+                new.id, 'u' || new.user_id, new.file_name,
+                (SELECT text FROM blob_derivatives WHERE blob_hash = new.blob_hash)
+            );
+        END
+        """
+    )
+    conn.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS health_records_search_update
+        AFTER UPDATE OF user_id, file_name, blob_hash ON health_records BEGIN
+            UPDATE record_search
+            SET owner = 'u' || new.user_id, title = new.file_name,
+                body = (
+                    SELECT text FROM blob_derivatives WHERE blob_hash = new.blob_hash
+                )
+            WHERE rowid = new.id;
+        END
+        """
+    )
+    conn.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS health_records_search_delete
+        AFTER DELETE ON health_records BEGIN
+            DELETE FROM record_search WHERE rowid = old.id;
+        END
+        """
+    )
+    conn.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS blob_derivatives_search_insert
+        AFTER INSERT ON blob_derivatives BEGIN
+            UPDATE record_search SET body = new.text
+            WHERE rowid IN (
+                SELECT id FROM health_records WHERE blob_hash = new.blob_hash
+            );
+        END
+        """
+    )
+
+    conn.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS symptoms_search_insert
+        AFTER INSERT ON symptoms BEGIN
+            INSERT INTO symptom_search (rowid, owner, title, body)
+            VALUES (new.id, 'u' || new.user_id, new.symptom, new.advice);
+        END
+        """
+    )
+    conn.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS symptoms_search_update
+        AFTER UPDATE OF user_id, symptom, advice ON symptoms BEGIN
+            UPDATE symptom_search
+            SET owner = 'u' || new.user_id, title = new.symptom, body = new.advice
+            WHERE rowid = new.id;
+        END
+        """
+    )
+    conn.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS symptoms_search_delete
+        AFTER DELETE ON symptoms BEGIN
+            DELETE FROM symptom_search WHERE rowid = old.id;
+        END
+        """
+    )
+
+    # Index what is already stored
+    conn.execute("DELETE FROM record_search")
+    conn.execute(
+        """
+        INSERT INTO record_search (rowid, owner, title, body)
+        SELECT r.id, 'u' || r.user_id, r.file_name, d.text
+        FROM health_records r
+        LEFT JOIN blob_derivatives d ON d.blob_hash = r.blob_hash
+        """
+    )
+    conn.execute("DELETE FROM symptom_search")
+    conn.execute(
+        """
+        INSERT INTO symptom_search (rowid, owner, title, body)
+        SELECT id, 'u' || user_id, symptom, advice FROM symptoms
+        """
+    )
+    conn.execute("INSERT INTO record_search (record_search) VALUES ('optimize')")
+    conn.execute("INSERT INTO symptom_search (symptom_search) VALUES ('optimize')")
+
+
+def _mail_and_search_caches(conn: sqlite3.Connection) -> None:
+    """
+    The email outbox (mailer.py) and the geocode / Places caches
+    (hospital_cache.py), which those modules used to create themselves.
+    """
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS email_outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            to_email TEXT NOT NULL,
+            subject TEXT NOT NULL,
+            body TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt_at REAL NOT NULL,
+            claimed_at REAL,
+            last_error TEXT,
+            created_at REAL NOT NULL,
+            sent_at REAL
+        )
+        """
+    )
+    conn.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_email_outbox_due
+        ON email_outbox (status, next_attempt_at)
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS geocode_cache (
+            query TEXT PRIMARY KEY,
+            lat REAL NOT NULL,
+            lng REAL NOT NULL,
+            fetched_at REAL NOT NULL
+        )
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS places_cache (
+            lat_key REAL NOT NULL,
+            lng_key REAL NOT NULL,
+            specialization TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            fetched_at REAL NOT NULL,
+            PRIMARY KEY (lat_key, lng_key, specialization)
+        )
+        """
+    )
+
+
+# (version, name, function); append new migrations, never reorder or edit
+MIGRATIONS: List[Tuple[int, str, Callable[[sqlite3.Connection], None]]] = [
+    (1, "base_schema", _base_schema),
+    (2, "canonical_tables", _canonical_tables),
+    (3, "indexes", _indexes),
+    (4, "resumable_uploads", _resumable_uploads),
+    (5, "blob_store", _blob_store),
+    (6, "record_derivatives", _record_derivatives),
+    (7, "search_index", _search_index),
+    (8, "mail_and_search_caches", _mail_and_search_caches),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def current_version(conn: sqlite3.Connection) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(
+    database: str = DEFAULT_DATABASE, verbose: bool = True
+) -> List[Tuple[int, str, float]]:
+    """
+    Apply pending migrations to ``database``.
+
+    Returns (version, name, seconds) for each migration that ran.
+    """
+    conn = sqlite3.connect(database, isolation_level=None)
+    conn.execute("PRAGMA busy_timeout = 5000")
+    applied = []
+    try:
+        for version, name, apply in MIGRATIONS:
+            # Take the write lock before checking, so concurrent app
+            # processes starting up apply each migration exactly once
+            conn.execute("BEGIN IMMEDIATE")
+            if current_version(conn) >= version:
+                conn.execute("ROLLBACK")
+                continue
+            started = time.perf_counter()
+            try:
+                apply(conn)
+                conn.execute(f"PRAGMA user_version = {version}")
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            elapsed = time.perf_counter() - started
+            applied.append((version, name, elapsed))
+            if verbose:
+                print(
+                    f"Applied migration {version} ({name}) "
+                    f"in {elapsed * 1000:.1f} ms"
+                )
+        if applied:
+            conn.execute("PRAGMA optimize")
+    finally:
+        conn.close()
+    return applied
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("database", nargs="?", default=DEFAULT_DATABASE)
+    parser.add_argument(
+        "--status", action="store_true", help="show the version without migrating"
+    )
+    args = parser.parse_args()
+
+    if args.status:
+        conn = sqlite3.connect(args.database)
+        version = current_version(conn)
+        conn.close()
+        print(f"{args.database}: schema version {version} of {LATEST_VERSION}")
+    else:
+        started = time.perf_counter()
+        ran = migrate(args.database)
+        total = time.perf_counter() - started
+        print(
+            f"{args.database}: {len(ran)} migration(s) applied in {total:.2f}s, "
+            f"now at version {LATEST_VERSION}"
+        )
@@ -0,0 +1,55 @@
+import base64
+import json
+from typing import Any, List, Optional, Sequence, Tuple
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    """Opaque, URL-safe token for the sort key of the last row on a page."""
+    raw = json.dumps(list(values), separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token: Optional[str], size: int) -> Optional[Tuple[Any, ...]]:
+    """
+    Sort key encoded by ``encode_cursor``.
+
+    Returns None for a missing token (the first page) and raises ValueError
+    for anything that is not a cursor of ``size`` int or str values.
+    """
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        values = json.loads(raw.decode("utf-8"))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError("Invalid cursor")
+    for value in values:
+        # Sort keys are ids and dates; anything else (lists, objects, floats,
+        # booleans) would only fail later as a query parameter
+        if isinstance(value, bool) or not isinstance(value, (int, str)):
+            raise ValueError("Invalid cursor")
+    return tuple(values)
+
+
+def split_page(rows: List[Any], limit: int, key) -> Tuple[List[Any], Optional[str]]:
+    """
+    Trim rows fetched with ``LIMIT limit + 1`` to one page.
+
+    The extra row only signals that more rows exist; the next cursor is
+    built from ``key(last row of the page)``.
+    """
+    if len(rows) <= limit:
+        return rows, None
+    page = rows[:limit]
+    return page, encode_cursor(key(page[-1]))
+
+
+def page_limit(value: Optional[str], default: int, maximum: int) -> int:
+    """Parse a ``limit`` query parameter, clamped to 1..maximum."""
+    try:
+        limit = int(value) if value else default
+    except ValueError:
+        limit = default
+    return max(1, min(limit, maximum))
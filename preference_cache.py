@@ -0,0 +1,90 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+# Preferences used when a user has never saved any
+DEFAULT_PREFERENCES = {
+    "theme_color": "blue",
+    "dark_mode": False,
+    "show_nsfw": False,
+    "language": "en",
+}
+
+
+def preferences_from_row(row) -> Dict[str, Any]:
+    """Convert a ``user_preferences`` row (or None) into a plain dict."""
+    if row is None:
+        return dict(DEFAULT_PREFERENCES)
+
+    keys = row.keys()
+    return {
+        "theme_color": row["theme_color"] if "theme_color" in keys else "blue",
+        "dark_mode": bool(row["dark_mode"]) if "dark_mode" in keys else False,
+        "show_nsfw": bool(row["show_nsfw"]) if "show_nsfw" in keys else False,
+        "language": row["language"] if "language" in keys else "en",
+    }
+
+
+class PreferenceCache:
+    """
+    In-process LRU cache of user preferences with a time-to-live.
+
+    Entries are keyed by user_id. ``set()`` is used for write-through updates
+    from the save handler, ``invalidate()`` drops a single user.
+    """
+
+    def __init__(self, max_size: int = 10000, ttl: float = 300.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, user_id: int) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            expires_at, preferences = entry
+            if expires_at < time.monotonic():
+                del self._entries[user_id]
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return preferences
+
+    def set(self, user_id: int, preferences: Dict[str, Any]) -> None:
+        with self._lock:
+            self._entries[user_id] = (time.monotonic() + self.ttl, preferences)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, user_id: int) -> None:
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
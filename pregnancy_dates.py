@@ -0,0 +1,533 @@
+"""
+Pregnancy date calculations.
+
+Every way of dating a pregnancy (last menstrual period, an ultrasound scan,
+the conception date, a known due date or an IVF transfer) first gives the
+conception date and the due date; the current week, trimester and days
+remaining then follow from those and today's date. ``calculate()`` works on
+one set of inputs with ``datetime.date``. ``calculate_batch()`` works on
+whole columns (e.g. a clinic's patient CSV) with NumPy ``datetime64``
+arithmetic, so thousands of rows cost a handful of array operations.
+
+Usage:
+    python pregnancy_dates.py show LMP 2026-03-01 --cycle-length 30
+    python pregnancy_dates.py bench [--rows 100000]
+"""
+
+import argparse
+import csv
+import io
+import itertools
+import json
+import random
+import time
+from datetime import date, datetime, timedelta
+from typing import (
+    IO,
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+import numpy as np
+
+DATE_TYPES = ("LMP", "Ultrasound", "Conception Date", "Due Date", "IVF Transfer Date")
+DATE_FORMAT = "%Y-%m-%d"
+
+# Pregnancy is counted from the last menstrual period, about two weeks
+# before conception; the due date is 40 weeks after it
+LMP_TO_CONCEPTION = 14
+CONCEPTION_TO_DUE = 266
+LMP_TO_DUE = LMP_TO_CONCEPTION + CONCEPTION_TO_DUE
+
+TRIMESTERS = ("First Trimester", "Second Trimester", "Third Trimester")
+# Last week of the first and second trimesters
+TRIMESTER_ENDS = (13, 26)
+
+# Optional inputs and their defaults when a row leaves them out
+DEFAULTS = {"us_weeks": 0, "us_days": 0, "cycle_length": 28, "embryo_age": 3}
+# Accepted range of each optional input
+RANGES = {
+    "us_weeks": (0, 45),
+    "us_days": (0, 6),
+    "cycle_length": (20, 45),
+    "embryo_age": (0, 7),
+}
+INPUTS = ("date_type", "input_date") + tuple(DEFAULTS)
+OUTPUTS = (
+    "due_date",
+    "conception_date",
+    "current_week",
+    "trimester",
+    "days_remaining",
+    "error",
+)
+
+
+def parse_date(value: str) -> date:
+    return datetime.strptime(value, DATE_FORMAT).date()
+
+
+def _to_int(value: Any) -> int:
+    """An integer from a CSV string or JSON number; TypeError/ValueError else."""
+    if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+        raise TypeError(f"Not an integer: {value!r}")
+    if isinstance(value, float) and not value.is_integer():
+        raise ValueError(f"Not an integer: {value!r}")
+    try:
+        return int(value)
+    except OverflowError:
+        raise ValueError(f"Not an integer: {value!r}") from None
+
+
+def parse_param(name: str, value: Any) -> int:
+    """
+    One optional input (None or "" for its default) as a checked integer;
+    ValueError if it is not an integer or out of range.
+    """
+    if value is None or value == "":
+        return DEFAULTS[name]
+    try:
+        number = _to_int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid {name}: {value!r}") from None
+    check_param(name, number)
+    return number
+
+
+def check_param(name: str, value: int) -> None:
+    low, high = RANGES[name]
+    if not low <= value <= high:
+        raise ValueError(f"{name} must be between {low} and {high}")
+
+
+def conception_and_due(
+    date_type: str,
+    input_date: date,
+    us_weeks: int = 0,
+    us_days: int = 0,
+    cycle_length: int = 28,
+    embryo_age: int = 3,
+) -> Tuple[date, date]:
+    """
+    Conception and due dates; ValueError for an unknown ``date_type`` or an
+    input outside ``RANGES``.
+    """
+    for name, value in (
+        ("us_weeks", us_weeks),
+        ("us_days", us_days),
+        ("cycle_length", cycle_length),
+        ("embryo_age", embryo_age),
+    ):
+        check_param(name, value)
+    if date_type == "Ultrasound":
+        # The scan dates the pregnancy from the LMP, so conception was the
+        # measured length (less the two weeks before conception) earlier
+        conception = input_date - timedelta(
+            days=us_weeks * 7 + us_days - LMP_TO_CONCEPTION
+        )
+        return conception, conception + timedelta(days=CONCEPTION_TO_DUE)
+    if date_type == "LMP":
+        # Ovulation is about two weeks before the next period
+        conception = input_date + timedelta(days=cycle_length - 14)
+        return conception, input_date + timedelta(days=LMP_TO_DUE)
+    if date_type == "Conception Date":
+        return input_date, input_date + timedelta(days=CONCEPTION_TO_DUE)
+    if date_type == "Due Date":
+        return input_date - timedelta(days=CONCEPTION_TO_DUE), input_date
+    if date_type == "IVF Transfer Date":
+        conception = input_date - timedelta(days=embryo_age)
+        return conception, conception + timedelta(days=CONCEPTION_TO_DUE)
+    raise ValueError(f"Unsupported date type: {date_type}")
+
+
+def trimester(week: int) -> str:
+    if week <= TRIMESTER_ENDS[0]:
+        return TRIMESTERS[0]
+    if week <= TRIMESTER_ENDS[1]:
+        return TRIMESTERS[1]
+    return TRIMESTERS[2]
+
+
+def calculate(
+    date_type: str, input_date: date, today: Optional[date] = None, **params: int
+) -> Dict[str, Any]:
+    """Due date, conception date, current week, trimester and days remaining."""
+    conception, due = conception_and_due(date_type, input_date, **params)
+    return {
+        "due_date": due,
+        "conception_date": conception,
+        **progress(conception, due, today),
+    }
+
+
+def progress(
+    conception: date, due: date, today: Optional[date] = None
+) -> Dict[str, Any]:
+    """Current week, trimester and days remaining of a dated pregnancy."""
+    today = today or date.today()
+    week = ((today - conception).days + LMP_TO_CONCEPTION) // 7 + 1
+    return {
+        "current_week": week,
+        "trimester": trimester(week),
+        "days_remaining": (due - today).days,
+    }
+
+
+def _flag(errors: np.ndarray, mask: np.ndarray, message: Callable[[int], str]) -> None:
+    """Record ``message(i)`` for each row in ``mask`` without an error yet."""
+    for i in np.flatnonzero(mask):
+        if errors[i] is None:
+            errors[i] = message(i)
+
+
+def _int_column(values: List[Any], default: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    An integer input column, and a mask of the rows that are not integers.
+
+    Missing values (None or "") take ``default``, as do bad ones. A column
+    of only strings and ints is converted by NumPy at once; otherwise, or if
+    that fails, the rows are converted one by one to find the bad ones.
+    """
+    filled = [default if value is None or value == "" else value for value in values]
+    if all(type(value) in (str, int) for value in filled):
+        try:
+            return np.array(filled, dtype=np.int64), np.zeros(len(values), dtype=bool)
+        except (TypeError, ValueError, OverflowError):
+            pass
+
+    column, bad = [], []
+    for value in filled:
+        try:
+            number = _to_int(value)
+            np.int64(number)
+        except (TypeError, ValueError, OverflowError):
+            column.append(default)
+            bad.append(True)
+        else:
+            column.append(number)
+            bad.append(False)
+    return np.array(column, dtype=np.int64), np.array(bad, dtype=bool)
+
+
+_MIN_DATE = np.datetime64(date.min.isoformat(), "D")
+_MAX_DATE = np.datetime64(date.max.isoformat(), "D")
+
+
+def _date_column(values: List[Any]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    A ``datetime64[D]`` input column, and a mask of the rows that are not
+    ``YYYY-MM-DD`` dates. Missing and bad dates are NaT.
+
+    NumPy parses the column at once but also accepts partial dates such as
+    ``2026`` and years outside 1-9999 such as ``99999-01-01``; anything that
+    does not print back exactly as it was given, or falls outside the years
+    ``date`` supports, is parsed again with ``parse_date()``, so the same
+    inputs are accepted as by ``calculate()``.
+    """
+    text = np.array(["" if value is None else str(value) for value in values])
+    try:
+        column = text.astype("datetime64[D]")
+    except ValueError:
+        column = np.array(
+            [_numpy_date(value) for value in text.tolist()], dtype="datetime64[D]"
+        )
+
+    bad = np.zeros(len(text), dtype=bool)
+    recheck = (
+        (column.astype(str) != text) | (column < _MIN_DATE) | (column > _MAX_DATE)
+    ) & (text != "")
+    for i in np.flatnonzero(recheck):
+        try:
+            column[i] = np.datetime64(parse_date(text[i]), "D")
+        except ValueError:
+            column[i] = np.datetime64("NaT")
+            bad[i] = True
+    return column, bad
+
+
+def _numpy_date(value: str) -> np.datetime64:
+    try:
+        return np.datetime64(value, "D")
+    except ValueError:
+        return np.datetime64("NaT")
+
+
+def rows_to_columns(rows: Iterable[Mapping[str, Any]]) -> Dict[str, List[Any]]:
+    """Input columns for ``calculate_batch()`` from one dict per row."""
+    rows = list(rows)
+    return {name: [row.get(name) for row in rows] for name in INPUTS}
+
+
+def calculate_batch(
+    columns: Mapping[str, Sequence[Any]], today: Optional[date] = None
+) -> Dict[str, Any]:
+    """
+    ``calculate()`` for many rows at once.
+
+    ``columns`` maps ``date_type`` and ``input_date`` (``YYYY-MM-DD``) and
+    optionally ``us_weeks``, ``us_days``, ``cycle_length`` and
+    ``embryo_age`` to equally long sequences of values, as strings (from a
+    CSV) or numbers (from JSON); other columns are ignored. Returns columns:
+    ``due_date`` and ``conception_date`` as ``datetime64[D]`` arrays,
+    ``current_week`` and ``days_remaining`` as integer arrays, ``trimester``
+    as a string array and ``error`` as an object array with a message for
+    each row that could not be calculated (whose other values are
+    meaningless) and None elsewhere.
+    """
+    count = max((len(columns[name]) for name in INPUTS if name in columns), default=0)
+    values = {
+        name: [None] * count if columns.get(name) is None else list(columns[name])
+        for name in INPUTS
+    }
+    if any(len(column) != count for column in values.values()):
+        raise ValueError("Input columns differ in length")
+
+    today64 = np.datetime64(today or date.today(), "D")
+    errors = np.full(count, None, dtype=object)
+
+    inputs, bad = _date_column(values["input_date"])
+    _flag(errors, bad, lambda i: f"Invalid input date: {values['input_date'][i]!r}")
+    _flag(errors, np.isnat(inputs), lambda i: "Input date is required")
+
+    params = {}
+    for name, default in DEFAULTS.items():
+        column, bad = _int_column(values[name], default)
+        _flag(errors, bad, lambda i: f"Invalid {name}: {values[name][i]!r}")
+        low, high = RANGES[name]
+        out_of_range = (column < low) | (column > high)
+        _flag(
+            errors, out_of_range, lambda i: f"{name} must be between {low} and {high}"
+        )
+        # Keep the date arithmetic of rejected rows in range
+        params[name] = np.where(out_of_range, default, column)
+
+    date_types = np.array(
+        ["" if value is None else str(value) for value in values["date_type"]]
+    )
+    _flag(
+        errors,
+        ~np.isin(date_types, DATE_TYPES),
+        lambda i: f"Unsupported date type: {date_types[i]}",
+    )
+
+    def days(values: np.ndarray) -> np.ndarray:
+        return values.astype("timedelta64[D]")
+
+    us_offset = days(params["us_weeks"] * 7 + params["us_days"] - LMP_TO_CONCEPTION)
+    conception = np.select(
+        [
+            date_types == "Ultrasound",
+            date_types == "LMP",
+            date_types == "Due Date",
+            date_types == "IVF Transfer Date",
+        ],
+        [
+            inputs - us_offset,
+            inputs + days(params["cycle_length"] - 14),
+            inputs - np.timedelta64(CONCEPTION_TO_DUE, "D"),
+            inputs - days(params["embryo_age"]),
+        ],
+        default=inputs,
+    )
+    due = np.select(
+        [date_types == "LMP", date_types == "Due Date"],
+        [inputs + np.timedelta64(LMP_TO_DUE, "D"), inputs],
+        default=conception + np.timedelta64(CONCEPTION_TO_DUE, "D"),
+    )
+
+    # Inputs near the ends of the calendar overflow ``date`` in calculate()
+    _flag(
+        errors,
+        (conception < _MIN_DATE)
+        | (conception > _MAX_DATE)
+        | (due < _MIN_DATE)
+        | (due > _MAX_DATE),
+        lambda i: "date value out of range",
+    )
+
+    valid = np.equal(errors, None)
+    elapsed = np.where(valid, (today64 - conception).astype(np.int64), 0)
+    week = (elapsed + LMP_TO_CONCEPTION) // 7 + 1
+    remaining = np.where(valid, (due - today64).astype(np.int64), 0)
+    trimesters = np.array(TRIMESTERS)[
+        np.searchsorted(TRIMESTER_ENDS, week, side="left")
+    ]
+
+    return {
+        "count": count,
+        "due_date": due,
+        "conception_date": conception,
+        "current_week": week,
+        "trimester": trimesters,
+        "days_remaining": remaining,
+        "error": errors,
+    }
+
+
+def output_columns(result: Dict[str, Any]) -> Dict[str, List[Any]]:
+    """
+    The columns from ``calculate_batch()`` as lists of plain values (ISO
+    dates, ints and strings), with None for every value of a failed row.
+    """
+    valid = np.equal(result["error"], None)
+    columns = {}
+    for name in OUTPUTS[:-1]:
+        values = result[name].astype(str) if "date" in name else result[name]
+        columns[name] = np.where(valid, values.astype(object), None).tolist()
+    columns["error"] = result["error"].tolist()
+    return columns
+
+
+def output_records(result: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """The result of ``calculate_batch()`` as one dict per row."""
+    columns = output_columns(result)
+    return [dict(zip(OUTPUTS, values)) for values in zip(*columns.values())]
+
+
+def read_csv_columns(
+    f: IO[str], max_rows: Optional[int] = None
+) -> Dict[str, Tuple[str, ...]]:
+    """
+    Columns of a CSV file with a header row, by header name. Short rows are
+    padded with empty values. With ``max_rows``, reading stops after that
+    many rows.
+    """
+    reader = csv.reader(f)
+    header = [name.strip() for name in next(reader, [])]
+    rows = itertools.islice(reader, max_rows) if max_rows is not None else reader
+    return dict(zip(header, itertools.zip_longest(*rows, fillvalue="")))
+
+
+def write_csv_columns(f: IO[str], columns: Mapping[str, Sequence[Any]]) -> None:
+    writer = csv.writer(f)
+    writer.writerow(columns)
+    writer.writerows(zip(*columns.values()))
+
+
+def synthetic_csv(count: int, seed: int = 7) -> str:
+    """A patient CSV with every date type and a few bad rows."""
+    rng = random.Random(seed)
+    start = date.today() - timedelta(days=300)
+    f = io.StringIO()
+    writer = csv.writer(f)
+    writer.writerow(INPUTS)
+    for i in range(count):
+        input_date = (start + timedelta(days=rng.randrange(400))).isoformat()
+        writer.writerow(
+            [
+                rng.choice(DATE_TYPES),
+                "not a date" if i % 1000 == 999 else input_date,
+                rng.randrange(6, 30),
+                rng.randrange(7),
+                rng.randrange(24, 35),
+                rng.choice([3, 5]),
+            ]
+        )
+    return f.getvalue()
+
+
+def calculate_rows(
+    rows: Iterable[Mapping[str, Any]], today: Optional[date] = None
+) -> List[Dict[str, Any]]:
+    """The per-row path: ``calculate()`` for each row in turn."""
+    results = []
+    for row in rows:
+        try:
+            params = {name: parse_param(name, row.get(name)) for name in DEFAULTS}
+            results.append(
+                calculate(
+                    row.get("date_type"),
+                    parse_date(row.get("input_date")),
+                    today,
+                    **params,
+                )
+            )
+        except (TypeError, ValueError, OverflowError) as e:
+            results.append({"error": str(e)})
+    return results
+
+
+def benchmark(rows: int = 100000) -> Dict[str, Any]:
+    """
+    Compare ``calculate_batch()`` with ``calculate()`` per row on a CSV;
+    reading the CSV is timed separately for each.
+    """
+    text = synthetic_csv(rows)
+    today = date.today()
+
+    started = time.perf_counter()
+    dict_rows = list(csv.DictReader(io.StringIO(text)))
+    read_rows_s = time.perf_counter() - started
+    started = time.perf_counter()
+    per_row = calculate_rows(dict_rows, today)
+    per_row_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    columns = read_csv_columns(io.StringIO(text))
+    read_columns_s = time.perf_counter() - started
+    started = time.perf_counter()
+    result = calculate_batch(columns, today)
+    batch_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    records = output_records(result)
+    output_s = time.perf_counter() - started
+
+    mismatches = sum(
+        1
+        for single, record in zip(per_row, records)
+        if ("error" in single) != (record["error"] is not None)
+        or (
+            "error" not in single
+            and (
+                single["due_date"].isoformat() != record["due_date"]
+                or single["current_week"] != record["current_week"]
+                or single["days_remaining"] != record["days_remaining"]
+                or single["trimester"] != record["trimester"]
+            )
+        )
+    )
+    return {
+        "rows": rows,
+        "read_rows_seconds": round(read_rows_s, 3),
+        "per_row_seconds": round(per_row_s, 3),
+        "read_columns_seconds": round(read_columns_s, 3),
+        "batch_seconds": round(batch_s, 3),
+        "speedup": round(per_row_s / batch_s, 1) if batch_s else None,
+        "output_records_seconds": round(output_s, 3),
+        "mismatches": mismatches,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    show_parser = subparsers.add_parser("show", help="calculate one pregnancy")
+    show_parser.add_argument("date_type", choices=DATE_TYPES)
+    show_parser.add_argument("input_date")
+    for name, default in DEFAULTS.items():
+        show_parser.add_argument(
+            f"--{name.replace('_', '-')}", dest=name, type=int, default=default
+        )
+
+    bench_parser = subparsers.add_parser("bench", help="benchmark batch calculation")
+    bench_parser.add_argument("--rows", type=int, default=100000)
+
+    args = parser.parse_args()
+    if args.command == "show":
+        result = calculate(
+            args.date_type,
+            parse_date(args.input_date),
+            **{name: getattr(args, name) for name in DEFAULTS},
+        )
+        print(json.dumps(result, indent=2, default=str))
+    else:
+        print(json.dumps(benchmark(args.rows), indent=2))
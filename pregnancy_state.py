@@ -0,0 +1,74 @@
+import threading
+from collections import OrderedDict
+from datetime import date
+from typing import Any, Dict, Optional
+
+
+class PregnancyStateCache:
+    """
+    In-process LRU cache of each user's current pregnancy state (week,
+    trimester, baby size, days remaining) for one day.
+
+    Entries are keyed by user_id and remember the day they were computed
+    for and the id of the calculation they came from; ``get()`` misses once
+    that day is over or when the caller's newest id differs (a calculation
+    saved by another worker process), so the state is recomputed at most
+    once a day per calculation. ``set()`` is used for write-through updates
+    when a new calculation is saved. Users without a calculation are cached
+    as an empty dict under record id None.
+    """
+
+    def __init__(self, max_size: int = 10000):
+        self.max_size = max_size
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(
+        self, user_id: int, today: date, record_id: Optional[int]
+    ) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry[0] != today or entry[1] != record_id:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return entry[2]
+
+    def set(
+        self,
+        user_id: int,
+        today: date,
+        record_id: Optional[int],
+        state: Dict[str, Any],
+    ) -> None:
+        with self._lock:
+            self._entries[user_id] = (today, record_id, state)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, user_id: int) -> None:
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
@@ -0,0 +1,219 @@
+"""
+Query-plan regression check for the SQL used by the app.
+
+Every ``execute()``/``executemany()`` call with a literal SQL string in the
+checked modules is collected from the source, then ``EXPLAIN QUERY PLAN``
+is run for it against a freshly migrated database filled with synthetic
+rows. The script exits with status 1 if any statement scans a whole table
+(or a whole index) unless the scan is listed in ``ALLOWED_SCANS``.
+
+Usage:
+    python query_plans.py [--rows 100000] [--verbose]
+"""
+
+import argparse
+import ast
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from typing import List, Optional, Tuple
+
+from migrations import migrate
+from session_store import SqliteSessionStore
+
+MODULES = [
+    "app.py",
+    "reminders.py",
+    "mailer.py",
+    "hospital_cache.py",
+    "resumable_uploads.py",
+    "blob_store.py",
+    "record_processing.py",
+    "session_store.py",
+]
+
+# SQL fragment -> why a full scan is acceptable for statements containing it
+ALLOWED_SCANS = {
+    "FROM exercises": "small fixed reference table read in full",
+    "WHERE advice NOT IN": "startup cache warm-up reads the newest rows by rowid",
+    "FROM blobs WHERE refcount > 0": "blob gc compares every stored blob with the disk",
+    "FROM blobs WHERE refcount <= 0": "reads the partial index of unreferenced blobs",
+}
+
+
+def _sql_text(node: ast.AST) -> Optional[str]:
+    """Literal SQL of an execute() argument; f-string fields become ``?``."""
+    if isinstance(node, ast.Constant) and isinstance(node.value, str):
+        return node.value
+    if isinstance(node, ast.JoinedStr):
+        parts = []
+        for value in node.values:
+            if isinstance(value, ast.Constant):
+                parts.append(value.value)
+            else:
+                parts.append("?")
+        return "".join(parts)
+    return None
+
+
+def collect_statements(paths: List[str]) -> List[Tuple[str, int, str]]:
+    """Return (file, line, sql) for each execute() call with literal SQL."""
+    statements = []
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            tree = ast.parse(f.read(), filename=path)
+        for node in ast.walk(tree):
+            if (
+                isinstance(node, ast.Call)
+                and isinstance(node.func, ast.Attribute)
+                and node.func.attr in ("execute", "executemany")
+                and node.args
+            ):
+                sql = _sql_text(node.args[0])
+                if sql and not sql.lstrip().upper().startswith(("PRAGMA", "CREATE")):
+                    statements.append((path, node.lineno, " ".join(sql.split())))
+    return sorted(set(statements), key=lambda s: (s[0], s[1]))
+
+
+def build_database(path: str, rows: int, seed: int = 1) -> None:
+    """Create a migrated database with ``rows`` rows in each per-user table."""
+    migrate(path, verbose=False)
+    # Sessions normally live in their own file; the store creates its table
+    SqliteSessionStore(path).pool.close_all()
+    rng = random.Random(seed)
+    users = max(rows // 20, 1)
+    conn = sqlite3.connect(path)
+    conn.executemany(
+        "INSERT INTO users (name, phone, password) VALUES (?, ?, ?)",
+        ((f"user{i}", f"555{i:07d}", f"pw{i}") for i in range(users)),
+    )
+    conn.executemany(
+        """
+        INSERT INTO health_records (user_id, file_name, file_path, upload_date)
+        VALUES (?, ?, ?, ?)
+        """,
+        (
+            (rng.randint(1, users), f"file{i}.pdf", f"uploads/file{i}.pdf", i)
+            for i in range(rows)
+        ),
+    )
+    conn.executemany(
+        """
+        INSERT INTO appointments (user_id, hospital_name, specialization, date, time)
+        VALUES (?, ?, ?, ?, ?)
+        """,
+        (
+            (
+                rng.randint(1, users),
+                f"Hospital {i % 500}",
+                "Gynecologist",
+                f"2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+                f"{rng.randint(8, 17):02d}:{rng.choice(['00', '30'])}",
+            )
+            for i in range(rows)
+        ),
+    )
+    conn.executemany(
+        "INSERT INTO symptoms (user_id, symptom, advice) VALUES (?, ?, ?)",
+        ((rng.randint(1, users), f"symptom {i}", "advice") for i in range(rows)),
+    )
+    conn.executemany(
+        "INSERT INTO pregnancy_profile (user_id, due_date) VALUES (?, ?)",
+        ((i, "2025-12-01") for i in range(1, users + 1)),
+    )
+    conn.executemany(
+        """
+        INSERT INTO pregnancy_records
+            (user_id, date_type, input_date, calculated_due_date, conception_date)
+        VALUES (?, 'LMP', '2025-03-01', '2025-12-06', '2025-03-15')
+        """,
+        ((rng.randint(1, users),) for _ in range(rows)),
+    )
+    conn.executemany(
+        "INSERT INTO user_preferences (user_id, theme_color) VALUES (?, ?)",
+        ((i, "blue") for i in range(1, users + 1)),
+    )
+    conn.commit()
+    conn.execute("ANALYZE")
+    conn.close()
+
+
+def explain(conn: sqlite3.Connection, sql: str) -> List[str]:
+    params = [None] * sql.count("?")
+    return [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+
+
+def is_full_scan(detail: str) -> bool:
+    # "SCAN t" and "SCAN t USING [COVERING] INDEX i" both read every row;
+    # scans of subquery results and constant lists are not table reads, and
+    # a virtual table "scan" is a lookup when its index string is non-empty
+    # (e.g. "INDEX 0:M3" for an FTS5 MATCH)
+    if detail.startswith("SCAN ") and "VIRTUAL TABLE INDEX" in detail:
+        return detail.endswith(":")
+    return (
+        detail.startswith("SCAN ")
+        and not detail.startswith("SCAN (subquery")
+        and "CONSTANT ROW" not in detail
+    )
+
+
+def allowed_reason(sql: str) -> Optional[str]:
+    """Why a full scan in ``sql`` is acceptable, or None if it is not."""
+    return next(
+        (reason for fragment, reason in ALLOWED_SCANS.items() if fragment in sql),
+        None,
+    )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--verbose", action="store_true", help="print every plan")
+    args = parser.parse_args()
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    statements = collect_statements([os.path.join(here, m) for m in MODULES])
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database = os.path.join(tmp, "plans.db")
+        started = time.perf_counter()
+        build_database(database, args.rows)
+        print(
+            f"Built synthetic database with {args.rows} rows per table "
+            f"in {time.perf_counter() - started:.1f}s"
+        )
+
+        conn = sqlite3.connect(database)
+        failures = 0
+        for path, line, sql in statements:
+            location = f"{os.path.basename(path)}:{line}"
+            plan = explain(conn, sql)
+            scans = [detail for detail in plan if is_full_scan(detail)]
+            allowed = allowed_reason(sql)
+            if scans and allowed is None:
+                failures += 1
+                status = "FAIL"
+            elif scans:
+                status = "allowed"
+            else:
+                status = "ok"
+
+            if args.verbose or status == "FAIL":
+                print(f"[{status}] {location}: {sql}")
+                for detail in plan:
+                    print(f"    {detail}")
+                if status == "allowed":
+                    print(f"    ({allowed})")
+            else:
+                print(f"[{status}] {location}")
+        conn.close()
+
+    print(f"{len(statements)} statements checked, {failures} with table scans")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,278 @@
+"""
+Background previews for uploaded health records.
+
+Each distinct blob gets one job in ``record_jobs``. A dispatcher thread
+claims pending jobs and runs them in a process pool (so image decoding and
+OCR never hold the web workers' GIL), writing a small JPEG thumbnail and
+the extracted text to ``blob_derivatives``. The worker code lives in
+``record_worker``. Pillow, pypdf and pytesseract are optional: without them
+the matching derivative is simply skipped.
+
+Usage:
+    python record_processing.py backfill [--database pregnancy.db]
+"""
+
+import argparse
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context
+from typing import Any, Dict, List, Optional
+
+from db_pool import ConnectionPool
+from record_worker import process_file
+
+
+class RecordProcessor:
+    """
+    Turns ``record_jobs`` into ``blob_derivatives`` in a process pool.
+
+    ``enqueue()`` is called after the upload's ``health_records`` row has
+    committed and wakes the dispatcher started by ``start()``; jobs are keyed by blob hash, so a file uploaded again is not
+    processed twice. Failed jobs are retried up to ``max_attempts`` times,
+    and jobs left running by a crashed process are requeued after
+    ``claim_timeout``.
+    """
+
+    def __init__(
+        self,
+        database: str,
+        blob_store,
+        thumbnail_dir: str,
+        workers: int = 2,
+        batch_size: int = 8,
+        max_attempts: int = 3,
+        poll_interval: float = 30.0,
+        claim_timeout: float = 600.0,
+    ):
+        self.pool = ConnectionPool(database, max_size=2)
+        self.blob_store = blob_store
+        self.thumbnail_dir = thumbnail_dir
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self.claim_timeout = claim_timeout
+
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._lock = threading.Lock()
+
+        # Metrics
+        self._enqueued = 0
+        self._processed = 0
+        self._failed = 0
+        self._pool_restarts = 0
+        self._process_time_total = 0.0
+
+    def thumbnail_path(self, blob_hash: str) -> str:
+        return os.path.join(self.thumbnail_dir, blob_hash[:2], f"{blob_hash}.jpg")
+
+    def enqueue(self, blob_hash: str, file_name: str) -> None:
+        conn = self.pool.acquire()
+        try:
+            cur = conn.execute(
+                """
+                INSERT OR IGNORE INTO record_jobs (blob_hash, file_name, created_at)
+                VALUES (?, ?, ?)
+                """,
+                (blob_hash, file_name, time.time()),
+            )
+            conn.commit()
+            added = cur.rowcount
+        finally:
+            self.pool.release(conn)
+
+        if added:
+            with self._lock:
+                self._enqueued += 1
+            self._wake.set()
+
+    def _claim(self) -> List[Dict[str, Any]]:
+        now = time.time()
+        conn = self.pool.acquire()
+        try:
+            conn.execute(
+                """
+                UPDATE record_jobs SET status = 'pending'
+                WHERE status = 'running' AND claimed_at < ?
+                """,
+                (now - self.claim_timeout,),
+            )
+            rows = conn.execute(
+                """
+                UPDATE record_jobs
+                SET status = 'running', claimed_at = ?, attempts = attempts + 1
+                WHERE blob_hash IN (
+                    SELECT blob_hash FROM record_jobs
+                    WHERE status = 'pending'
+                    ORDER BY created_at
+                    LIMIT ?
+                )
+                RETURNING blob_hash, file_name, attempts
+                """,
+                (now, self.batch_size),
+            ).fetchall()
+            conn.commit()
+        finally:
+            self.pool.release(conn)
+        return [dict(row) for row in rows]
+
+    def _finish(self, job: Dict[str, Any], result: Optional[Dict], error: str = None):
+        conn = self.pool.acquire()
+        try:
+            if result is not None:
+                conn.execute(
+                    """
+                    INSERT OR REPLACE INTO blob_derivatives
+                    (blob_hash, thumbnail_path, text, pages, created_at)
+                    VALUES (?, ?, ?, ?, ?)
+                    """,
+                    (
+                        job["blob_hash"],
+                        result["thumbnail_path"],
+                        result["text"],
+                        result["pages"],
+                        time.time(),
+                    ),
+                )
+                status = "done"
+            else:
+                status = "failed" if job["attempts"] >= self.max_attempts else "pending"
+            conn.execute(
+                "UPDATE record_jobs SET status = ?, last_error = ? WHERE blob_hash = ?",
+                (status, error, job["blob_hash"]),
+            )
+            conn.commit()
+        finally:
+            self.pool.release(conn)
+
+    def process_pending(self) -> int:
+        """Run one batch of pending jobs through the process pool."""
+        jobs = self._claim()
+        if not jobs:
+            return 0
+
+        started = time.perf_counter()
+        futures = {self._submit(job): job for job in jobs}
+        broken = False
+        for future in as_completed(futures):
+            job = futures[future]
+            try:
+                self._finish(job, future.result())
+                with self._lock:
+                    self._processed += 1
+            except Exception as e:
+                # A worker that died (e.g. killed for memory) breaks the whole
+                # pool; its jobs count as a failed attempt like any other error
+                broken = broken or isinstance(e, BrokenProcessPool)
+                print(f"Processing {job['file_name']} failed: {str(e)}")
+                self._finish(job, None, str(e)[:500])
+                with self._lock:
+                    self._failed += 1
+        if broken:
+            self._restart_pool()
+        with self._lock:
+            self._process_time_total += time.perf_counter() - started
+        return len(jobs)
+
+    def _submit(self, job: Dict[str, Any]) -> Future:
+        args = (
+            self.blob_store.path(job["blob_hash"]),
+            job["file_name"],
+            self.thumbnail_path(job["blob_hash"]),
+        )
+        try:
+            return self._executor.submit(process_file, *args)
+        except BrokenProcessPool:
+            # The pool broke while idle; replace it once
+            self._restart_pool()
+            return self._executor.submit(process_file, *args)
+
+    def _new_executor(self) -> ProcessPoolExecutor:
+        # Workers come from a forkserver rather than fork(): forking the web
+        # process after its threads have started can copy held locks into
+        # the child. The server preloads only the lightweight worker module.
+        context = get_context("forkserver")
+        context.set_forkserver_preload(["record_worker"])
+        return ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+
+    def _restart_pool(self) -> None:
+        print("Record processing pool broke; starting a new one")
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._executor = self._new_executor()
+        with self._lock:
+            self._pool_restarts += 1
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                if self.process_pending() >= self.batch_size:
+                    continue
+            except Exception as e:
+                print(f"Record processor error: {str(e)}")
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def start(self) -> None:
+        with self._start_lock:
+            if self._thread is None:
+                self._executor = self._new_executor()
+                self._thread = threading.Thread(
+                    target=self._run, name="record-processor", daemon=True
+                )
+                self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "enqueued": self._enqueued,
+                "processed": self._processed,
+                "failed": self._failed,
+                "pool_restarts": self._pool_restarts,
+                "seconds_per_job": (
+                    round(self._process_time_total / self._processed, 3)
+                    if self._processed
+                    else 0.0
+                ),
+                "running": self._thread is not None and self._thread.is_alive(),
+            }
+
+
+def backfill(database: str) -> int:
+    """Queue a preview job for every stored blob that has none."""
+    conn = sqlite3.connect(database)
+    try:
+        cur = conn.execute(
+            """
+            INSERT OR IGNORE INTO record_jobs (blob_hash, file_name, created_at)
+            SELECT blob_hash, MIN(file_name), ? FROM health_records
+            WHERE blob_hash IS NOT NULL
+            GROUP BY blob_hash
+            """,
+            (time.time(),),
+        )
+        conn.commit()
+        return cur.rowcount
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("command", choices=["backfill"])
+    parser.add_argument("--database", default="pregnancy.db")
+    args = parser.parse_args()
+
+    print(f"Queued {backfill(args.database)} record(s); the app processes them")
@@ -0,0 +1,89 @@
+"""
+Worker side of the record processor.
+
+Pool workers run in their own processes (started through a forkserver), so
+this module only imports what ``process_file()`` needs; Pillow, pypdf and
+pytesseract are imported lazily and are optional.
+"""
+
+import os
+from typing import Any, Dict, List
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".gif", ".bmp", ".webp", ".tif", ".tiff")
+TEXT_EXTENSIONS = (".txt", ".csv", ".md")
+THUMBNAIL_SIZE = (320, 320)
+MAX_TEXT_CHARS = 100000
+MAX_PDF_PAGES = 50
+
+
+def _thumbnail(image, thumbnail_path: str) -> None:
+    image.thumbnail(THUMBNAIL_SIZE)
+    if image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+    os.makedirs(os.path.dirname(thumbnail_path), exist_ok=True)
+    tmp_path = thumbnail_path + ".tmp"
+    image.save(tmp_path, "JPEG", quality=75, optimize=True)
+    os.replace(tmp_path, thumbnail_path)
+
+
+def process_file(path: str, file_name: str, thumbnail_path: str) -> Dict[str, Any]:
+    """
+    Build the derivatives of one file (runs in a worker process).
+
+    Returns ``thumbnail_path`` (None if no thumbnail was made), ``text``
+    and ``pages``.
+    """
+    extension = os.path.splitext(file_name.lower())[1]
+    result: Dict[str, Any] = {"thumbnail_path": None, "text": None, "pages": None}
+
+    if extension in IMAGE_EXTENSIONS:
+        try:
+            from PIL import Image
+        except ImportError:
+            return result
+        with Image.open(path) as image:
+            image.load()
+            try:
+                import pytesseract
+
+                result["text"] = pytesseract.image_to_string(image)[:MAX_TEXT_CHARS]
+            except ImportError:
+                pass
+            except Exception as e:
+                print(f"OCR failed for {file_name}: {str(e)}")
+            _thumbnail(image, thumbnail_path)
+        result["thumbnail_path"] = thumbnail_path
+
+    elif extension == ".pdf":
+        try:
+            from pypdf import PdfReader
+        except ImportError:
+            return result
+        reader = PdfReader(path)
+        result["pages"] = len(reader.pages)
+        parts: List[str] = []
+        length = 0
+        for page in reader.pages[:MAX_PDF_PAGES]:
+            text = page.extract_text() or ""
+            parts.append(text)
+            length += len(text)
+            if length >= MAX_TEXT_CHARS:
+                break
+        result["text"] = "\n".join(parts)[:MAX_TEXT_CHARS]
+
+        # Scanned reports are usually one embedded image per page
+        first_images = reader.pages[0].images if reader.pages else []
+        if first_images:
+            try:
+                _thumbnail(first_images[0].image, thumbnail_path)
+                result["thumbnail_path"] = thumbnail_path
+            except Exception as e:
+                print(f"No PDF thumbnail for {file_name}: {str(e)}")
+
+    elif extension in TEXT_EXTENSIONS:
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            result["text"] = f.read(MAX_TEXT_CHARS)
+
+    if result["text"] is not None:
+        result["text"] = result["text"].strip() or None
+    return result
@@ -0,0 +1,232 @@
+import heapq
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+from db_pool import ConnectionPool
+
+# Reminders go out between REMINDER_LEAD_MAX and REMINDER_LEAD_MIN before the
+# appointment (the same 15-120 minute window the original helper used)
+REMINDER_LEAD_MIN = timedelta(minutes=15)
+REMINDER_LEAD_MAX = timedelta(minutes=120)
+
+
+def log_delivery(reminders: List[Dict[str, Any]]) -> None:
+    """Default delivery: users have no email on file, so just log reminders."""
+    for reminder in reminders:
+        name = reminder["user_name"] or f"user {reminder['user_id']}"
+        print(
+            f"Reminder for {name}: appointment at {reminder['hospital_name']} "
+            f"on {reminder['date']} at {reminder['time']}"
+        )
+
+
+def _appointment_time(date: str, time_: str) -> Optional[datetime]:
+    try:
+        return datetime.fromisoformat(f"{date} {time_}")
+    except (TypeError, ValueError):
+        return None
+
+
+class ReminderScheduler:
+    """
+    Sends appointment reminders from the ``appointments`` table.
+
+    A background thread periodically loads the appointments whose reminder
+    window opens before the next refill, using the (date, time, reminder_sent)
+    index from migrations.py so only that date range is read, and keeps them
+    in a heap ordered by send time. When reminders come due they are
+    claimed in batches with ``UPDATE ... WHERE reminder_sent = 0 RETURNING id``
+    before being delivered, so several app processes can run a scheduler
+    against the same database without sending anything twice.
+    """
+
+    def __init__(
+        self,
+        database: str,
+        deliver: Callable[[List[Dict[str, Any]]], None] = log_delivery,
+        refill_interval: float = 300.0,
+        batch_size: int = 500,
+        lead_min: timedelta = REMINDER_LEAD_MIN,
+        lead_max: timedelta = REMINDER_LEAD_MAX,
+    ):
+        self.pool = ConnectionPool(database, max_size=2)
+        self.deliver = deliver
+        self.refill_interval = refill_interval
+        self.batch_size = batch_size
+        self.lead_min = lead_min
+        self.lead_max = lead_max
+
+        # (send_at timestamp, appointment id, reminder details)
+        self._heap: List[tuple] = []
+        self._scheduled: set = set()
+        self._next_refill = 0.0
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+        # Metrics
+        self._sent = 0
+        self._claimed_elsewhere = 0
+        self._failed = 0
+        self._refills = 0
+
+    def refill(self, now: Optional[datetime] = None) -> int:
+        """Schedule unsent reminders whose window opens before the next refill."""
+        now = now or datetime.now()
+        horizon = now + self.lead_max + timedelta(seconds=self.refill_interval)
+        conn = self.pool.acquire()
+        try:
+            rows = conn.execute(
+                """
+                SELECT a.id, a.user_id, u.name AS user_name, a.hospital_name,
+                       a.specialization, a.date, a.time
+                FROM appointments a
+                LEFT JOIN users u ON u.id = a.user_id
+                WHERE a.date BETWEEN ? AND ? AND a.reminder_sent = 0
+                """,
+                (now.date().isoformat(), horizon.date().isoformat()),
+            ).fetchall()
+        finally:
+            self.pool.release(conn)
+
+        added = 0
+        with self._lock:
+            for row in rows:
+                if row["id"] in self._scheduled:
+                    continue
+                starts_at = _appointment_time(row["date"], row["time"])
+                if starts_at is None or starts_at - now < self.lead_min:
+                    continue
+                if starts_at > horizon:
+                    continue
+                send_at = max(now, starts_at - self.lead_max).timestamp()
+                heapq.heappush(self._heap, (send_at, row["id"], dict(row)))
+                self._scheduled.add(row["id"])
+                added += 1
+            self._refills += 1
+        return added
+
+    def _claim(self, ids: List[int]) -> set:
+        conn = self.pool.acquire()
+        try:
+            placeholders = ",".join("?" * len(ids))
+            claimed = conn.execute(
+                f"""
+                UPDATE appointments SET reminder_sent = 1
+                WHERE id IN ({placeholders}) AND reminder_sent = 0
+                RETURNING id
+                """,
+                ids,
+            ).fetchall()
+            conn.commit()
+        finally:
+            self.pool.release(conn)
+        return {row["id"] for row in claimed}
+
+    def _unclaim(self, ids: List[int]) -> None:
+        conn = self.pool.acquire()
+        try:
+            placeholders = ",".join("?" * len(ids))
+            conn.execute(
+                f"UPDATE appointments SET reminder_sent = 0 WHERE id IN ({placeholders})",
+                ids,
+            )
+            conn.commit()
+        finally:
+            self.pool.release(conn)
+
+    def send_due(self, now: Optional[datetime] = None) -> int:
+        """Claim and deliver every reminder that is due, in batches."""
+        now = now or datetime.now()
+        sent = 0
+        while True:
+            with self._lock:
+                batch = []
+                while (
+                    self._heap
+                    and self._heap[0][0] <= now.timestamp()
+                    and len(batch) < self.batch_size
+                ):
+                    _, appointment_id, reminder = heapq.heappop(self._heap)
+                    self._scheduled.discard(appointment_id)
+                    starts_at = _appointment_time(reminder["date"], reminder["time"])
+                    # Skip reminders whose window already closed while waiting
+                    if starts_at is not None and starts_at - now >= self.lead_min:
+                        batch.append(reminder)
+            if not batch:
+                return sent
+
+            claimed = self._claim([reminder["id"] for reminder in batch])
+            with self._lock:
+                self._claimed_elsewhere += len(batch) - len(claimed)
+            batch = [reminder for reminder in batch if reminder["id"] in claimed]
+            if not batch:
+                continue
+            try:
+                self.deliver(batch)
+            except Exception as e:
+                # Release the claim so the next refill picks them up again
+                print(f"Failed to deliver appointment reminders: {str(e)}")
+                self._unclaim([reminder["id"] for reminder in batch])
+                with self._lock:
+                    self._failed += len(batch)
+                continue
+            sent += len(batch)
+            with self._lock:
+                self._sent += len(batch)
+
+    def run_once(self, now: Optional[datetime] = None) -> int:
+        """Refill and send everything due right now (no background thread)."""
+        self.refill(now)
+        return self.send_due(now)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                if time.time() >= self._next_refill:
+                    self._next_refill = time.time() + self.refill_interval
+                    self.refill()
+                self.send_due()
+            except Exception as e:
+                print(f"Reminder scheduler error: {str(e)}")
+
+            with self._lock:
+                next_send = self._heap[0][0] if self._heap else float("inf")
+            delay = max(0.0, min(next_send, self._next_refill) - time.time())
+            self._wake.wait(delay)
+            self._wake.clear()
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._run, name="reminder-scheduler", daemon=True
+            )
+            self._thread.start()
+
+    def wake(self) -> None:
+        """Refill on the next tick, e.g. after an appointment was booked."""
+        self._next_refill = 0.0
+        self._wake.set()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "scheduled": len(self._heap),
+                "sent": self._sent,
+                "claimed_elsewhere": self._claimed_elsewhere,
+                "failed": self._failed,
+                "refills": self._refills,
+                "running": self._thread is not None and self._thread.is_alive(),
+            }
+
+
+def send_due_reminders(database: str, deliver=log_delivery) -> int:
+    """Run a single reminder pass, e.g. from cron."""
+    return ReminderScheduler(database, deliver=deliver).run_once()
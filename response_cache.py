@@ -0,0 +1,226 @@
+import math
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+_NON_WORD = re.compile(r"[^a-z0-9\s]+")
+_SPACES = re.compile(r"\s+")
+_DIGITS = re.compile(r"\d+")
+
+# Words that flip or qualify a question's meaning while changing only a few
+# n-grams ("t" is what normalization leaves of "n't"); similar questions
+# must use exactly the same ones
+POLARITY_WORDS = frozenset(
+    {
+        "not",
+        "no",
+        "t",
+        "never",
+        "without",
+        "cannot",
+        "cant",
+        "dont",
+        "doesnt",
+        "isnt",
+        "shouldnt",
+        "avoid",
+        "stop",
+        "unsafe",
+        "safe",
+        "dangerous",
+        "harmful",
+        "before",
+        "after",
+    }
+)
+
+
+def normalize_question(text: str) -> str:
+    """Lower-case a question and strip punctuation and repeated whitespace."""
+    text = _NON_WORD.sub(" ", text.lower())
+    return _SPACES.sub(" ", text).strip()
+
+
+def polarity(normalized: str) -> frozenset:
+    """The ``POLARITY_WORDS`` used in a normalized question."""
+    return POLARITY_WORDS.intersection(normalized.split())
+
+
+def numbers(normalized: str) -> Tuple[str, ...]:
+    """The digit runs (doses, weeks, ages) in a normalized question, in order."""
+    return tuple(_DIGITS.findall(normalized))
+
+
+def _ngrams(normalized: str, n: int) -> Counter:
+    padded = f" {normalized} "
+    if len(padded) <= n:
+        return Counter([padded])
+    return Counter(padded[i : i + n] for i in range(len(padded) - n + 1))
+
+
+class ResponseCache:
+    """
+    Cache of AI answers for non-contextual symptom questions.
+
+    Lookups first try an exact match on the normalized question. If that
+    misses and ``similarity_threshold`` is set, a character n-gram TF-IDF
+    index is searched and the closest cached question is served when its
+    cosine similarity reaches the threshold and it uses the same negation
+    and polarity words and the same numbers (so "is it not safe..." never
+    gets the answer to "is it safe...", nor "5000mg" the one for "500mg"
+    or "38 weeks" the one for "8 weeks"). Entries expire after ``ttl`` seconds and the least
+    recently used entry is evicted past ``max_size``.
+    """
+
+    def __init__(
+        self,
+        max_size: int = 2000,
+        ttl: float = 86400.0,
+        similarity_threshold: Optional[float] = 0.85,
+        ngram_size: int = 3,
+        max_candidates: int = 200,
+    ):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self.ngram_size = ngram_size
+        self.max_candidates = max_candidates
+
+        # normalized question -> (expires_at, answer, n-gram weights, norm);
+        # weights use the IDF at insertion time, which is close enough for ranking
+        self._entries: (
+            "OrderedDict[str, Tuple[float, str, Dict[str, float], float]]"
+        ) = OrderedDict()
+        # n-gram -> normalized questions containing it (its document frequency)
+        self._postings: Dict[str, set] = {}
+        self._lock = threading.Lock()
+
+        # Metrics
+        self.exact_hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+
+    def _idf(self, gram: str) -> float:
+        document_count = len(self._postings.get(gram, ()))
+        return math.log((len(self._entries) + 1) / (document_count + 1)) + 1
+
+    def _weights(self, grams: Counter) -> Dict[str, float]:
+        return {gram: count * self._idf(gram) for gram, count in grams.items()}
+
+    def _remove(self, key: str) -> None:
+        _, _, weights, _ = self._entries.pop(key)
+        for gram in weights:
+            keys = self._postings.get(gram)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._postings[gram]
+
+    def _find_similar(self, key: str) -> Tuple[Optional[str], float]:
+        grams = _ngrams(key, self.ngram_size)
+
+        # Rank candidates by shared n-grams before computing full cosines
+        shared: Counter = Counter()
+        for gram in grams:
+            for other in self._postings.get(gram, ()):
+                shared[other] += 1
+        if not shared:
+            return None, 0.0
+
+        query = self._weights(grams)
+        query_norm = math.sqrt(sum(w * w for w in query.values()))
+        query_polarity, query_numbers = polarity(key), numbers(key)
+        best_key, best_score = None, 0.0
+        for other, _ in shared.most_common(self.max_candidates):
+            if polarity(other) != query_polarity or numbers(other) != query_numbers:
+                continue
+            _, _, weights, norm = self._entries[other]
+            dot = sum(w * weights.get(gram, 0.0) for gram, w in query.items())
+            score = dot / (query_norm * norm) if norm and query_norm else 0.0
+            if score > best_score:
+                best_key, best_score = other, score
+        return best_key, best_score
+
+    def get(self, question: str) -> Optional[str]:
+        key = normalize_question(question)
+        if not key:
+            return None
+
+        with self._lock:
+            now = time.monotonic()
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] < now:
+                self._remove(key)
+                self.expired += 1
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.exact_hits += 1
+                return entry[1]
+
+            if self.similarity_threshold is not None:
+                match, score = self._find_similar(key)
+                if match is not None and score >= self.similarity_threshold:
+                    expires_at, answer, _, _ = self._entries[match]
+                    if expires_at >= now:
+                        self._entries.move_to_end(match)
+                        self.similar_hits += 1
+                        return answer
+                    self._remove(match)
+                    self.expired += 1
+
+            self.misses += 1
+            return None
+
+    def put(self, question: str, answer: str) -> None:
+        key = normalize_question(question)
+        if not key or not answer:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            grams = _ngrams(key, self.ngram_size)
+            for gram in grams:
+                self._postings.setdefault(gram, set()).add(key)
+            weights = self._weights(grams)
+            norm = math.sqrt(sum(w * w for w in weights.values()))
+            self._entries[key] = (time.monotonic() + self.ttl, answer, weights, norm)
+            while len(self._entries) > self.max_size:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def warm(self, rows: Iterable[Tuple[str, str]]) -> int:
+        """Load (question, answer) pairs, e.g. from the symptoms table."""
+        loaded = 0
+        for question, answer in rows:
+            if question and answer:
+                self.put(question, answer)
+                loaded += 1
+        return loaded
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._postings.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.exact_hits + self.similar_hits + self.misses
+            hits = self.exact_hits + self.similar_hits
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl,
+                "similarity_threshold": self.similarity_threshold,
+                "exact_hits": self.exact_hits,
+                "similar_hits": self.similar_hits,
+                "misses": self.misses,
+                "expired": self.expired,
+                "evictions": self.evictions,
+                "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+            }
@@ -0,0 +1,490 @@
+import base64
+import hashlib
+import os
+import threading
+import time
+import uuid
+from typing import Any, BinaryIO, Dict, Optional, Tuple
+
+from blob_store import BlobStore
+from db_pool import ConnectionPool
+
+READ_SIZE = 1 << 20
+
+
+class UploadError(Exception):
+    """Base class for errors reported to the uploading client."""
+
+    status = 400
+
+
+class UploadNotFound(UploadError):
+    """Raised for unknown, expired or someone else's uploads."""
+
+    status = 404
+
+
+class UploadConflict(UploadError):
+    """Raised when a chunk overlaps bytes already stored, or after completion."""
+
+    status = 409
+
+
+class UploadTooLarge(UploadError):
+    """Raised when the declared length exceeds the configured maximum."""
+
+    status = 413
+
+
+def parse_metadata(header: Optional[str]) -> Dict[str, str]:
+    """Decode a tus ``Upload-Metadata`` header ("key base64value,...")."""
+    metadata = {}
+    for pair in (header or "").split(","):
+        parts = pair.strip().split(" ", 1)
+        if not parts[0]:
+            continue
+        try:
+            value = base64.b64decode(parts[1]).decode("utf-8") if len(parts) > 1 else ""
+        except (ValueError, UnicodeDecodeError):
+            raise UploadError(f"Invalid Upload-Metadata value for {parts[0]}")
+        metadata[parts[0]] = value
+    return metadata
+
+
+class _HashState:
+    """SHA-256 of the contiguous prefix hashed so far in this process."""
+
+    def __init__(self):
+        self.hasher = hashlib.sha256()
+        self.offset = 0
+        self.busy = False
+        self.lock = threading.Lock()
+
+
+class ResumableUploads:
+    """
+    Chunked, resumable uploads of health records (tus-style offsets).
+
+    ``create()`` reserves an id and a sparse ``<id>.part`` file of the
+    declared length in the upload folder. Each chunk is streamed from the
+    request straight into its place in that file with ``os.pwrite``, so
+    memory stays bounded by ``READ_SIZE`` and chunks of the same upload can
+    arrive in parallel. ``received`` in the ``uploads`` table is the length
+    of the contiguous prefix stored so far (the offset a client resumes
+    from); chunks beyond it are kept in ``upload_ranges`` until the gap is
+    filled. A chunk claims its range there (under ``BEGIN IMMEDIATE``)
+    before writing, so overlapping chunks are refused even when they arrive
+    at different processes at the same time.
+
+    The SHA-256 is computed while the bytes stream in when a chunk starts at
+    the hashed offset; chunks that arrived out of order are read back from
+    the (page-cached) file once they become contiguous. If this process did
+    not see the whole upload, the missing part is hashed from disk at the
+    end. The request that stores the last byte claims the upload, inserts
+    the ``health_records`` row and moves the file into the blob store under
+    that hash (a rename, or nothing if the content is already stored) in one
+    transaction; nothing is listed in the user's records before that.
+    """
+
+    def __init__(
+        self,
+        database: str,
+        upload_folder: str,
+        blob_store: BlobStore,
+        max_size: int = 1 << 30,
+        expire_after: float = 86400.0,
+        claim_timeout: float = 3600.0,
+    ):
+        self.pool = ConnectionPool(database, max_size=4)
+        self.upload_folder = upload_folder
+        self.blob_store = blob_store
+        self.max_size = max_size
+        self.expire_after = expire_after
+        self.claim_timeout = claim_timeout
+
+        self._hashes: Dict[str, _HashState] = {}
+        self._lock = threading.Lock()
+
+        # Metrics
+        self._created = 0
+        self._completed = 0
+        self._bytes_received = 0
+        self._expired = 0
+
+    def _part_path(self, upload_id: str) -> str:
+        return os.path.join(self.upload_folder, f"{upload_id}.part")
+
+    def _hash_state(self, upload_id: str) -> _HashState:
+        with self._lock:
+            state = self._hashes.get(upload_id)
+            if state is None:
+                state = self._hashes[upload_id] = _HashState()
+            return state
+
+    def create(self, user_id: int, file_name: str, length: int) -> str:
+        if length < 0:
+            raise UploadError("Upload-Length must not be negative")
+        if length > self.max_size:
+            raise UploadTooLarge(f"Uploads are limited to {self.max_size} bytes")
+
+        self.expire()
+        upload_id = uuid.uuid4().hex
+        with open(self._part_path(upload_id), "wb") as f:
+            f.truncate(length)
+
+        conn = self.pool.acquire()
+        try:
+            conn.execute(
+                """
+                INSERT INTO uploads (id, user_id, file_name, length)
+                VALUES (?, ?, ?, ?)
+                """,
+                (upload_id, user_id, file_name, length),
+            )
+            conn.commit()
+        finally:
+            self.pool.release(conn)
+
+        with self._lock:
+            self._created += 1
+        if length == 0:
+            self._finish(upload_id)
+        return upload_id
+
+    def get(self, upload_id: str, user_id: int) -> Dict[str, Any]:
+        conn = self.pool.acquire()
+        try:
+            row = conn.execute(
+                "SELECT * FROM uploads WHERE id = ? AND user_id = ?",
+                (upload_id, user_id),
+            ).fetchone()
+        finally:
+            self.pool.release(conn)
+        if row is None:
+            raise UploadNotFound("Upload not found")
+        return dict(row)
+
+    def _claim_range(self, upload_id: str, start: int, end: int) -> None:
+        """Reserve ``[start, end)`` for a chunk, refusing bytes already taken."""
+        now = time.time()
+        conn = self.pool.acquire()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            upload = conn.execute(
+                "SELECT received, completed_at FROM uploads WHERE id = ?",
+                (upload_id,),
+            ).fetchone()
+            if upload is None:
+                raise UploadNotFound("Upload not found")
+            if upload["completed_at"] is not None:
+                raise UploadConflict("Upload is already complete")
+            # Claims of requests that died mid-chunk lapse
+            conn.execute(
+                """
+                DELETE FROM upload_ranges
+                WHERE upload_id = ? AND claimed_at < ?
+                """,
+                (upload_id, now - self.claim_timeout),
+            )
+            overlap = conn.execute(
+                """
+                SELECT 1 FROM upload_ranges
+                WHERE upload_id = ? AND start_offset < ? AND end_offset > ?
+                LIMIT 1
+                """,
+                (upload_id, end, start),
+            ).fetchone()
+            if start < upload["received"] or overlap is not None:
+                raise UploadConflict(
+                    f"Bytes at offset {start} were already received "
+                    f"(Upload-Offset is {upload['received']})"
+                )
+            conn.execute(
+                """
+                INSERT INTO upload_ranges
+                (upload_id, start_offset, end_offset, claimed_at)
+                VALUES (?, ?, ?, ?)
+                """,
+                (upload_id, start, end, now),
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self.pool.release(conn)
+
+    def write_chunk(
+        self,
+        upload_id: str,
+        user_id: int,
+        offset: int,
+        stream: BinaryIO,
+        size: int,
+    ) -> Tuple[int, Optional[Dict[str, Any]]]:
+        """
+        Store ``size`` bytes from ``stream`` at ``offset``.
+
+        Returns the new contiguous offset and, when this chunk completed the
+        upload, the finished upload row (with ``record_id`` and ``sha256``).
+        """
+        upload = self.get(upload_id, user_id)
+        if upload["completed_at"] is not None:
+            raise UploadConflict("Upload is already complete")
+        if upload["received"] == upload["length"]:
+            # Every byte is stored but finishing failed before; try again
+            return upload["received"], self._finish(upload_id)
+        end = offset + size
+        if offset < 0 or size <= 0 or end > upload["length"]:
+            raise UploadError("Chunk is outside the declared Upload-Length")
+
+        self._claim_range(upload_id, offset, end)
+
+        state = self._hash_state(upload_id)
+        with state.lock:
+            hashing = not state.busy and state.offset == offset
+            if hashing:
+                state.busy = True
+
+        written = 0
+        try:
+            fd = os.open(self._part_path(upload_id), os.O_WRONLY)
+            try:
+                while written < size:
+                    data = stream.read(min(READ_SIZE, size - written))
+                    if not data:
+                        break
+                    os.pwrite(fd, data, offset + written)
+                    if hashing:
+                        state.hasher.update(data)
+                    written += len(data)
+            finally:
+                os.close(fd)
+        finally:
+            if hashing:
+                with state.lock:
+                    state.offset = offset + written
+                    state.busy = False
+            # Keep what was stored and give up the rest of the claim
+            received = self._record_range(upload_id, offset, offset + written)
+
+        with self._lock:
+            self._bytes_received += written
+        if received < upload["length"]:
+            self._catch_up_hash(upload_id, received)
+            return received, None
+        return received, self._finish(upload_id)
+
+    def _record_range(self, upload_id: str, start: int, end: int) -> int:
+        """Store the chunk claimed at ``start``; return the contiguous offset."""
+        conn = self.pool.acquire()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            received = conn.execute(
+                "SELECT received FROM uploads WHERE id = ?", (upload_id,)
+            ).fetchone()["received"]
+            if end > start:
+                conn.execute(
+                    """
+                    UPDATE upload_ranges SET end_offset = ?, claimed_at = NULL
+                    WHERE upload_id = ? AND start_offset = ?
+                        AND claimed_at IS NOT NULL
+                    """,
+                    (end, upload_id, start),
+                )
+            else:
+                conn.execute(
+                    """
+                    DELETE FROM upload_ranges
+                    WHERE upload_id = ? AND start_offset = ?
+                        AND claimed_at IS NOT NULL
+                    """,
+                    (upload_id, start),
+                )
+            ranges = conn.execute(
+                """
+                SELECT start_offset, end_offset FROM upload_ranges
+                WHERE upload_id = ? AND claimed_at IS NULL
+                ORDER BY start_offset
+                """,
+                (upload_id,),
+            ).fetchall()
+            for row in ranges:
+                if row["start_offset"] > received:
+                    break
+                received = max(received, row["end_offset"])
+            conn.execute(
+                """
+                DELETE FROM upload_ranges
+                WHERE upload_id = ? AND end_offset <= ? AND claimed_at IS NULL
+                """,
+                (upload_id, received),
+            )
+            conn.execute(
+                "UPDATE uploads SET received = ? WHERE id = ?", (received, upload_id)
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self.pool.release(conn)
+        return received
+
+    def _hash_from_disk(self, upload_id: str, state: _HashState, end: int) -> None:
+        with open(self._part_path(upload_id), "rb") as f:
+            f.seek(state.offset)
+            while state.offset < end:
+                data = f.read(min(READ_SIZE, end - state.offset))
+                if not data:
+                    break
+                state.hasher.update(data)
+                state.offset += len(data)
+
+    def _catch_up_hash(self, upload_id: str, received: int) -> None:
+        """Hash chunks that became contiguous after arriving out of order."""
+        state = self._hash_state(upload_id)
+        with state.lock:
+            if state.busy or state.offset >= received:
+                return
+            state.busy = True
+        try:
+            self._hash_from_disk(upload_id, state, received)
+        finally:
+            with state.lock:
+                state.busy = False
+
+    def _finish(self, upload_id: str) -> Optional[Dict[str, Any]]:
+        conn = self.pool.acquire()
+        try:
+            # Only one request gets to finish the upload
+            upload = conn.execute(
+                """
+                UPDATE uploads SET completed_at = CURRENT_TIMESTAMP
+                WHERE id = ? AND completed_at IS NULL AND received = length
+                RETURNING *
+                """,
+                (upload_id,),
+            ).fetchone()
+            conn.commit()
+            if upload is None:
+                return None
+            upload = dict(upload)
+
+            part_path = self._part_path(upload_id)
+            sha256 = upload["sha256"]
+            try:
+                # Without the part file, an earlier attempt already moved it
+                # into the blob store under the digest it recorded
+                if sha256 is None or os.path.exists(part_path):
+                    state = self._hash_state(upload_id)
+                    with state.lock:
+                        if state.busy:
+                            # Still catching up in another thread; hash privately
+                            state = _HashState()
+                        else:
+                            state.busy = True
+                    self._hash_from_disk(upload_id, state, upload["length"])
+                    sha256 = state.hasher.hexdigest()
+
+                file_name = f"user_{upload['user_id']}_{upload['file_name']}"
+                file_path = self.blob_store.path(sha256)
+
+                # Rows first and the file last, so a failure before the
+                # commit leaves the part file where a retry expects it
+                conn.execute("BEGIN IMMEDIATE")
+                self.blob_store.reference(conn, sha256, upload["length"])
+                record_id = conn.execute(
+                    """
+                    INSERT INTO health_records
+                    (user_id, file_name, file_path, blob_hash)
+                    VALUES (?, ?, ?, ?)
+                    """,
+                    (upload["user_id"], file_name, file_path, sha256),
+                ).lastrowid
+                conn.execute(
+                    "UPDATE uploads SET sha256 = ?, record_id = ? WHERE id = ?",
+                    (sha256, record_id, upload_id),
+                )
+                conn.execute(
+                    "DELETE FROM upload_ranges WHERE upload_id = ?", (upload_id,)
+                )
+                if os.path.exists(part_path):
+                    self.blob_store.place(part_path, sha256)
+                elif not os.path.exists(file_path):
+                    raise FileNotFoundError(f"No data left for upload {upload_id}")
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                # Keep the digest: if the commit failed after the file was
+                # moved, the next attempt finds it in the blob store
+                conn.execute(
+                    "UPDATE uploads SET completed_at = NULL, sha256 = ? WHERE id = ?",
+                    (sha256, upload_id),
+                )
+                conn.commit()
+                raise
+        finally:
+            self.pool.release(conn)
+
+        with self._lock:
+            self._hashes.pop(upload_id, None)
+            self._completed += 1
+        upload.update(sha256=sha256, record_id=record_id, file_name=file_name)
+        return upload
+
+    def delete(self, upload_id: str, user_id: int) -> None:
+        upload = self.get(upload_id, user_id)
+        if upload["completed_at"] is not None:
+            raise UploadConflict("Upload is already complete")
+        self._remove(upload_id)
+
+    def _remove(self, upload_id: str) -> None:
+        conn = self.pool.acquire()
+        try:
+            conn.execute("DELETE FROM upload_ranges WHERE upload_id = ?", (upload_id,))
+            conn.execute(
+                "DELETE FROM uploads WHERE id = ? AND completed_at IS NULL",
+                (upload_id,),
+            )
+            conn.commit()
+        finally:
+            self.pool.release(conn)
+        with self._lock:
+            self._hashes.pop(upload_id, None)
+        try:
+            os.remove(self._part_path(upload_id))
+        except FileNotFoundError:
+            pass
+
+    def expire(self) -> int:
+        """Remove unfinished uploads older than ``expire_after`` seconds."""
+        cutoff = time.strftime(
+            "%Y-%m-%d %H:%M:%S", time.gmtime(time.time() - self.expire_after)
+        )
+        conn = self.pool.acquire()
+        try:
+            stale = conn.execute(
+                """
+                SELECT id FROM uploads
+                WHERE completed_at IS NULL AND created_at < ?
+                """,
+                (cutoff,),
+            ).fetchall()
+        finally:
+            self.pool.release(conn)
+        for row in stale:
+            self._remove(row["id"])
+        with self._lock:
+            self._expired += len(stale)
+        return len(stale)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "created": self._created,
+                "completed": self._completed,
+                "hashing": len(self._hashes),
+                "bytes_received": self._bytes_received,
+                "expired": self._expired,
+            }
@@ -0,0 +1,38 @@
+import re
+from typing import Optional
+
+from markupsafe import Markup, escape
+
+# highlight()/snippet() wrap matches in these (char(2) and char(3) in the
+# SQL); control characters never occur in stored text, so the markers can
+# be swapped for <mark> tags after everything else has been escaped
+MATCH_START = "\x02"
+MATCH_END = "\x03"
+
+MAX_TERMS = 8
+_WORD = re.compile(r"\w+")
+
+
+def fts_query(text: Optional[str], user_id: int) -> Optional[str]:
+    """
+    Build the FTS5 MATCH expression for a search box entry.
+
+    Every word must match; the last one also matches as a prefix (two or
+    more characters) so results show up while typing. Words are quoted, so
+    FTS5 operators in the input are searched for literally, and they are
+    limited to the title and body columns so a search for "u2" cannot match
+    the owner tag. Returns None when there is nothing to search for.
+    """
+    words = _WORD.findall(text or "")[:MAX_TERMS]
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    if len(words[-1]) >= 2:
+        terms[-1] += "*"
+    return f"owner:u{int(user_id)} AND {{title body}} : ({' '.join(terms)})"
+
+
+def highlight(text: Optional[str]) -> Markup:
+    """Escape a highlight()/snippet() result and mark its matches."""
+    escaped = str(escape(text or ""))
+    return Markup(escaped.replace(MATCH_START, "<mark>").replace(MATCH_END, "</mark>"))
@@ -0,0 +1,310 @@
+import hashlib
+import secrets
+import threading
+import time
+import zlib
+from typing import Any, Dict, Optional, Tuple
+
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from itsdangerous import BadSignature, Signer
+from werkzeug.datastructures import CallbackDict
+
+from db_pool import ConnectionPool
+
+# Payloads larger than this are zlib-compressed before storage
+COMPRESS_THRESHOLD = 512
+
+# With SESSION_REFRESH_EACH_REQUEST, an unchanged session's stored expiry is
+# only pushed back once it has fallen this many seconds behind
+REFRESH_SLACK = 60.0
+
+_serializer = TaggedJSONSerializer()
+
+
+def dumps(data: Dict[str, Any]) -> bytes:
+    """Serialize session data to compact JSON, compressing large payloads."""
+    raw = _serializer.dumps(data).encode("utf-8")
+    if len(raw) > COMPRESS_THRESHOLD:
+        return b"z" + zlib.compress(raw)
+    return b"j" + raw
+
+
+def loads(blob: bytes) -> Dict[str, Any]:
+    kind, payload = blob[:1], blob[1:]
+    if kind == b"z":
+        payload = zlib.decompress(payload)
+    return _serializer.loads(payload.decode("utf-8"))
+
+
+class ServerSideSession(CallbackDict, SessionMixin):
+    """Session whose data lives in a store; the cookie only holds its id."""
+
+    def __init__(self, initial=None, sid=None, new=False):
+        def on_update(self):
+            self.modified = True
+
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.modified = False
+        # Signed-in user when the session was loaded; the id is replaced
+        # when this changes so a planted session id never becomes signed in
+        self.loaded_user_id = self.get("user_id")
+        # Stored expiry when loaded (None for new sessions)
+        self.expires_at = None
+        # Fingerprint of the stored payload, used to skip unchanged writes and
+        # to catch in-place edits such as session["chat_history"].append(...)
+        self.fingerprint = None
+
+
+class SqliteSessionStore:
+    """Session payloads in a SQLite table with an indexed expiry column."""
+
+    def __init__(self, database: str, sweep_interval: float = 300.0):
+        self.pool = ConnectionPool(database, max_size=4)
+        self.sweep_interval = sweep_interval
+        self._next_sweep = 0.0
+        self._sweep_lock = threading.Lock()
+
+        conn = self.pool.acquire()
+        try:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS sessions (
+                    id TEXT PRIMARY KEY,
+                    data BLOB NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+                """
+            )
+            conn.execute(
+                """
+                CREATE INDEX IF NOT EXISTS idx_sessions_expires_at
+                ON sessions (expires_at)
+                """
+            )
+            conn.commit()
+        finally:
+            self.pool.release(conn)
+
+    def load(self, sid: str) -> Optional[Tuple[bytes, float]]:
+        """The stored payload and its expiry, or None."""
+        conn = self.pool.acquire()
+        try:
+            row = conn.execute(
+                "SELECT data, expires_at FROM sessions WHERE id = ? AND expires_at > ?",
+                (sid, time.time()),
+            ).fetchone()
+        finally:
+            self.pool.release(conn)
+        return (row["data"], row["expires_at"]) if row else None
+
+    def save(self, sid: str, blob: bytes, expires_at: float) -> None:
+        conn = self.pool.acquire()
+        try:
+            conn.execute(
+                """
+                INSERT INTO sessions (id, data, expires_at) VALUES (?, ?, ?)
+                ON CONFLICT(id) DO UPDATE SET data = excluded.data,
+                                              expires_at = excluded.expires_at
+                """,
+                (sid, blob, expires_at),
+            )
+            conn.commit()
+        finally:
+            self.pool.release(conn)
+        self.maybe_sweep()
+
+    def touch(self, sid: str, expires_at: float) -> None:
+        """Extend the expiry of an unchanged session."""
+        conn = self.pool.acquire()
+        try:
+            conn.execute(
+                "UPDATE sessions SET expires_at = ? WHERE id = ?", (expires_at, sid)
+            )
+            conn.commit()
+        finally:
+            self.pool.release(conn)
+
+    def delete(self, sid: str) -> None:
+        conn = self.pool.acquire()
+        try:
+            conn.execute("DELETE FROM sessions WHERE id = ?", (sid,))
+            conn.commit()
+        finally:
+            self.pool.release(conn)
+
+    def maybe_sweep(self) -> None:
+        """Delete expired sessions at most once per ``sweep_interval``."""
+        now = time.time()
+        if now < self._next_sweep or not self._sweep_lock.acquire(blocking=False):
+            return
+        try:
+            self._next_sweep = now + self.sweep_interval
+            self.sweep(now)
+        finally:
+            self._sweep_lock.release()
+
+    def sweep(self, now: Optional[float] = None) -> int:
+        conn = self.pool.acquire()
+        try:
+            cur = conn.execute(
+                "DELETE FROM sessions WHERE expires_at <= ?", (now or time.time(),)
+            )
+            conn.commit()
+            return cur.rowcount
+        finally:
+            self.pool.release(conn)
+
+
+class RedisSessionStore:
+    """Session payloads in Redis or a Redis-compatible server (native key expiry)."""
+
+    def __init__(self, url: str, prefix: str = "session:"):
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def load(self, sid: str) -> Optional[Tuple[bytes, float]]:
+        pipe = self.client.pipeline()
+        pipe.get(self.prefix + sid)
+        pipe.ttl(self.prefix + sid)
+        blob, ttl = pipe.execute()
+        if blob is None:
+            return None
+        return blob, time.time() + max(ttl, 0)
+
+    def save(self, sid: str, blob: bytes, expires_at: float) -> None:
+        ttl = max(1, int(expires_at - time.time()))
+        self.client.setex(self.prefix + sid, ttl, blob)
+
+    def touch(self, sid: str, expires_at: float) -> None:
+        self.client.expire(self.prefix + sid, max(1, int(expires_at - time.time())))
+
+    def delete(self, sid: str) -> None:
+        self.client.delete(self.prefix + sid)
+
+    def sweep(self, now: Optional[float] = None) -> int:
+        return 0
+
+
+class ServerSideSessionInterface(SessionInterface):
+    """
+    Flask session interface backed by a server-side store.
+
+    The cookie carries only a signed random session id, so request headers
+    stay small no matter how much is kept in the session.
+    """
+
+    session_class = ServerSideSession
+
+    def __init__(self, store):
+        self.store = store
+
+    def _signer(self, app) -> Signer:
+        return Signer(app.secret_key, salt="server-side-session")
+
+    def _lifetime(self, app) -> float:
+        return app.permanent_session_lifetime.total_seconds()
+
+    def open_session(self, app, request):
+        cookie = request.cookies.get(self.get_cookie_name(app))
+        if cookie:
+            try:
+                sid = self._signer(app).unsign(cookie).decode("utf-8")
+            except BadSignature:
+                sid = None
+            if sid:
+                stored = self.store.load(sid)
+                if stored is not None:
+                    blob, expires_at = stored
+                    try:
+                        session = self.session_class(loads(blob), sid=sid)
+                        session.fingerprint = hashlib.sha1(blob).digest()
+                        session.expires_at = expires_at
+                        return session
+                    except (ValueError, zlib.error):
+                        pass
+        return self.session_class(sid=secrets.token_urlsafe(32), new=True)
+
+    def persist(self, app, session: ServerSideSession) -> bool:
+        """
+        Write the session to the store if its contents changed.
+
+        Can be called after the response headers were sent (e.g. at the end
+        of a streamed response) since the cookie only holds the id.
+        """
+        blob = dumps(dict(session))
+        fingerprint = hashlib.sha1(blob).digest()
+        if fingerprint == session.fingerprint:
+            return False
+        session.expires_at = time.time() + self._lifetime(app)
+        self.store.save(session.sid, blob, session.expires_at)
+        session.fingerprint = fingerprint
+        return True
+
+    def rotate(self, session: ServerSideSession) -> None:
+        """Move the session to a fresh id (on sign-in or user change)."""
+        if not session.new:
+            self.store.delete(session.sid)
+        session.sid = secrets.token_urlsafe(32)
+        session.new = True
+        session.fingerprint = None
+        session.loaded_user_id = session.get("user_id")
+
+    def refresh(self, app, session: ServerSideSession) -> None:
+        """Push back the stored expiry of an unchanged session."""
+        expires_at = time.time() + self._lifetime(app)
+        if (
+            session.expires_at is None
+            or session.expires_at < expires_at - REFRESH_SLACK
+        ):
+            self.store.touch(session.sid, expires_at)
+            session.expires_at = expires_at
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if not session:
+            if not session.new:
+                self.store.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        if session.get("user_id") != session.loaded_user_id:
+            self.rotate(session)
+
+        written = self.persist(app, session)
+        if not written and app.config["SESSION_REFRESH_EACH_REQUEST"]:
+            self.refresh(app, session)
+        if (written and session.new) or self.should_set_cookie(app, session):
+            response.set_cookie(
+                name,
+                self._signer(app).sign(session.sid).decode("utf-8"),
+                expires=self.get_expiration_time(app, session),
+                httponly=self.get_cookie_httponly(app),
+                domain=domain,
+                path=path,
+                secure=self.get_cookie_secure(app),
+                samesite=self.get_cookie_samesite(app),
+            )
+
+
+def init_session_store(app, backend: str = "sqlite", **options):
+    """Install a server-side session interface on ``app``."""
+    if backend == "sqlite":
+        store = SqliteSessionStore(options.get("database", "sessions.db"))
+    elif backend == "redis":
+        store = RedisSessionStore(options.get("url", "redis://localhost:6379/0"))
+    elif backend == "cookie":
+        # Keep Flask's default signed-cookie sessions
+        return None
+    else:
+        raise ValueError(f"Unknown session backend: {backend}")
+
+    app.session_interface = ServerSideSessionInterface(store)
+    return store
@@ -0,0 +1,54 @@
+import os
+import sys
+from wsgiref.util import FileWrapper
+
+import pytest
+from flask import Flask
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from downloads import DownloadSender  # noqa: E402
+
+CONTENT = bytes(range(256)) * 400  # 102400 bytes
+
+
+@pytest.fixture
+def client(tmp_path):
+    (tmp_path / "report.bin").write_bytes(CONTENT)
+    sender = DownloadSender(str(tmp_path))
+    app = Flask(__name__)
+
+    @app.route("/download")
+    def download():
+        return sender.send(str(tmp_path / "report.bin"))
+
+    return app.test_client()
+
+
+def get(client, headers):
+    # wsgiref's file wrapper reads to EOF unless the file stops by itself
+    return client.get(
+        "/download",
+        headers=headers,
+        environ_overrides={"wsgi.file_wrapper": FileWrapper},
+    )
+
+
+def test_mid_file_range_stops_at_range_end(client):
+    response = get(client, {"Range": "bytes=1000-1099"})
+    assert response.status_code == 206
+    assert response.headers["Content-Range"] == f"bytes 1000-1099/{len(CONTENT)}"
+    assert response.headers["Content-Length"] == "100"
+    assert response.get_data() == CONTENT[1000:1100]
+
+
+def test_range_from_start(client):
+    response = get(client, {"Range": "bytes=0-99"})
+    assert response.status_code == 206
+    assert response.get_data() == CONTENT[:100]
+
+
+def test_full_download(client):
+    response = get(client, {})
+    assert response.status_code == 200
+    assert response.get_data() == CONTENT
@@ -0,0 +1,40 @@
+import os
+import sys
+from datetime import date
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pregnancy_dates  # noqa: E402
+
+TODAY = date(2026, 10, 17)
+
+
+@pytest.mark.parametrize(
+    "input_date",
+    [
+        "2026-05-01",
+        "2026-5-1",
+        "2026",
+        "99999-01-01",
+        "0000-01-01",
+        "-0001-01-01",
+        "0001-01-01",
+        "9999-03-01",
+        "9999-12-31",
+    ],
+)
+@pytest.mark.parametrize("date_type", pregnancy_dates.DATE_TYPES)
+def test_batch_agrees_with_rows(date_type, input_date):
+    rows = [{"date_type": date_type, "input_date": input_date}]
+    (expected,) = pregnancy_dates.calculate_rows(rows, TODAY)
+    (record,) = pregnancy_dates.output_records(
+        pregnancy_dates.calculate_batch(pregnancy_dates.rows_to_columns(rows), TODAY)
+    )
+    if "error" in expected:
+        assert record["error"]
+    else:
+        assert record["error"] is None
+        assert record["current_week"] == expected["current_week"]
+        assert record["due_date"] == expected["due_date"].isoformat()
@@ -0,0 +1,39 @@
+import os
+import sqlite3
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import query_plans  # noqa: E402
+
+ROOT = os.path.dirname(query_plans.__file__)
+STATEMENTS = query_plans.collect_statements(
+    [os.path.join(ROOT, module) for module in query_plans.MODULES]
+)
+
+
+@pytest.fixture(scope="module")
+def conn(tmp_path_factory):
+    database = str(tmp_path_factory.mktemp("plans") / "plans.db")
+    query_plans.build_database(database, 2000)
+    conn = sqlite3.connect(database)
+    yield conn
+    conn.close()
+
+
+def test_statements_are_collected():
+    assert len(STATEMENTS) > 50
+
+
+@pytest.mark.parametrize(
+    "path, line, sql",
+    STATEMENTS,
+    ids=[f"{os.path.basename(path)}:{line}" for path, line, _ in STATEMENTS],
+)
+def test_statement_does_not_scan_a_table(conn, path, line, sql):
+    plan = query_plans.explain(conn, sql)
+    scans = [detail for detail in plan if query_plans.is_full_scan(detail)]
+    if scans:
+        assert query_plans.allowed_reason(sql), "\n".join(plan)
@@ -0,0 +1,58 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from response_cache import ResponseCache  # noqa: E402
+
+ANSWER = "Ibuprofen is generally avoided in pregnancy; ask your doctor."
+
+
+def test_near_duplicate_question_is_served():
+    cache = ResponseCache()
+    cache.put("Is it safe to take ibuprofen while pregnant?", ANSWER)
+    assert cache.get("is it safe to take ibuprofen while im pregnant") == ANSWER
+
+
+def test_negated_question_is_not_served_the_positive_answer():
+    cache = ResponseCache()
+    cache.put("Is it safe to take ibuprofen?", ANSWER)
+    assert cache.get("Is it not safe to take ibuprofen?") is None
+    assert cache.get("Isn't it safe to take ibuprofen?") is None
+    assert cache.get("Is it unsafe to take ibuprofen?") is None
+
+
+def test_positive_question_is_not_served_the_negated_answer():
+    cache = ResponseCache()
+    cache.put("Is it not safe to take ibuprofen?", ANSWER)
+    assert cache.get("Is it safe to take ibuprofen?") is None
+    assert cache.get("Is it not safe to take ibuprofen") == ANSWER
+
+
+def test_questions_with_different_qualifiers_do_not_match():
+    cache = ResponseCache()
+    cache.put("Can I drink coffee before my glucose test?", ANSWER)
+    assert cache.get("Can I drink coffee after my glucose test?") is None
+    assert cache.get("Can I drink coffee without my glucose test?") is None
+
+
+def test_different_dose_is_not_served():
+    cache = ResponseCache()
+    cache.put("Can I take 500mg paracetamol while pregnant?", ANSWER)
+    assert cache.get("Can I take 5000mg paracetamol while pregnant?") is None
+    assert cache.get("can i take 500mg paracetamol while pregnant") == ANSWER
+
+
+def test_different_gestational_week_is_not_served():
+    cache = ResponseCache()
+    cache.put("Is bleeding at 8 weeks normal?", ANSWER)
+    assert cache.get("Is bleeding at 38 weeks normal?") is None
+    cache.put("Headache and blurry vision at 30 weeks", ANSWER)
+    assert cache.get("Headache and blurry vision at 13 weeks") is None
+    assert cache.get("headache and blurry vision at 30 weeks!!") == ANSWER
+
+
+def test_added_number_is_not_served():
+    cache = ResponseCache()
+    cache.put("Is it normal to have cramps at night?", ANSWER)
+    assert cache.get("Is it normal to have cramps at 2 am at night?") is None